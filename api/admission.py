@@ -0,0 +1,187 @@
+"""
+Contrôle d'admission des requêtes /api/ : en surcharge, le travail le moins prioritaire est refusé
+d'abord (503 + Retry-After) au lieu de laisser toutes les requêtes se disputer les workers.
+
+Voies de priorité (lane_for) :
+- internal : clés API exemptes de facturation ; seules à pouvoir utiliser toute la limite (voie réservée) ;
+- client : clés API facturées, jusqu'à ADMISSION_LANE_SHARES["client"] de la limite ;
+- low : JWT, session, anonyme, clé inconnue, jusqu'à ADMISSION_LANE_SHARES["low"] de la limite.
+
+Limite de concurrence adaptative, partagée entre process (cache) :
+- en vol : un bail expirant par requête (core.ratelimit, INFLIGHT_TTL s) : un worker tué ou une requête
+  plus longue que l'échéance ne faussent pas le décompte, qui ne peut pas devenir négatif ;
+- limite : recalculée au plus une fois par ADMISSION_UPDATE_INTERVAL par chaque process à partir de la
+  latence observée (attente dans la file du proxy + traitement). Gradient :
+  ADMISSION_LATENCY_TOLERANCE × moyenne longue / moyenne courte, plafonné à 1, plancher ADMISSION_MIN_GRADIENT.
+  Tant que la latence courte reste sous ADMISSION_LATENCY_TOLERANCE fois la référence longue (1.5 par
+  défaut), gradient = 1 et la limite croît de sqrt(limite) ; au-delà elle baisse en proportion. Cible
+  limite × gradient + sqrt(limite), lissée à 20 % par mise à jour. Bornes ADMISSION_MIN_LIMIT .. ADMISSION_MAX_LIMIT.
+- file d'attente : si le proxy envoie X-Request-Start (nginx : proxy_set_header X-Request-Start "t=${msec}"),
+  une attente au-delà de ADMISSION_QUEUE_TARGET_MS refuse la voie low, au-delà de 4 fois la voie client.
+
+Chemins exclus : ADMISSION_EXEMPT_PATHS (santé pour le load balancer, flux SSE de longue durée).
+"""
+import logging
+import math
+import threading
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from core import authcache
+from core.models import hash_api_key
+from core.ratelimit import acquire_lease, lease_count, release_lease
+
+logger = logging.getLogger(__name__)
+
+CACHE_ADMISSION_PREFIX = "usdt_agg_admission"
+INFLIGHT_TTL = 120
+LIMIT_TTL = 3600
+# Voie client refusée quand l'attente dépasse ce multiple de la cible (voie low : dès la cible)
+CLIENT_QUEUE_FACTOR = 4
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def lane_for(request) -> str:
+    """Voie de la requête d'après sa clé API (cache d'authentification, sans requête SQL en régime établi)."""
+    key = request.META.get("HTTP_X_API_KEY")
+    if not key:
+        auth = request.META.get("HTTP_AUTHORIZATION") or ""
+        if auth.startswith("ApiKey "):
+            key = auth[len("ApiKey "):].strip()
+    if not key:
+        return "low"
+    api_key = authcache.api_keys.get(hash_api_key(key))
+    if not api_key:
+        return "low"
+    return "internal" if api_key.billing_exempt else "client"
+
+
+def queue_delay(request) -> Optional[float]:
+    """Secondes passées dans la file du proxy (X-Request-Start : t=<s|ms|µs>), None si absent ou illisible."""
+    raw = request.META.get("HTTP_X_REQUEST_START")
+    if not raw:
+        return None
+    try:
+        start = float(raw.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max(0.0, time.time() - start)
+
+
+class AdmissionController:
+    """État du process : limite partagée lue en cache, moyennes de latence locales."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limit = float(_setting("ADMISSION_INITIAL_LIMIT", 16))
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self._next_update = 0.0
+
+    def _key(self, name: str) -> str:
+        return f"{CACHE_ADMISSION_PREFIX}:{name}"
+
+    # --- Entrée / sortie --------------------------------------------------
+    def try_enter(self, lane: str, delay: Optional[float]) -> Tuple[Optional[str], float]:
+        """(bail si admise, Retry-After en secondes si refusée). Admise → leave(bail, latence) à la fin."""
+        target = _setting("ADMISSION_QUEUE_TARGET_MS", 50) / 1000.0
+        if delay is not None and lane != "internal":
+            if delay > target * (CLIENT_QUEUE_FACTOR if lane == "client" else 1):
+                return None, self.retry_after(delay / target)
+        share = _setting("ADMISSION_LANE_SHARES", {}).get(lane, 1.0)
+        allowed = max(1.0, self.limit * share)
+        lease, in_flight = acquire_lease(self._key("inflight"), int(allowed), INFLIGHT_TTL)
+        if lease is None:
+            return None, self.retry_after((in_flight + 1) / allowed)
+        return lease, 0.0
+
+    def leave(self, lease: Optional[str], latency: float) -> None:
+        release_lease(self._key("inflight"), lease)
+        self.observe(latency)
+
+    def retry_after(self, overload: float) -> int:
+        base = self.short_latency or 0.5
+        return max(1, min(30, int(math.ceil(base * max(overload, 1.0) * 2))))
+
+    # --- Limite adaptative ------------------------------------------------
+    def observe(self, latency: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.short_latency is None:
+                self.short_latency = self.long_latency = latency
+            else:
+                self.short_latency += 0.2 * (latency - self.short_latency)
+                self.long_latency += 0.02 * (latency - self.long_latency)
+            if now < self._next_update:
+                return
+            self._next_update = now + _setting("ADMISSION_UPDATE_INTERVAL", 1.0)
+            short, long_ = self.short_latency, self.long_latency
+        shared = cache.get(self._key("limit"))
+        limit = float(shared) if shared is not None else self.limit
+        tolerance = float(_setting("ADMISSION_LATENCY_TOLERANCE", 1.5))
+        min_gradient = float(_setting("ADMISSION_MIN_GRADIENT", 0.5))
+        gradient = max(min_gradient, min(1.0, tolerance * long_ / short)) if short > 0 else 1.0
+        target = limit * gradient + math.sqrt(limit)
+        low = float(_setting("ADMISSION_MIN_LIMIT", 4))
+        high = float(_setting("ADMISSION_MAX_LIMIT", 64))
+        new_limit = max(low, min(high, 0.8 * limit + 0.2 * target))
+        cache.set(self._key("limit"), new_limit, LIMIT_TTL)
+        if abs(new_limit - self.limit) >= 1:
+            logger.debug("admission: limite %.1f → %.1f (latence %.3f / %.3f s)", self.limit, new_limit, short, long_)
+        self.limit = new_limit
+
+    def in_flight(self) -> int:
+        return lease_count(self._key("inflight"))
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+def admission_middleware(get_response):
+    """Refuse en 503 les requêtes /api/ au-delà de la part de limite de leur voie (voir le module)."""
+    def middleware(request):
+        path = request.path
+        if (
+            not _setting("ADMISSION_ENABLED", True)
+            or not path.startswith("/api/")
+            or any(path.startswith(p) for p in _setting("ADMISSION_EXEMPT_PATHS", ()))
+        ):
+            return get_response(request)
+
+        controller = get_controller()
+        lane = lane_for(request)
+        delay = queue_delay(request)
+        lease, retry_after = controller.try_enter(lane, delay)
+        if lease is None:
+            logger.info("admission: %s refusée (voie %s, limite %.1f)", path, lane, controller.limit)
+            response = JsonResponse(
+                {"error": "Service surchargé", "detail": "Réessayer plus tard.", "lane": lane}, status=503
+            )
+            response["Retry-After"] = str(retry_after)
+            return response
+
+        started = time.monotonic()
+        try:
+            return get_response(request)
+        finally:
+            controller.leave(lease, time.monotonic() - started + (delay or 0.0))
+
+    return middleware
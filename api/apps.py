@@ -5,3 +5,6 @@ class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
     verbose_name = "API REST"
+
+    def ready(self):
+        from . import throttling  # noqa: F401  (check api.W001)
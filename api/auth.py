@@ -1,8 +1,14 @@
-from django.utils import timezone
+from types import SimpleNamespace
+
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
 from rest_framework import authentication
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, AuthenticationFailed
 from rest_framework.permissions import BasePermission
-from core.models import APIKey, APIKeyUsage
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from core import authcache, usage
+from core.models import hash_api_key
 
 
 class QuotaExceeded(APIException):
@@ -13,35 +19,54 @@ class QuotaExceeded(APIException):
 
 
 class CheckAPIKeyQuota(BasePermission):
-    """Si authentifié par clé API avec monthly_quota, refuse (429) si quota déjà atteint."""
+    """Si authentifié par clé API avec monthly_quota, réserve l'appel sur le quota du mois ou refuse (429)."""
 
     def has_permission(self, request, view):
-        user = getattr(request, "user", None)
-        api_key = getattr(user, "api_key", None) if user else None
-        if api_key is None or api_key.monthly_quota is None:
-            return True
-        period = timezone.now().strftime("%Y-%m")
-        usage, _ = APIKeyUsage.objects.get_or_create(
-            api_key=api_key, period=period, defaults={"call_count": 0}
-        )
-        if usage.call_count >= api_key.monthly_quota:
+        reserve_quota(request, 1)
+        return True
+
+
+def reserve_quota(request, calls: int) -> None:
+    """
+    Porte la réservation de la requête à `calls` appels sur le quota de sa clé API (core.usage), ou lève
+    QuotaExceeded. Réglée par api.middleware après la réponse (appels facturés gardés, reste rendu).
+    """
+    user = getattr(request, "user", None)
+    api_key = getattr(user, "api_key", None) if user else None
+    if api_key is None or api_key.monthly_quota is None:
+        return
+    http_request = getattr(request, "_request", request)
+    reserved = getattr(http_request, "api_usage_reserved", 0)
+    if calls <= reserved:
+        return
+    if not usage.reserve(api_key.pk, api_key.monthly_quota, calls - reserved):
+        remaining = max(0, api_key.monthly_quota - usage.used(api_key.pk))
+        if reserved:
             raise QuotaExceeded(
-                detail=f"Quota mensuel dépassé. Limite: {api_key.monthly_quota} appels/mois."
+                detail=f"Quota mensuel insuffisant : {calls} appels demandés, {remaining + reserved} restants."
             )
-        return True
+        raise QuotaExceeded(
+            detail=f"Quota mensuel dépassé. Limite: {api_key.monthly_quota} appels/mois."
+        )
+    http_request.api_usage_reserved = calls
 
 
 class APIKeyAuthentication(authentication.BaseAuthentication):
-    """Authentification par clé API (header X-API-Key ou Authorization: ApiKey <key>)."""
+    """
+    Authentification par clé API (header X-API-Key ou Authorization: ApiKey <key>).
+    Recherche par empreinte sha256 via core.authcache (aucune requête SQL tant que l'entrée est en cache).
+    La clé en clair n'est jamais comparée : la recherche porte sur son empreinte, que l'appelant ne peut pas
+    orienter octet par octet (pas de comparaison en temps constant à faire).
+    """
     keyword = "ApiKey"
 
     def authenticate(self, request):
         key = request.META.get("HTTP_X_API_KEY") or self._key_from_authorization(request)
         if not key:
             return None
-        try:
-            api_key = APIKey.objects.get(key=key, active=True)
-        except APIKey.DoesNotExist:
+        key_hash = hash_api_key(key)
+        api_key = authcache.api_keys.get(key_hash)
+        if not api_key:
             return None
         user = SimpleNamespace(is_authenticated=True, api_key=api_key)
         return (user, key)
@@ -51,3 +76,26 @@ class APIKeyAuthentication(authentication.BaseAuthentication):
         if auth and auth.startswith(f"{self.keyword} "):
             return auth[len(self.keyword) + 1 :].strip()
         return None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication avec l'utilisateur lu via core.authcache ; mêmes contrôles (actif, mot de passe changé)."""
+
+    def get_user(self, validated_token):
+        if jwt_settings.USER_ID_FIELD != "id" or jwt_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user = authcache.users.get(validated_token[jwt_settings.USER_ID_CLAIM])
+        if not user:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Schéma OpenAPI (drf-spectacular) de CachedJWTAuthentication : même Bearer JWT que simplejwt."""
+    target_class = "api.auth.CachedJWTAuthentication"
@@ -1,8 +1,16 @@
 """
 Comptage des appels API par clé (facturation).
-Incrémente le compteur du mois pour chaque réponse 2xx authentifiée par clé API.
+Après chaque réponse authentifiée par clé API : les appels facturés (1 par réponse 2xx, ou le nombre fixé
+par la vue dans request.api_billable_calls, ex. lot de requêtes) sont ajoutés aux compteurs du cache et la
+réservation de quota faite avant la vue (request.api_usage_reserved) est réglée, voir core.usage.
+Les compteurs (par mois, et par vue et par heure) sont reportés dans APIKeyUsage / APIKeyUsageBucket
+par la commande flush_api_usage.
 """
-from django.utils import timezone
+import logging
+
+from core import usage
+
+logger = logging.getLogger(__name__)
 
 
 def _get_api_key_from_request(request):
@@ -12,18 +20,8 @@ def _get_api_key_from_request(request):
     return getattr(request.user, "api_key", None)
 
 
-def _get_or_create_usage(api_key, period):
-    from core.models import APIKeyUsage
-    obj, _ = APIKeyUsage.objects.get_or_create(
-        api_key=api_key,
-        period=period,
-        defaults={"call_count": 0},
-    )
-    return obj
-
-
 def api_key_usage_middleware(get_response):
-    """En process_response : si authentifié par clé API et réponse 2xx → incrémenter le compteur du mois."""
+    """En process_response : si authentifié par clé API → compter les appels facturés, régler la réservation."""
     def middleware(request):
         if not request.path.startswith("/api/"):
             return get_response(request)
@@ -34,15 +32,15 @@ def api_key_usage_middleware(get_response):
         if api_key is None:
             return response
 
-        period = timezone.now().strftime("%Y-%m")
-
-        if 200 <= response.status_code < 300:
+        reserved = getattr(request, "api_usage_reserved", 0)
+        calls = getattr(request, "api_billable_calls", 1) if 200 <= response.status_code < 300 else 0
+        if calls > 0 or reserved:
             try:
-                usage = _get_or_create_usage(api_key, period)
-                usage.call_count += 1
-                usage.save(update_fields=["call_count"])
+                match = getattr(request, "resolver_match", None)
+                endpoint = usage.endpoint_name(match.func) if match is not None else None
+                usage.settle(api_key.pk, max(0, calls), reserved, endpoint=endpoint)
             except Exception:
-                pass
+                logger.exception("usage: comptage de l'appel échoué (clé %s)", api_key.pk)
 
         return response
 
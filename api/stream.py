@@ -0,0 +1,345 @@
+"""
+Flux Server-Sent Events (GET /api/v1/stream/) : meilleur prix / top-K des carnets et taux croisés,
+poussés seulement quand ils changent après un refresh. Nécessite un serveur ASGI (asgi.py).
+
+- Un StreamHub par process (boucle asyncio) : une seule lecture légère des générations (OffersSnapshot.generation,
+  CrossRateMatrix.generation) toutes les SSE_POLL_INTERVAL s pour les sujets suivis ; résumé recalculé et
+  encodé une fois par sujet modifié, puis distribué à toutes les connexions abonnées.
+- Contre-pression : chaque connexion garde au plus un événement en attente par sujet (le plus récent
+  remplace l'ancien) ; un client lent reçoit l'état courant, jamais une file qui grossit. Une connexion
+  bloquée plus de 3 heartbeats est retirée du hub et fermée (le client reprend avec Last-Event-ID).
+- Heartbeat : commentaire SSE toutes les SSE_HEARTBEAT s sans événement.
+- Reprise : l'id SSE est la liste des versions reçues (génération du dernier changement visible) (un nombre par sujet, dans l'ordre de l'abonnement,
+  séparés par "."). À la reconnexion (Last-Event-ID), seuls les sujets dont la génération a avancé sont renvoyés.
+
+Sujets : books=XOF:SELL:CI,GHS:BUY (country vide = tous pays) et cross=XOF-GHS,XOF:CI-GHS:GH.
+"""
+import asyncio
+import json
+import logging
+import time
+from itertools import islice
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+AUDIENCES = ("client", "internal")
+
+
+def parse_topics(books: str, cross: str, top: int) -> List[str]:
+    """Paramètres books / cross → sujets "book:FIAT:TYPE:PAYS:K" et "cross:FROM:PAYS:TO:PAYS". ValueError si invalide."""
+    topics = []
+    for raw in (books or "").split(","):
+        if not raw.strip():
+            continue
+        parts = [p.strip().upper() for p in raw.split(":")]
+        if len(parts) not in (2, 3) or not parts[0] or parts[1] not in ("BUY", "SELL"):
+            raise ValueError(f"books : {raw!r} invalide (FIAT:BUY|SELL[:PAYS]).")
+        fiat, trade_type = parts[0], parts[1]
+        country = parts[2] if len(parts) == 3 else ""
+        topics.append(f"book:{fiat}:{trade_type}:{country}:{top}")
+    for raw in (cross or "").split(","):
+        if not raw.strip():
+            continue
+        sides = raw.split("-")
+        if len(sides) != 2:
+            raise ValueError(f"cross : {raw!r} invalide (FROM[:PAYS]-TO[:PAYS]).")
+        nodes = []
+        for side in sides:
+            parts = [p.strip().upper() for p in side.split(":")]
+            if len(parts) > 2 or not parts[0]:
+                raise ValueError(f"cross : {raw!r} invalide (FROM[:PAYS]-TO[:PAYS]).")
+            nodes.append((parts[0], parts[1] if len(parts) == 2 else ""))
+        topics.append(f"cross:{nodes[0][0]}:{nodes[0][1]}:{nodes[1][0]}:{nodes[1][1]}")
+    topics = list(dict.fromkeys(topics))
+    if not topics:
+        raise ValueError("Au moins un sujet requis (books ou cross).")
+    max_topics = getattr(settings, "SSE_MAX_TOPICS", 50)
+    if len(topics) > max_topics:
+        raise ValueError(f"Au plus {max_topics} sujets par connexion.")
+    return topics
+
+
+def parse_resume(last_event_id: Optional[str], topics: List[str]) -> Dict[str, int]:
+    """Last-Event-ID ("g1.g2...") → {sujet: génération reçue}. Id absent ou d'un autre abonnement : {}."""
+    if not last_event_id:
+        return {}
+    parts = last_event_id.strip().split(".")
+    if len(parts) != len(topics):
+        return {}
+    try:
+        return {topic: int(gen) for topic, gen in zip(topics, parts)}
+    except ValueError:
+        return {}
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Accepte Accept: text/event-stream (EventSource) ; les réponses d'erreur restent du JSON."""
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, default=str).encode()
+
+
+# --- Résumés (synchrones : ORM) --------------------------------------------
+def _book_generations(topics: List[str]) -> Dict[str, int]:
+    from core.models import OffersSnapshot
+    from platforms.registry import get_default_platform
+
+    platform = get_default_platform()
+    keys = {tuple(t.split(":")[1:4]) for t in topics}
+    if platform is None or not keys:
+        return {}
+    where = Q()
+    for fiat, trade_type, country in keys:
+        where |= Q(fiat=fiat, trade_type=trade_type, country=country)
+    rows = OffersSnapshot.objects.filter(where, platform=platform.code).values_list("fiat", "trade_type", "country", "generation")
+    by_key = {(fiat, trade_type, country): generation for fiat, trade_type, country, generation in rows}
+    return {t: by_key.get(tuple(t.split(":")[1:4]), 0) for t in topics}
+
+
+def _book_summary(topic: str) -> Dict[str, Any]:
+    from api.views import _format_offer_for_api
+    from offers.services import iter_offers
+
+    _, fiat, trade_type, country, top = topic.split(":")
+    offers = list(islice(iter_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country or None), int(top)))
+    for o in offers:
+        o.setdefault("fiat", fiat)
+    base = {"fiat": fiat, "trade_type": trade_type, "country": country or None}
+    return {
+        audience: dict(
+            base,
+            best_price=offers[0]["adjusted_price"] if offers else None,
+            offers=[_format_offer_for_api(o, country or None, for_client=(audience == "client")) for o in offers],
+        )
+        for audience in AUDIENCES
+    }
+
+
+def _cross_summary(topic: str, matrix) -> Dict[str, Any]:
+    from core.cross_matrix import lookup_rate
+
+    _, from_c, country_from, to_c, country_to = topic.split(":")
+    rate, detail = None, "Matrice des taux croisés indisponible."
+    if matrix is not None:
+        rate, detail, _ = lookup_rate(matrix, from_c, to_c, country_from or None, country_to or None)
+    data = {
+        "from_currency": from_c, "to_currency": to_c,
+        "country_from": country_from or None, "country_to": country_to or None,
+        "rate": rate, "detail": detail,
+    }
+    return {audience: data for audience in AUDIENCES}
+
+
+class TopicState:
+    """
+    Dernier résumé diffusé d'un sujet. generation = dernière génération lue ; version = génération où le
+    résumé a changé pour la dernière fois (celle des événements et des id) ; payload = événement SSE encodé
+    une fois par audience.
+    """
+
+    __slots__ = ("generation", "version", "digest", "payload")
+
+    def __init__(self, generation: int, version: int, digest: Optional[str], payload: Dict[str, bytes]):
+        self.generation = generation
+        self.version = version
+        self.digest = digest
+        self.payload = payload
+
+
+def _encode(topic: str, generation: int, summary: Dict[str, Any]) -> Dict[str, bytes]:
+    kind = topic.split(":", 1)[0]
+    return {
+        audience: (
+            f"event: {kind}\n"
+            f"data: {json.dumps(dict(data, topic=topic, generation=generation), separators=(',', ':'), default=str)}\n\n"
+        ).encode()
+        for audience, data in summary.items()
+    }
+
+
+class Subscription:
+    """Une connexion : sujets, génération reçue par sujet, au plus un événement en attente par sujet."""
+
+    def __init__(self, topics: List[str], audience: str, resume: Dict[str, int]):
+        self.topics = topics
+        self.audience = audience
+        self.received = {t: resume.get(t, -1) for t in topics}
+        self.pending: Dict[str, Tuple[int, bytes]] = {}
+        self.wakeup = asyncio.Event()
+        # Dernier passage dans la boucle d'envoi ; closed = retirée du hub (client bloqué)
+        self.touched = time.monotonic()
+        self.closed = False
+
+    def offer(self, topic: str, state: TopicState) -> None:
+        if state.version <= self.received[topic] or not state.payload:
+            return
+        # Conflation : remplace l'événement non encore envoyé du même sujet
+        self.pending[topic] = (state.version, state.payload[self.audience])
+        self.wakeup.set()
+
+    def event_id(self) -> str:
+        return ".".join(str(max(0, self.received[t])) for t in self.topics)
+
+    def drain(self) -> bytes:
+        chunks = []
+        for topic in self.topics:
+            item = self.pending.pop(topic, None)
+            if item is not None:
+                self.received[topic] = item[0]
+                chunks.append(item[1])
+        self.wakeup.clear()
+        if not chunks:
+            return b""
+        # Un seul id par lot : l'état complet après application de tous les événements du lot
+        return b"".join(chunks[:-1]) + f"id: {self.event_id()}\n".encode() + chunks[-1]
+
+
+class StreamHub:
+    """Diffusion par process : une lecture des générations par cycle, un calcul et un encodage par sujet modifié."""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.states: Dict[str, TopicState] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, sub: Subscription) -> None:
+        for topic in sub.topics:
+            self.subscribers.setdefault(topic, set()).add(sub)
+        new_topics = [t for t in sub.topics if t not in self.states]
+        if new_topics:
+            await self.refresh(new_topics)
+        for topic in sub.topics:
+            state = self.states.get(topic)
+            if state is not None:
+                sub.offer(topic, state)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for topic in sub.topics:
+            subs = self.subscribers.get(topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.subscribers[topic]
+                    self.states.pop(topic, None)
+
+    def connection_count(self) -> int:
+        return len({sub for subs in self.subscribers.values() for sub in subs})
+
+    def prune(self, max_idle: float) -> int:
+        """
+        Retire les connexions dont la boucle d'envoi n'a pas tourné depuis max_idle s : écriture bloquée
+        (client qui ne lit plus) ou générateur abandonné par le serveur. Le flux se termine à la reprise.
+        """
+        now = time.monotonic()
+        stale = {sub for subs in self.subscribers.values() for sub in subs if now - sub.touched > max_idle}
+        for sub in stale:
+            sub.closed = True
+            self.unsubscribe(sub)
+            sub.wakeup.set()
+        if stale:
+            logger.info("stream: %s connexion(s) inactive(s) retirée(s)", len(stale))
+        return len(stale)
+
+    async def _run(self) -> None:
+        interval = getattr(settings, "SSE_POLL_INTERVAL", 2)
+        max_idle = 3 * getattr(settings, "SSE_HEARTBEAT", 15)
+        while self.subscribers:
+            await asyncio.sleep(interval)
+            self.prune(max_idle)
+            try:
+                await self.refresh(list(self.subscribers))
+            except Exception:
+                logger.exception("stream: lecture des générations échouée")
+
+    async def refresh(self, topics: List[str]) -> None:
+        """Relit les générations des sujets ; pour chaque résumé modifié, diffuse l'événement encodé."""
+        async with self._lock:
+            changed = await sync_to_async(self._compute, thread_sensitive=False)(topics)
+        for topic, state in changed.items():
+            if topic not in self.subscribers:
+                continue  # plus d'abonné pendant le calcul
+            self.states[topic] = state
+            for sub in list(self.subscribers.get(topic, ())):
+                sub.offer(topic, state)
+
+    def _compute(self, topics: List[str]) -> Dict[str, TopicState]:
+        from django.db import close_old_connections
+
+        close_old_connections()
+        try:
+            return self._compute_states(topics)
+        finally:
+            close_old_connections()
+
+    def _compute_states(self, topics: List[str]) -> Dict[str, TopicState]:
+        book_topics = [t for t in topics if t.startswith("book:")]
+        cross_topics = [t for t in topics if t.startswith("cross:")]
+        generations = _book_generations(book_topics)
+        matrix = None
+        if cross_topics:
+            from core.cross_matrix import get_latest_matrix
+            matrix = get_latest_matrix()
+            matrix_generation = matrix.generation if matrix is not None else 0
+            generations.update({t: matrix_generation for t in cross_topics})
+        changed = {}
+        for topic in topics:
+            generation = generations.get(topic, 0)
+            current = self.states.get(topic)
+            if current is not None and current.generation == generation:
+                continue
+            summary = _book_summary(topic) if topic.startswith("book:") else _cross_summary(topic, matrix)
+            digest = json.dumps(summary["internal"], sort_keys=True, default=str)
+            if current is not None and current.digest == digest:
+                # Nouvelle génération sans changement visible : version inchangée, rien n'est diffusé
+                changed[topic] = TopicState(generation, current.version, digest, current.payload)
+                continue
+            changed[topic] = TopicState(generation, generation, digest, _encode(topic, generation, summary))
+        return changed
+
+
+_hub: Optional[StreamHub] = None
+_hub_loop = None
+
+
+def get_hub() -> StreamHub:
+    """Hub de la boucle asyncio courante (un par process ASGI)."""
+    global _hub, _hub_loop
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub_loop is not loop:
+        _hub, _hub_loop = StreamHub(), loop
+    return _hub
+
+
+async def event_stream(topics: List[str], audience: str, resume: Dict[str, int]):
+    """Corps de la réponse SSE : état initial (hors sujets déjà à jour), puis changements et heartbeats."""
+    hub = get_hub()
+    sub = Subscription(topics, audience, resume)
+    heartbeat = getattr(settings, "SSE_HEARTBEAT", 15)
+    try:
+        await hub.subscribe(sub)
+        yield f"retry: {int(getattr(settings, 'SSE_RETRY_MS', 3000))}\n\n".encode()
+        while not sub.closed:
+            sub.touched = time.monotonic()
+            if not sub.pending:
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+            chunk = sub.drain()
+            if chunk:
+                yield chunk
+    finally:
+        hub.unsubscribe(sub)
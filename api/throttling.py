@@ -0,0 +1,69 @@
+"""
+Limitation de débit par clé API : seau à jetons partagé (core.ratelimit.consume, GCRA, un aller-retour cache).
+
+Débit et rafale par clé (APIKey.rate_limit / rate_burst, sinon API_RATE_LIMIT / API_RATE_BURST).
+Chaque requête consomme le coût de sa classe d'endpoint (throttle_scope, coûts dans API_RATE_SCOPE_COSTS) :
+les appels lourds (annonceur, lots) épuisent le seau plus vite. Refus → 429 avec Retry-After (DRF Throttled).
+Un coût supérieur à la rafale de la clé ne passerait jamais : 403 explicite (pas de plafonnement silencieux),
+refusé à la saisie de la clé (APIKey.clean) et signalé au démarrage pour API_RATE_BURST (check api.W001).
+Les requêtes authentifiées autrement (JWT, session) ne sont pas limitées ici.
+"""
+from django.conf import settings
+from django.core import checks
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.throttling import BaseThrottle
+
+from core.ratelimit import consume
+
+
+def throttle_scope(scope: str):
+    """Classe d'endpoint d'une vue @api_view (à placer au-dessus de @api_view)."""
+    def decorator(view):
+        view.cls.throttle_scope = scope
+        return view
+    return decorator
+
+
+def scope_cost(scope: str) -> int:
+    costs = getattr(settings, "API_RATE_SCOPE_COSTS", {})
+    return max(1, int(costs.get(scope, costs.get("default", 1))))
+
+
+class APIKeyRateThrottle(BaseThrottle):
+    """Seau à jetons par clé API ; coût par classe d'endpoint."""
+
+    def allow_request(self, request, view):
+        self._wait = None
+        api_key = getattr(getattr(request, "user", None), "api_key", None)
+        if api_key is None:
+            return True
+        rate = api_key.rate_limit if api_key.rate_limit is not None else getattr(settings, "API_RATE_LIMIT", 0)
+        burst = api_key.rate_burst if api_key.rate_burst is not None else getattr(settings, "API_RATE_BURST", 0)
+        cost = scope_cost(getattr(view, "throttle_scope", None) or "default")
+        if rate and burst and rate > 0 and cost > burst:
+            raise PermissionDenied(
+                f"Cet endpoint coûte {cost} jetons, plus que la rafale de la clé ({burst}) : "
+                "augmenter rate_burst de la clé."
+            )
+        allowed, wait = consume(f"apikey:{api_key.pk}", rate, burst, cost)
+        if not allowed:
+            self._wait = wait
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+@checks.register()
+def check_scope_costs(app_configs, **kwargs):
+    """API_RATE_BURST doit couvrir le coût de chaque classe d'endpoint."""
+    burst = getattr(settings, "API_RATE_BURST", 0)
+    costs = getattr(settings, "API_RATE_SCOPE_COSTS", {})
+    too_costly = sorted(scope for scope, cost in costs.items() if burst and cost > burst)
+    if getattr(settings, "API_RATE_LIMIT", 0) and too_costly:
+        return [checks.Warning(
+            f"API_RATE_BURST ({burst}) inférieur au coût de {', '.join(too_costly)} (API_RATE_SCOPE_COSTS) : "
+            "ces endpoints seraient refusés (403) aux clés sans rate_burst propre.",
+            id="api.W001",
+        )]
+    return []
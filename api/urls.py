@@ -12,14 +12,31 @@ urlpatterns = [
     path("offers/prices/", views.offers_list_prices),
     # API 1b : Meilleures offres (top N)
     path("offers/best/", views.offers_best),
+    # API 1c : Requêtes groupées (offres, meilleures offres, taux croisé)
+    path("offers/batch/", views.offers_batch),
+    # API 1d : Changements d'un carnet depuis une génération
+    path("offers/changes/", views.offers_changes),
+    # API 1e : Flux SSE (serveur ASGI)
+    path("stream/", views.offers_stream),
     # API 2 : Taux croisé + meilleures offres chaque côté
     path("rates/cross/", views.cross_rate),
+    # API 2b : Matrice des taux croisés (matérialisée au refresh)
+    path("rates/cross/matrix/", views.cross_rate_matrix),
+    # API 2c : Historique des taux (bougies OHLC)
+    path("rates/history/", views.rate_history),
     # API 3 : Liste des pays
     path("countries/", views.countries_list),
     # API 4 : Liste des devises
     path("currencies/", views.currencies_list),
     # API 5 : Résolution reference → annonceur (clés exemptes)
     path("advertiser/", views.advertiser_lookup),
+    path("advertiser/batch/", views.advertiser_lookup_batch),
+    # API 5b : Déclaration des offres exécutées (écriture par lots)
+    path("advertiser/usage/", views.advertiser_usage),
+    # API 6 : Usage de la clé API (séries heure / jour)
+    path("usage/", views.api_usage),
+    # Santé (load balancer) : plateformes + fraîcheur des snapshots, sans auth
+    path("health/", views.health),
     # --- Désactivés (hors scope) ---
     # path("offers/binance-raw/", views.offers_binance_raw),
     # path("rates/currencies/", views.rates_currencies_list),
@@ -3,14 +3,25 @@ API v1 : 4 endpoints retenus (+ auth).
 
 1. GET /api/v1/offers/          — Offres (params: fiat, trade_type, country). Retourne prix, min_fiat, max_fiat, annonceur, moyens de paiement.
 2. GET /api/v1/rates/cross/      — Taux croisé from → to via USDT + meilleures offres chaque côté (min/max, annonceur, paiement).
+   GET /api/v1/rates/cross/matrix/ — Matrice N×N des taux croisés (calculée au refresh).
 3. GET /api/v1/countries/       — Liste des pays (param fiat optionnel).
 4. GET /api/v1/currencies/      — Liste des devises.
+POST /api/v1/offers/batch/      — Plusieurs requêtes offres / meilleures offres / taux croisé en un appel.
+GET /api/v1/offers/changes/     — Changements d'un carnet depuis une génération (since), ou marqueur resync.
+GET /api/v1/stream/             — Flux SSE : meilleur prix / top-K et taux croisés poussés après refresh (ASGI).
+GET /api/v1/usage/              — Usage de la clé API par heure / jour (non facturé).
+Sans auth : GET /api/v1/health/ — Santé (plateformes + fraîcheur des snapshots), sans auth, pour load balancer.
 """
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
 from django.conf import settings
+from django.utils import timezone
 from rest_framework import status, serializers
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiParameter,
@@ -19,9 +30,12 @@ from drf_spectacular.utils import (
     inline_serializer,
 )
 
-from core.models import BestRate, Currency, Country
+from core.models import BestRate, Currency, Country, OffersSnapshot
 from core.majoration import apply_majoration, apply_cross_adjustment
-from offers.services import fetch_offers, fetch_offers_raw, get_offers_from_snapshot
+from api.auth import CheckAPIKeyQuota, reserve_quota
+from api.stream import EventStreamRenderer
+from api.throttling import throttle_scope
+from offers.services import fetch_offers, fetch_offers_raw, get_offers_from_snapshot, iter_offers, resolve_reference_offers
 
 SANDBOX_API = getattr(settings, "SANDBOX_API", False)
 
@@ -134,6 +148,23 @@ _CurrenciesResponseSerializer = inline_serializer(
     "CurrenciesResponse",
     fields={"currencies": serializers.ListField(child=_CurrenciesItemSerializer)},
 )
+_OFFER_FILTER_PARAMETERS = [
+    OpenApiParameter("amount", float, required=False, description="Seulement les offres qui acceptent exactement ce montant (min ≤ amount ≤ max), dans l'ordre des prix."),
+    OpenApiParameter("amount_unit", str, required=False, description="Unité de amount : fiat (défaut, min_fiat/max_fiat) ou usdt (min_usdt/max_usdt)."),
+    OpenApiParameter("payment_methods", str, required=False, description="Identifiants de moyens de paiement séparés par des virgules (ex. MTNMobileMoney,OrangeMoney)."),
+    OpenApiParameter("payment_match", str, required=False, description="any (défaut) : au moins un des moyens ; all : tous les moyens."),
+    OpenApiParameter("min_finish_rate", float, required=False, description="Taux de complétion minimal de l'annonceur sur 30 jours (0..1, ou pourcentage)."),
+    OpenApiParameter("min_orders", int, required=False, description="Nombre minimal d'ordres de l'annonceur sur 30 jours."),
+    OpenApiParameter("merchant_only", bool, required=False, description="true : seulement les marchands vérifiés."),
+    OpenApiParameter("order", str, required=False, description="price (défaut) : meilleur prix d'abord ; score : classement composite prix / fiabilité (champ score, poids OFFER_SCORE_WEIGHTS)."),
+]
+_PLATFORMS_PARAMETER = OpenApiParameter(
+    "platforms",
+    str,
+    required=False,
+    description="Mode agrégé : « all » ou codes séparés par des virgules (ex. binance,standin). "
+    "Fusion des carnets par prix ajusté, pondérée par plateforme. Absent = plateforme par défaut.",
+)
 
 
 @extend_schema(
@@ -178,6 +209,88 @@ def _is_billing_exempt(request) -> bool:
     return getattr(api_key, "billing_exempt", False)
 
 
+def _parse_platforms(request):
+    """
+    Paramètre platforms : absent → None (plateforme par défaut) ; "all" → [] (mode agrégé, toutes) ;
+    "binance,autre" → liste de codes. Lève ValueError si un code est inconnu.
+    """
+    raw = request.query_params.get("platforms")
+    if raw is None:
+        return None
+    codes = [c.strip().lower() for c in raw.split(",") if c.strip()]
+    if not codes or codes == ["all"]:
+        return []
+    from platforms.registry import get_platform
+    unknown = [c for c in codes if get_platform(c) is None]
+    if unknown:
+        raise ValueError(f"Plateforme(s) inconnue(s) : {', '.join(unknown)}.")
+    return codes
+
+
+def _offer_filters(request) -> dict:
+    """Filtres communs des endpoints offres → arguments de fetch_offers / iter_offers. ValueError = 400."""
+    return {"platforms": _parse_platforms(request), **_filter_params(request.query_params)}
+
+
+def _filter_params(params) -> dict:
+    """Filtres hors platforms, depuis la query string ou une sous-requête JSON du lot. ValueError = 400."""
+    filters = {}
+    raw_amount = params.get("amount")
+    if raw_amount not in (None, ""):
+        try:
+            amount = float(raw_amount)
+        except (TypeError, ValueError):
+            amount = -1
+        if not amount > 0:
+            raise ValueError("amount doit être un nombre > 0.")
+        unit = str(params.get("amount_unit") or "fiat").strip().lower()
+        if unit not in ("fiat", "usdt"):
+            raise ValueError("amount_unit doit être fiat ou usdt.")
+        filters["amount"] = amount
+        filters["amount_unit"] = unit
+    raw_methods = params.get("payment_methods") or ""
+    if not isinstance(raw_methods, (list, tuple)):
+        raw_methods = str(raw_methods).split(",")
+    methods = [str(m).strip() for m in raw_methods if str(m).strip()]
+    if methods:
+        match = str(params.get("payment_match") or "any").strip().lower()
+        if match not in ("any", "all"):
+            raise ValueError("payment_match doit être any ou all.")
+        filters["payment_methods"] = methods
+        filters["payment_match"] = match
+    quality = {}
+    raw_rate = params.get("min_finish_rate")
+    if raw_rate not in (None, ""):
+        try:
+            rate = float(raw_rate)
+        except (TypeError, ValueError):
+            rate = -1
+        if rate > 1:
+            rate /= 100  # accepté en pourcentage (95 = 0.95)
+        if not 0 <= rate <= 1:
+            raise ValueError("min_finish_rate doit être entre 0 et 1 (ou 0 et 100 en %).")
+        quality["min_finish_rate"] = rate
+    raw_orders = params.get("min_orders")
+    if raw_orders not in (None, ""):
+        try:
+            min_orders = int(raw_orders)
+        except (TypeError, ValueError):
+            min_orders = -1
+        if min_orders < 0:
+            raise ValueError("min_orders doit être un entier >= 0.")
+        quality["min_orders"] = min_orders
+    if str(params.get("merchant_only") or "").strip().lower() in ("1", "true", "yes"):
+        quality["merchant_only"] = True
+    if quality:
+        filters["quality"] = quality
+    order = str(params.get("order") or "price").strip().lower()
+    if order not in ("price", "score"):
+        raise ValueError("order doit être price ou score.")
+    if order == "score":
+        filters["order"] = order
+    return filters
+
+
 def _format_offer_for_api(o: dict, country: str = None, for_client: bool = False) -> dict:
     """
     Formate une offre pour l'API.
@@ -220,11 +333,13 @@ def _format_offer_for_api(o: dict, country: str = None, for_client: bool = False
         OpenApiParameter("country", str, required=False, description="Code pays (ex. BJ, CI). Vide = tous les pays."),
         OpenApiParameter("page", int, required=False, description="Numéro de page (défaut 1)."),
         OpenApiParameter("page_size", int, required=False, description="Nombre d'offres par page (défaut 20, max 100)."),
+        _PLATFORMS_PARAMETER,
+        *_OFFER_FILTER_PARAMETERS,
     ],
     description="Récupère les offres selon fiat, trade_type et pays. Réponse paginée : count, page, page_size, offers.",
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def offers_list(request):
     fiat = request.query_params.get("fiat", "XOF").strip().upper()
     trade_type = request.query_params.get("trade_type", "SELL").upper()
@@ -239,13 +354,17 @@ def offers_list(request):
         page_size = min(100, max(1, int(request.query_params.get("page_size", 20))))
     except (TypeError, ValueError):
         page_size = 20
+    try:
+        filters = _offer_filters(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if SANDBOX_API:
         data = _sandbox_offers(fiat, trade_type, country) or []
     else:
-        data = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None)
+        # Déjà triées meilleure offre d'abord (fusion pondérée en mode agrégé : ne pas retrier)
+        data = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None, **filters)
     for o in data:
         o.setdefault("fiat", fiat)
-    data = sorted(data, key=lambda x: (x.get("adjusted_price") or x.get("price") or 0), reverse=(trade_type == "SELL"))
     for_client = not _is_billing_exempt(request)
     offers_clean = [_format_offer_for_api(o, country, for_client=for_client) for o in data]
     total = len(offers_clean)
@@ -270,6 +389,8 @@ def offers_list(request):
         OpenApiParameter("country", str, required=False, description="Code pays (ex. BJ, CI). Vide = tous les pays."),
         OpenApiParameter("page", int, required=False, description="Numéro de page (défaut 1)."),
         OpenApiParameter("page_size", int, required=False, description="Nombre d'offres par page (défaut 20, max 100)."),
+        _PLATFORMS_PARAMETER,
+        *_OFFER_FILTER_PARAMETERS,
     ],
     description="Même paramètres et pagination que GET /offers/. Retourne uniquement la liste des prix ajustés (même ordre que les offres).",
     responses={
@@ -285,7 +406,7 @@ def offers_list(request):
     },
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def offers_list_prices(request):
     """Même logique que offers_list, mais la réponse ne contient que les prix ajustés (liste de floats)."""
     fiat = request.query_params.get("fiat", "XOF").strip().upper()
@@ -301,13 +422,17 @@ def offers_list_prices(request):
         page_size = min(100, max(1, int(request.query_params.get("page_size", 20))))
     except (TypeError, ValueError):
         page_size = 20
+    try:
+        filters = _offer_filters(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if SANDBOX_API:
         data = _sandbox_offers(fiat, trade_type, country) or []
     else:
-        data = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None)
+        # Déjà triées meilleure offre d'abord (fusion pondérée en mode agrégé : ne pas retrier)
+        data = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None, **filters)
     for o in data:
         o.setdefault("fiat", fiat)
-    data = sorted(data, key=lambda x: (x.get("adjusted_price") or x.get("price") or 0), reverse=(trade_type == "SELL"))
     adjusted_prices = [float(o.get("adjusted_price") or o.get("price") or 0) for o in data]
     total = len(adjusted_prices)
     start = (page - 1) * page_size
@@ -330,12 +455,15 @@ def offers_list_prices(request):
         OpenApiParameter("trade_type", str, description="BUY ou SELL"),
         OpenApiParameter("country", str, required=False, description="Code pays (ex. BJ, CI). Vide = tous les pays."),
         OpenApiParameter("limit", int, required=False, description="Nombre de meilleures offres à retourner (défaut 3, max 50)."),
+        _PLATFORMS_PARAMETER,
+        *_OFFER_FILTER_PARAMETERS,
     ],
-    description="Retourne les N meilleures offres (tri par meilleur prix). Par défaut les 3 meilleures.",
+    description="Retourne les N meilleures offres (tri par meilleur prix). Par défaut les 3 meilleures. "
+    "Avec platforms : N meilleures toutes plateformes confondues.",
     responses={200: _OffersResponseSerializer},
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def offers_best(request):
     fiat = request.query_params.get("fiat", "XOF").strip().upper()
     trade_type = request.query_params.get("trade_type", "SELL").upper()
@@ -346,13 +474,20 @@ def offers_best(request):
         limit = min(50, max(1, int(request.query_params.get("limit", 3))))
     except (TypeError, ValueError):
         limit = 3
+    try:
+        filters = _offer_filters(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if SANDBOX_API:
         data = _sandbox_offers(fiat, trade_type, country) or []
     else:
-        data = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None)
+        # Top-K pris au fil de la fusion : le carnet fusionné complet n'est jamais construit
+        data = list(islice(
+            iter_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, **filters),
+            limit,
+        ))
     for o in data:
         o.setdefault("fiat", fiat)
-    data = sorted(data, key=lambda x: (x.get("adjusted_price") or x.get("price") or 0), reverse=(trade_type == "SELL"))
     for_client = not _is_billing_exempt(request)
     offers_clean = [_format_offer_for_api(o, country, for_client=for_client) for o in data]
     offers_top = offers_clean[:limit]
@@ -364,12 +499,267 @@ def offers_best(request):
     })
 
 
+# ---------------------------------------------------------------------------
+# API 1c : Requêtes groupées (offres / meilleures offres / taux croisé) en un appel
+# ---------------------------------------------------------------------------
+BATCH_MAX_QUERIES = getattr(settings, "API_BATCH_MAX_QUERIES", 100)
+_BATCH_LIMITS = {"offers": (20, 100), "best": (3, 50)}
+
+
+def _batch_billing_units(count: int) -> int:
+    """Appels décomptés pour un lot de `count` sous-requêtes réussies (API_BATCH_BILLING)."""
+    if getattr(settings, "API_BATCH_BILLING", "per_query") == "per_batch":
+        return 1
+    return count
+
+
+def _parse_batch_query(raw, position: int) -> dict:
+    """Sous-requête JSON → requête validée pour offers.batch.run_batch. ValueError = erreur de la sous-requête."""
+    if not isinstance(raw, dict):
+        raise ValueError("Sous-requête : objet JSON attendu.")
+    kind = str(raw.get("type") or "offers").strip().lower()
+    query = {"id": str(raw.get("id") or position), "type": kind}
+    if kind == "cross":
+        query["from_currency"] = str(raw.get("from_currency") or "").strip().upper()
+        query["to_currency"] = str(raw.get("to_currency") or "").strip().upper()
+        if not query["from_currency"] or not query["to_currency"]:
+            raise ValueError("from_currency et to_currency requis.")
+        query["country_from"] = str(raw.get("country_from") or "").strip() or None
+        query["country_to"] = str(raw.get("country_to") or "").strip() or None
+        return query
+    if kind not in _BATCH_LIMITS:
+        raise ValueError("type doit être offers, best ou cross.")
+    query["fiat"] = str(raw.get("fiat") or "").strip().upper()
+    if not query["fiat"]:
+        raise ValueError("fiat requis.")
+    query["trade_type"] = str(raw.get("trade_type") or "SELL").strip().upper()
+    if query["trade_type"] not in ("BUY", "SELL"):
+        raise ValueError("trade_type doit être BUY ou SELL.")
+    query["country"] = str(raw.get("country") or "").strip() or None
+    default_limit, max_limit = _BATCH_LIMITS[kind]
+    try:
+        query["limit"] = min(max_limit, max(1, int(raw.get("limit") or default_limit)))
+    except (TypeError, ValueError):
+        query["limit"] = default_limit
+    if raw.get("platforms"):
+        raise ValueError("platforms n'est pas disponible dans un lot (plateforme par défaut uniquement).")
+    query["filters"] = _filter_params(raw)
+    return query
+
+
+@extend_schema(
+    request=inline_serializer(
+        "OffersBatchRequest",
+        fields={"queries": serializers.ListField(child=serializers.DictField())},
+    ),
+    description=f"Jusqu'à {BATCH_MAX_QUERIES} requêtes en un appel. Chaque sous-requête : id (clé du résultat), "
+    "type = offers (fiat, trade_type, country, limit ≤ 100, filtres de /offers/), best (idem, limit ≤ 50) "
+    "ou cross (from_currency, to_currency, country_from, country_to). Carnets chargés en une requête et "
+    "règles d'ajustement figées pour tout le lot (config_version). Erreur d'une sous-requête = error + status "
+    "dans son résultat, sans échec du lot. Facturation : une par sous-requête réussie ou une par lot (API_BATCH_BILLING).",
+    examples=[
+        OpenApiExample(
+            "Lot",
+            value={"queries": [
+                {"id": "xof_sell", "type": "best", "fiat": "XOF", "trade_type": "SELL", "country": "CI", "limit": 3},
+                {"id": "xof_ghs", "type": "cross", "from_currency": "XOF", "to_currency": "GHS"},
+            ]},
+            request_only=True,
+        ),
+    ],
+    responses={
+        200: OpenApiResponse(description="config_version + billed_calls + results[id]."),
+        400: OpenApiResponse(description="queries invalide, trop de requêtes ou id en double."),
+        429: OpenApiResponse(description="Quota mensuel insuffisant pour le lot."),
+    },
+)
+@throttle_scope("batch")
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+def offers_batch(request):
+    body = request.data if isinstance(request.data, dict) else {}
+    raw_queries = body.get("queries")
+    if not isinstance(raw_queries, list) or not raw_queries:
+        return Response({"error": "queries : liste non vide requise."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(raw_queries) > BATCH_MAX_QUERIES:
+        return Response({"error": f"Au plus {BATCH_MAX_QUERIES} requêtes par lot."}, status=status.HTTP_400_BAD_REQUEST)
+    queries, results, seen = [], {}, set()
+    for position, raw in enumerate(raw_queries):
+        try:
+            query = _parse_batch_query(raw, position)
+        except ValueError as e:
+            query_id = str(raw.get("id") or position) if isinstance(raw, dict) else str(position)
+            results[query_id] = {"error": str(e), "status": status.HTTP_400_BAD_REQUEST}
+            continue
+        if query["id"] in results or query["id"] in seen:
+            return Response({"error": f"id en double : {query['id']}."}, status=status.HTTP_400_BAD_REQUEST)
+        seen.add(query["id"])
+        queries.append(query)
+    # Réserve le lot entier (au plus) ; le middleware rend la part non facturée
+    reserve_quota(request, _batch_billing_units(len(queries)))
+    if SANDBOX_API:
+        config_version = None
+        evaluated = {}
+        for q in queries:
+            if q["type"] == "cross":
+                evaluated[q["id"]] = {"rate": _sandbox_cross_rate(q["from_currency"], q["to_currency"]), "best_offer_from": None, "best_offer_to": None}
+            else:
+                evaluated[q["id"]] = {"offers": (_sandbox_offers(q["fiat"], q["trade_type"], q["country"]) or [])[:q["limit"]]}
+    else:
+        from offers.batch import run_batch
+        evaluated, config = run_batch(queries)
+        config_version = config.version
+    for_client = not _is_billing_exempt(request)
+    succeeded = 0
+    for q in queries:
+        result = evaluated[q["id"]]
+        if "error" not in result:
+            succeeded += 1
+        if q["type"] == "cross":
+            if "error" not in result:
+                result = dict(result)
+                for side, country in (("best_offer_from", q["country_from"]), ("best_offer_to", q["country_to"])):
+                    if result.get(side):
+                        result[side] = _format_offer_for_api(result[side], country, for_client=for_client)
+                        if for_client:
+                            result[side].pop("price", None)
+            results[q["id"]] = result
+        else:
+            offers = [_format_offer_for_api(o, q["country"], for_client=for_client) for o in result["offers"]]
+            results[q["id"]] = {"count": len(offers), "offers": offers}
+    billed = _batch_billing_units(succeeded) if succeeded else 0
+    # Lu par api.middleware.api_key_usage_middleware
+    request._request.api_billable_calls = billed
+    return Response({"config_version": config_version, "billed_calls": billed, "results": results})
+
+
+# ---------------------------------------------------------------------------
+# API 1d : Changements d'un carnet depuis une génération (clients qui recopient le carnet)
+# ---------------------------------------------------------------------------
+@extend_schema(
+    parameters=[
+        OpenApiParameter("fiat", str, description="Devise (XOF, GHS, etc.)"),
+        OpenApiParameter("trade_type", str, description="BUY ou SELL"),
+        OpenApiParameter("country", str, required=False, description="Code pays. Vide = tous les pays."),
+        OpenApiParameter("since", int, required=False, description="Dernière génération connue du client. Absent ou 0 = resync."),
+    ],
+    description="Changements du carnet (plateforme par défaut) depuis la génération since : upserts = offres ajoutées "
+    "ou modifiées (même format que /offers/, filtre liquidité et ajustement appliqués), removed = offer_id à retirer. "
+    "resync=true : client trop en retard, recharger /offers/ puis reprendre avec since=generation. "
+    "config_version change quand les règles d'ajustement ou de liquidité changent : recharger aussi. "
+    "Application idempotente (dernier état par offer_id).",
+    responses={
+        200: OpenApiResponse(description="generation, resync, config_version, upserts, removed."),
+        400: OpenApiResponse(description="Paramètres invalides."),
+        404: OpenApiResponse(description="Disponible uniquement avec les snapshots du refresh."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+def offers_changes(request):
+    fiat = request.query_params.get("fiat", "XOF").strip().upper()
+    trade_type = request.query_params.get("trade_type", "SELL").upper()
+    if trade_type not in ("BUY", "SELL"):
+        return Response({"error": "trade_type doit être BUY ou SELL."}, status=status.HTTP_400_BAD_REQUEST)
+    country = request.query_params.get("country") or None
+    try:
+        since = int(request.query_params.get("since") or 0)
+    except (TypeError, ValueError):
+        return Response({"error": "since doit être un entier."}, status=status.HTTP_400_BAD_REQUEST)
+    if SANDBOX_API or not getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        return Response({"error": "Flux de changements disponible uniquement avec les snapshots du refresh."}, status=status.HTTP_404_NOT_FOUND)
+    from core.majoration import majoration_for
+    from offers.batch import PinnedConfig
+    from offers.changes import changes_since
+    from platforms.registry import get_default_platform
+
+    platform = get_default_platform()
+    if not platform:
+        return Response({"error": "Aucune plateforme."}, status=status.HTTP_404_NOT_FOUND)
+    delta = changes_since(platform.code, fiat, trade_type, country, since)
+    config = PinnedConfig()
+    accept = config.liquidity[trade_type]
+    adjusters = {}
+    for_client = not _is_billing_exempt(request)
+    upserts, removed = [], list(delta["removed"])
+    for o in delta["upserts"]:
+        if not accept(o):
+            # Ne passe plus le filtre liquidité : à retirer côté client
+            removed.append(o["offer_id"])
+            continue
+        o_country = o.get("country") or country or ""
+        adjust = adjusters.get(o_country)
+        if adjust is None:
+            adjust = adjusters[o_country] = majoration_for(fiat, trade_type, o_country, config.offer_rules)
+        o = dict(o, adjusted_price=adjust(o.get("price") or 0))
+        o.setdefault("fiat", fiat)
+        upserts.append(_format_offer_for_api(o, country, for_client=for_client))
+    return Response({
+        "fiat": fiat,
+        "trade_type": trade_type,
+        "country": country,
+        "since": since,
+        "generation": delta["generation"],
+        "resync": delta["resync"],
+        "config_version": config.version,
+        "upserts": upserts,
+        "removed": removed,
+    })
+
+
+# ---------------------------------------------------------------------------
+# API 1e : Flux SSE (meilleur prix / top-K, taux croisés) — serveur ASGI requis
+# ---------------------------------------------------------------------------
+@extend_schema(
+    parameters=[
+        OpenApiParameter("books", str, required=False, description="Carnets suivis : FIAT:BUY|SELL[:PAYS] séparés par des virgules (ex. XOF:SELL:CI,GHS:BUY)."),
+        OpenApiParameter("cross", str, required=False, description="Taux croisés suivis : FROM[:PAYS]-TO[:PAYS] séparés par des virgules (ex. XOF-GHS)."),
+        OpenApiParameter("top", int, required=False, description="Nombre d'offres par carnet (défaut 3, max 10)."),
+        OpenApiParameter("last_event_id", str, required=False, description="Reprise si l'en-tête Last-Event-ID ne peut pas être envoyé."),
+    ],
+    description="text/event-stream : événements book (best_price + top offres) et cross (rate), envoyés à la connexion "
+    "puis seulement quand ils changent après un refresh. Heartbeat « : ping » régulier. id = générations reçues ; "
+    "à la reconnexion (Last-Event-ID), seuls les sujets modifiés depuis sont renvoyés.",
+    responses={
+        200: OpenApiResponse(description="Flux text/event-stream."),
+        400: OpenApiResponse(description="Sujets invalides."),
+        404: OpenApiResponse(description="Disponible uniquement avec les snapshots du refresh."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def offers_stream(request):
+    from django.http import StreamingHttpResponse
+    from api.stream import event_stream, parse_resume, parse_topics
+
+    if SANDBOX_API or not getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        return Response({"error": "Flux disponible uniquement avec les snapshots du refresh."}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        top = min(10, max(1, int(request.query_params.get("top", 3))))
+    except (TypeError, ValueError):
+        top = 3
+    try:
+        topics = parse_topics(request.query_params.get("books", ""), request.query_params.get("cross", ""), top)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    last_event_id = request.META.get("HTTP_LAST_EVENT_ID") or request.query_params.get("last_event_id")
+    audience = "internal" if _is_billing_exempt(request) else "client"
+    response = StreamingHttpResponse(
+        event_stream(topics, audience, parse_resume(last_event_id, topics)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Nginx : pas de mise en tampon du flux
+    return response
+
+
 # ---------------------------------------------------------------------------
 # Endpoints commentés (hors scope des 4 APIs retenues)
 # ---------------------------------------------------------------------------
 # @extend_schema(...)
 # @api_view(["GET"])
-# @permission_classes([IsAuthenticated])
+# @permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 # def offers_binance_raw(request):
 #     """Réponse brute Binance P2P (toutes pages). Désactivé."""
 #     ...
@@ -384,11 +774,13 @@ def offers_best(request):
         OpenApiParameter("to_currency", str, description="Devise cible (ex. GHS)"),
         OpenApiParameter("country_from", str, required=False, description="Pays devise source. Vide = tous les pays."),
         OpenApiParameter("country_to", str, required=False, description="Pays devise cible. Vide = tous les pays."),
+        OpenApiParameter("amount", float, required=False, description="Montant en devise source. Si fourni : taux effectif pondéré (VWAP) sur la profondeur des deux carnets, en respectant les min/max des offres."),
     ],
-    description="Taux croisé 1 from_currency = X to_currency via USDT. Retourne le rate + la meilleure offre côté source (BUY) et côté cible (SELL) avec min/max, annonceur, moyens de paiement.",
+    description="Taux croisé 1 from_currency = X to_currency via USDT. Retourne le rate + la meilleure offre côté source (BUY) et côté cible (SELL) avec min/max, annonceur, moyens de paiement. "
+    "Avec amount : rate = taux effectif pour ce montant (montant reçu / amount), offres utilisées de chaque côté avec le montant pris sur chacune.",
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def cross_rate(request):
     from_c = request.query_params.get("from_currency", "XOF").strip().upper()
     to_c = request.query_params.get("to_currency", "GHS").strip().upper()
@@ -399,6 +791,15 @@ def cross_rate(request):
     if SANDBOX_API:
         rate = _sandbox_cross_rate(from_c, to_c)
         return Response({"from_currency": from_c, "to_currency": to_c, "rate": rate, "best_offer_from": None, "best_offer_to": None})
+    amount = None
+    if request.query_params.get("amount") not in (None, ""):
+        try:
+            amount = float(request.query_params.get("amount"))
+        except (TypeError, ValueError):
+            amount = -1
+        if not amount > 0:
+            return Response({"error": "amount doit être un nombre > 0."}, status=status.HTTP_400_BAD_REQUEST)
+        return _cross_rate_for_amount(request, from_c, to_c, country_from, country_to, amount)
     # Cross : même source que les offres (snapshot si USE_REFRESH_AS_SOURCE, sinon live)
     use_refresh = getattr(settings, "USE_REFRESH_AS_SOURCE", False)
     if use_refresh:
@@ -465,6 +866,229 @@ def cross_rate(request):
     })
 
 
+def _cross_books(from_c, to_c, country_from, country_to):
+    """(carnet BUY source, index, carnet SELL cible, index) triés : snapshot indexé au refresh, sinon live indexé ici."""
+    from offers.index import build_snapshot_index, get_snapshot_book, sort_book
+
+    if getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        from platforms.registry import get_default_platform
+        platform = get_default_platform()
+        if not platform:
+            empty_buy, empty_sell = build_snapshot_index([], "BUY"), build_snapshot_index([], "SELL")
+            return [], empty_buy, [], empty_sell
+        return get_snapshot_book(platform.code, from_c, "BUY", country_from) + get_snapshot_book(platform.code, to_c, "SELL", country_to)
+    offers_from = sort_book(fetch_offers_raw(asset="USDT", fiat=from_c, trade_type="BUY", country=country_from, platform_code=None), "BUY")
+    offers_to = sort_book(fetch_offers_raw(asset="USDT", fiat=to_c, trade_type="SELL", country=country_to, platform_code=None), "SELL")
+    return offers_from, build_snapshot_index(offers_from, "BUY"), offers_to, build_snapshot_index(offers_to, "SELL")
+
+
+def _cross_rate_for_amount(request, from_c, to_c, country_from, country_to, amount):
+    """
+    Taux croisé effectif pour `amount` from_c : leg source = achat d'USDT sur le carnet BUY (dichotomie dans
+    les sommes préfixes, min/max respectés), leg cible = vente de cet USDT sur le carnet SELL.
+    Prix moyens pondérés (VWAP) de chaque leg, puis ajustement croisé comme pour le meilleur prix.
+    """
+    from core.majoration import cross_adjustment_for
+    from offers.index import quote_depth
+
+    offers_from, index_from, offers_to, index_to = _cross_books(from_c, to_c, country_from, country_to)
+    leg_from = quote_depth(offers_from, index_from, amount)
+    leg_to = quote_depth(offers_to, index_to, leg_from["output"]) if leg_from else None
+    if leg_from is None or leg_to is None:
+        if leg_from is None:
+            side, wanted, cap, unit = f"{from_c} BUY", amount, index_from["depth"]["cap"][-1], from_c
+        else:
+            side, wanted, cap, unit = f"{to_c} SELL", leg_from["output"], index_to["depth"]["cap"][-1], "USDT"
+        if wanted > cap:
+            detail = f"Profondeur insuffisante : {round(wanted, 2)} {unit} demandés, capacité totale des offres {side} {round(cap, 2)} {unit}."
+        else:
+            detail = f"Montant non exécutable : {round(wanted, 2)} {unit} ne peuvent pas être répartis sur les offres {side} en respectant leurs min/max."
+        return Response(
+            {"error": "Taux non disponible", "detail": detail, "missing": [f"profondeur {side}"]},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    usdt = leg_from["output"]
+    vwap_buy = amount / usdt
+    vwap_sell = leg_to["output"] / usdt
+    rate = cross_adjustment_for(from_c, to_c)(vwap_buy, vwap_sell)
+    for_client = not _is_billing_exempt(request)
+
+    def used(offers, leg, fiat, country, unit):
+        out = []
+        for pos, taken, _received in leg["fills"]:
+            o = dict(offers[pos])  # carnet partagé (cache du process) : ne pas le modifier
+            o.setdefault("fiat", fiat)
+            item = _format_offer_for_api(o, country, for_client=for_client)
+            if for_client:
+                item.pop("price", None)
+            item[f"fill_{unit}"] = round(taken, 8)
+            out.append(item)
+        return out
+
+    payload = {
+        "from_currency": from_c,
+        "to_currency": to_c,
+        "amount": amount,
+        "rate": round(rate, 8),
+        "amount_received": round(amount * rate, 8),
+        "usdt": round(usdt, 8),
+        "offers_from": used(offers_from, leg_from, from_c, country_from, "fiat"),
+        "offers_to": used(offers_to, leg_to, to_c, country_to, "usdt"),
+    }
+    if not for_client:
+        payload["vwap_buy"] = round(vwap_buy, 8)
+        payload["vwap_sell"] = round(vwap_sell, 8)
+    return Response(payload)
+
+
+# ---------------------------------------------------------------------------
+# API 2b : Matrice des taux croisés (matérialisée au refresh)
+# ---------------------------------------------------------------------------
+@extend_schema(
+    parameters=[
+        OpenApiParameter("currencies", str, required=False, description="Devises à inclure, séparées par des virgules (ex. XOF,GHS). Vide = toutes."),
+        OpenApiParameter("countries", bool, required=False, description="Inclure les nœuds par pays (FIAT:PAYS). Défaut true."),
+    ],
+    description="Matrice N×N des taux croisés ajustés (1 source = X cible), calculée une fois après chaque refresh. "
+    "rates[source][cible] ; nœud = FIAT (tous pays) ou FIAT:PAYS ; null = pas d'offre d'un côté. "
+    "Même calcul que GET /rates/cross/ (meilleur BUY source, meilleur SELL cible, ajustement croisé).",
+    responses={
+        200: OpenApiResponse(description="generation, created_at, nodes, rates (+ best_prices pour les clés exemptes)."),
+        404: OpenApiResponse(description="Aucune matrice calculée (refresh pas encore exécuté)."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+def cross_rate_matrix(request):
+    from core.cross_matrix import get_latest_matrix
+
+    matrix = get_latest_matrix()
+    if matrix is None:
+        return Response(
+            {"error": "Matrice non disponible", "detail": "Aucune matrice calculée : le refresh n'a pas encore été exécuté."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    wanted = {c.strip().upper() for c in (request.query_params.get("currencies") or "").split(",") if c.strip()}
+    with_countries = (request.query_params.get("countries") or "true").lower() not in ("0", "false", "no")
+
+    def keep(key):
+        fiat, _, country = key.partition(":")
+        return (not wanted or fiat in wanted) and (with_countries or not country)
+
+    nodes = [key for key in matrix.rates if keep(key)]
+    payload = {
+        "generation": matrix.generation,
+        "created_at": matrix.created_at.isoformat(),
+        "nodes": nodes,
+        "rates": {src: {dst: row.get(dst) for dst in nodes} for src, row in matrix.rates.items() if keep(src)},
+    }
+    if _is_billing_exempt(request):
+        payload["platform"] = matrix.platform
+        payload["best_prices"] = {
+            fiat: {c: sides for c, sides in countries.items() if with_countries or not c}
+            for fiat, countries in matrix.best_prices.items()
+            if not wanted or fiat in wanted
+        }
+    return Response(payload)
+
+
+# ---------------------------------------------------------------------------
+# API 2c : Historique des taux (bougies OHLC minute / heure / jour)
+# ---------------------------------------------------------------------------
+RATE_HISTORY_MAX_POINTS = 1500
+RATE_HISTORY_DEFAULT_RANGE = {"minute": timedelta(hours=6), "hour": timedelta(days=7), "day": timedelta(days=365)}
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("source", str, description="Devise source (ex. XOF ; taux croisés : devise from)."),
+        OpenApiParameter("target", str, required=False, description="Devise cible (défaut USDT ; taux croisés : devise to)."),
+        OpenApiParameter("trade_type", str, required=False, description="BUY ou SELL (défaut BUY ; taux croisés : BUY)."),
+        OpenApiParameter("country", str, required=False, description="Code pays (vide = tous pays)."),
+        OpenApiParameter("platform", str, required=False, description="Plateforme (défaut : plateforme par défaut)."),
+        OpenApiParameter("granularity", str, required=False, description="minute, hour ou day (défaut hour)."),
+        OpenApiParameter("since", str, required=False, description="Début (date ou date-heure ISO, UTC). Défaut : 6 h (minute), 7 jours (hour), 365 jours (day)."),
+        OpenApiParameter("until", str, required=False, description="Fin exclue (défaut : maintenant)."),
+    ],
+    description=f"Bougies OHLC des taux enregistrés (open, high, low, close, samples = changements de taux), "
+    f"agrégées à l'écriture de l'historique. Au plus {RATE_HISTORY_MAX_POINTS} bougies par plage ; une période "
+    "sans changement de taux n'a pas de bougie. Bougies minute gardées quelques jours, heure un an, jour sans limite ; "
+    "au-delà, recalculées depuis l'historique long terme (segments) s'il est activé.",
+    responses={
+        200: OpenApiResponse(description="Clé, granularity, since, until, candles."),
+        400: OpenApiResponse(description="Paramètres invalides."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+def rate_history(request):
+    from offers.models import RateCandle
+    from platforms.registry import get_default_platform
+    from rates import segments
+    from rates.candles import GRANULARITIES, bucket_start
+
+    params = request.query_params
+    source = (params.get("source") or "").strip().upper()
+    target = (params.get("target") or "USDT").strip().upper()
+    trade_type = (params.get("trade_type") or "BUY").strip().upper()
+    granularity = (params.get("granularity") or "hour").strip().lower()
+    if not source or trade_type not in ("BUY", "SELL"):
+        return Response({"error": "Paramètres requis : source ; trade_type BUY ou SELL."}, status=status.HTTP_400_BAD_REQUEST)
+    if granularity not in GRANULARITIES:
+        return Response({"error": "granularity doit être minute, hour ou day."}, status=status.HTTP_400_BAD_REQUEST)
+    platform = (params.get("platform") or "").strip()
+    if not platform:
+        default = get_default_platform()
+        platform = default.code if default else ""
+    now = timezone.now()
+    try:
+        until = _parse_usage_datetime(params["until"], "until") if params.get("until") else now
+        since = _parse_usage_datetime(params["since"], "since") if params.get("since") else until - RATE_HISTORY_DEFAULT_RANGE[granularity]
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    max_range = timedelta(seconds=GRANULARITIES[granularity] * RATE_HISTORY_MAX_POINTS)
+    if since >= until or until - since > max_range:
+        return Response(
+            {"error": f"Plage invalide : since < until et au plus {RATE_HISTORY_MAX_POINTS} bougies ({granularity})."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    country = (params.get("country") or "").strip().upper()
+    # Avant la rétention des bougies en base : bougies recalculées depuis les segments (si activés)
+    older = []
+    split = since
+    retention = getattr(settings, "RATE_CANDLE_RETENTION_DAYS", {}).get(granularity)
+    if retention and segments.enabled():
+        cutoff = bucket_start(now - timedelta(days=retention), granularity) + timedelta(seconds=GRANULARITIES[granularity])
+        if since < cutoff:
+            split = min(until, cutoff)
+            older = [
+                (c["start"], c["open"], c["high"], c["low"], c["close"], c["samples"])
+                for c in segments.candles((source, target, trade_type, country, platform), granularity, since, split)
+            ]
+    candles = older + list(
+        RateCandle.objects.filter(
+            source_currency=source, target_currency=target, trade_type=trade_type, granularity=granularity,
+            country=country, platform=platform, start__gte=split, start__lt=until,
+        )
+        .order_by("start")
+        .values_list("start", "open", "high", "low", "close", "samples")
+    )
+    return Response({
+        "source": source,
+        "target": target,
+        "trade_type": trade_type,
+        "country": country or None,
+        "platform": platform,
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "candles": [
+            {"start": start, "open": float(o), "high": float(h), "low": float(lo), "close": float(c), "samples": n}
+            for start, o, h, lo, c, n in candles
+        ],
+    })
+
+
 # Liste des plateformes — désactivé (hors scope)
 # def platforms_list(request): ...
 
@@ -480,7 +1104,7 @@ def cross_rate(request):
     description="Liste des devises gérées (admin Core > Devises).",
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def currencies_list(request):
     trade_type = request.query_params.get("trade_type")
     qs = Currency.objects.filter(active=True).order_by("order", "code")
@@ -513,7 +1137,7 @@ def currencies_list(request):
     },
 )
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def countries_list(request):
     """Pays gérés par devise. ?fiat=XOF → pays XOF. Sans param → tous les pays avec fiat."""
     fiat = request.query_params.get("fiat", "").strip().upper()
@@ -536,15 +1160,17 @@ def countries_list(request):
         OpenApiParameter("trade_type", str, description="BUY ou SELL."),
         OpenApiParameter("country", str, required=False, description="Code pays (ex. BJ). Optionnel."),
     ],
-    description="Résout une référence (annonceur) et retourne les infos complètes pour exécuter la transaction. Réservé aux clés API exemptes de facturation.",
+    description="Résout une référence (annonceur) et retourne les infos complètes pour exécuter la transaction. Réservé aux clés API exemptes de facturation. "
+    "Lecture par index (reference → offres) construit au refresh : une référence inconnue est rejetée sans lire de carnet.",
     responses={
         200: OpenApiResponse(description="Advertiser + moyens de paiement + contexte offre."),
         403: OpenApiResponse(description="Clé non exempte : accès refusé."),
         404: OpenApiResponse(description="Aucune offre trouvée pour cette référence."),
     },
 )
+@throttle_scope("advertiser")
 @api_view(["GET"])
-@permission_classes([IsAuthenticated])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
 def advertiser_lookup(request):
     """
     Le client utilise notre taux et renvoie la « reference » de l’offre choisie.
@@ -567,30 +1193,337 @@ def advertiser_lookup(request):
         )
     if SANDBOX_API:
         return Response({"error": "Non disponible en mode sandbox."}, status=status.HTTP_404_NOT_FOUND)
-    offers = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None)
     ref_str = str(reference)
-    for o in offers:
-        adv = o.get("advertiser") or {}
-        if isinstance(adv, dict) and str(adv.get("user_no")) == ref_str:
-            return Response({
-                "reference": ref_str,
-                "advertiser": adv,
-                "payment_methods": o.get("payment_methods"),
-                "offer_id": o.get("offer_id"),
-                "platform": o.get("platform"),
-                "fiat": o.get("fiat"),
-                "trade_type": o.get("trade_type"),
-                "country": country or o.get("country"),
-                "min_fiat": o.get("min_fiat"),
-                "max_fiat": o.get("max_fiat"),
-                "price": o.get("price"),
-                "adjusted_price": o.get("adjusted_price") or o.get("price"),
-            })
+    if getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        # Index reference → positions (OfferReference) : une requête, carnet décodé seulement s'il contient la reference
+        found = resolve_reference_offers([ref_str], fiat, trade_type, country or "").get(ref_str)
+        if found:
+            return Response(_advertiser_payload(ref_str, found[0], country))
+    else:
+        offers = fetch_offers(asset="USDT", fiat=fiat, trade_type=trade_type, country=country, platform_code=None)
+        for o in offers:
+            adv = o.get("advertiser") or {}
+            if isinstance(adv, dict) and str(adv.get("user_no")) == ref_str:
+                return Response(_advertiser_payload(ref_str, o, country))
     return Response(
         {"error": "Aucune offre trouvée pour cette référence (ou offre expirée)."},
         status=status.HTTP_404_NOT_FOUND,
     )
 
 
+def _advertiser_payload(reference: str, o: dict, country=None) -> dict:
+    return {
+        "reference": reference,
+        "advertiser": o.get("advertiser"),
+        "payment_methods": o.get("payment_methods"),
+        "offer_id": o.get("offer_id"),
+        "platform": o.get("platform"),
+        "fiat": o.get("fiat"),
+        "trade_type": o.get("trade_type"),
+        "country": country or o.get("country"),
+        "min_fiat": o.get("min_fiat"),
+        "max_fiat": o.get("max_fiat"),
+        "price": o.get("price"),
+        "adjusted_price": o.get("adjusted_price") or o.get("price"),
+    }
+
+
+ADVERTISER_BATCH_MAX = 200
+
+
+@extend_schema(
+    request=inline_serializer(
+        "AdvertiserBatchRequest",
+        fields={
+            "references": serializers.ListField(child=serializers.CharField()),
+            "fiat": serializers.CharField(required=False),
+            "trade_type": serializers.CharField(required=False),
+            "country": serializers.CharField(required=False),
+        },
+    ),
+    description=f"Résout plusieurs références (max {ADVERTISER_BATCH_MAX}) en un appel. Sans fiat / trade_type : toutes devises "
+    "et tous types. Sans country : snapshots tous pays ; country=\"*\" : tous les snapshots. "
+    "Réponse : results[reference] = offres (ordre des prix) ; missing = références sans offre. Réservé aux clés API exemptes.",
+    responses={
+        200: OpenApiResponse(description="results + missing."),
+        400: OpenApiResponse(description="Paramètres invalides."),
+        403: OpenApiResponse(description="Clé non exempte : accès refusé."),
+    },
+)
+@throttle_scope("advertiser_batch")
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, CheckAPIKeyQuota])
+def advertiser_lookup_batch(request):
+    if not _is_billing_exempt(request):
+        return Response(
+            {"error": "Accès réservé aux clés API exemptes de facturation."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    body = request.data if isinstance(request.data, dict) else {}
+    references = body.get("references")
+    if not isinstance(references, list) or not references:
+        return Response({"error": "references : liste non vide requise."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(references) > ADVERTISER_BATCH_MAX:
+        return Response({"error": f"Au plus {ADVERTISER_BATCH_MAX} références par appel."}, status=status.HTTP_400_BAD_REQUEST)
+    references = [str(r).strip() for r in references if str(r).strip()]
+    fiat = (body.get("fiat") or "").strip().upper() or None
+    trade_type = (body.get("trade_type") or "").strip().upper() or None
+    if trade_type not in (None, "BUY", "SELL"):
+        return Response({"error": "trade_type doit être BUY ou SELL."}, status=status.HTTP_400_BAD_REQUEST)
+    country = (body.get("country") or "").strip()
+    country_filter = None if country == "*" else country
+    if SANDBOX_API or not getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        return Response({"error": "Résolution par lot disponible uniquement avec les snapshots du refresh."}, status=status.HTTP_404_NOT_FOUND)
+    found = resolve_reference_offers(references, fiat, trade_type, country_filter)
+    return Response({
+        "results": {ref: [_advertiser_payload(ref, o) for o in offers] for ref, offers in found.items()},
+        "missing": [ref for ref in dict.fromkeys(references) if ref not in found],
+    })
+
+
+# ---------------------------------------------------------------------------
+# API 5b : Déclarations clients (offre exécutée) — toutes clés, non facturé
+# ---------------------------------------------------------------------------
+ADVERTISER_USAGE_MAX_BATCH = getattr(settings, "ADVERTISER_USAGE_MAX_BATCH", 500)
+
+
+def _parse_declaration(raw, position: int) -> dict:
+    """Déclaration du corps de requête → champs validés ; ValueError avec message sinon."""
+    from decimal import Decimal, InvalidOperation
+
+    if not isinstance(raw, dict):
+        raise ValueError(f"declarations[{position}] : objet attendu.")
+    reference = str(raw.get("reference") or "").strip()
+    if not reference or len(reference) > 64:
+        raise ValueError(f"declarations[{position}] : reference requise (64 caractères max).")
+    fiat = str(raw.get("fiat") or "").strip().upper()
+    if len(fiat) > 10:
+        raise ValueError(f"declarations[{position}] : fiat invalide.")
+    trade_type = str(raw.get("trade_type") or "").strip().upper()
+    if trade_type not in ("", "BUY", "SELL"):
+        raise ValueError(f"declarations[{position}] : trade_type doit être BUY ou SELL.")
+    amount = raw.get("amount")
+    if amount in (None, ""):
+        amount = None
+    else:
+        try:
+            amount = Decimal(str(amount))
+        except InvalidOperation:
+            raise ValueError(f"declarations[{position}] : amount doit être un nombre.")
+        if not amount.is_finite() or amount < 0 or amount >= Decimal("1e12"):
+            raise ValueError(f"declarations[{position}] : amount invalide.")
+        amount = amount.quantize(Decimal("1e-8"))
+    return {"reference": reference, "fiat": fiat, "trade_type": trade_type, "amount": amount}
+
+
+@extend_schema(
+    request=inline_serializer(
+        "AdvertiserUsageRequest",
+        fields={
+            "reference": serializers.CharField(required=False),
+            "fiat": serializers.CharField(required=False),
+            "trade_type": serializers.CharField(required=False),
+            "amount": serializers.DecimalField(max_digits=20, decimal_places=8, required=False),
+            "declarations": serializers.ListField(child=serializers.DictField(), required=False),
+        },
+    ),
+    description=f"Déclare les offres exécutées : une déclaration (reference, fiat, trade_type, amount) ou "
+    f"declarations = liste (max {ADVERTISER_USAGE_MAX_BATCH}). Écriture différée par lots (202) ; les cumuls par "
+    "annonceur alimentent le classement des offres (order=score). Déclarations invalides ignorées et listées "
+    "dans errors. Non facturé.",
+    responses={
+        202: OpenApiResponse(description="accepted + errors."),
+        400: OpenApiResponse(description="Corps invalide, aucune déclaration valide ou requête sans clé API."),
+    },
+)
+@throttle_scope("advertiser_usage")
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def advertiser_usage(request):
+    from core import advertiser_usage as declarations_buffer
+
+    # Déclarations : jamais décomptées
+    request._request.api_billable_calls = 0
+    api_key = getattr(request.user, "api_key", None)
+    if api_key is None:
+        return Response({"error": "Authentification par clé API requise."}, status=status.HTTP_400_BAD_REQUEST)
+    body = request.data
+    if isinstance(body, dict) and "declarations" in body:
+        body = body["declarations"]
+    items = body if isinstance(body, list) else [body]
+    if not items:
+        return Response({"error": "declarations : liste non vide requise."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > ADVERTISER_USAGE_MAX_BATCH:
+        return Response(
+            {"error": f"Au plus {ADVERTISER_USAGE_MAX_BATCH} déclarations par appel."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    declared_at = timezone.now()
+    valid, errors = [], []
+    for position, raw in enumerate(items):
+        try:
+            fields = _parse_declaration(raw, position)
+        except ValueError as e:
+            errors.append({"index": position, "error": str(e)})
+            continue
+        valid.append(declarations_buffer.declaration(api_key.pk, declared_at=declared_at, **fields))
+    if not valid:
+        return Response({"error": "Aucune déclaration valide.", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+    accepted = declarations_buffer.declare(valid)
+    return Response({"accepted": accepted, "errors": errors}, status=status.HTTP_202_ACCEPTED)
+
+
+# ---------------------------------------------------------------------------
+# API 6 : Usage de la clé API (séries heure / jour, agrégées en base)
+# ---------------------------------------------------------------------------
+USAGE_MAX_RANGE = {"hour": timedelta(days=31), "day": timedelta(days=366)}
+USAGE_DEFAULT_RANGE = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
+
+
+def _parse_usage_datetime(value, name):
+    """Date ISO (AAAA-MM-JJ) ou date-heure ISO → datetime UTC ; ValueError avec message sinon."""
+    from django.utils.dateparse import parse_date, parse_datetime
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{name} : date ISO attendue (AAAA-MM-JJ ou AAAA-MM-JJTHH:MM).")
+        parsed = datetime(day.year, day.month, day.day)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter("granularity", str, required=False, description="hour ou day (défaut day)."),
+        OpenApiParameter("since", str, required=False, description="Début (date ou date-heure ISO, UTC). Défaut : 24 h (hour) ou 30 jours (day)."),
+        OpenApiParameter("until", str, required=False, description="Fin exclue (défaut : maintenant)."),
+        OpenApiParameter("endpoint", str, required=False, description="Filtrer sur une vue API (ex. offers_list)."),
+        OpenApiParameter("by_endpoint", bool, required=False, description="true = une série par vue API."),
+    ],
+    description="Appels facturés de la clé API par heure ou par jour (reportés en base par flush_api_usage, "
+    "donc en retard de l'intervalle de report) et compteur temps réel du mois courant. Plage max : 31 jours "
+    "(hour), 366 jours (day). Non facturé.",
+    responses={
+        200: OpenApiResponse(description="granularity, since, until, current_month, total, series."),
+        400: OpenApiResponse(description="Paramètres invalides ou requête sans clé API."),
+    },
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def api_usage(request):
+    from django.db.models import Sum
+    from core import usage
+    from core.models import APIKeyUsageBucket
+
+    # Consultation de l'usage : jamais décomptée
+    request._request.api_billable_calls = 0
+    api_key = getattr(request.user, "api_key", None)
+    if api_key is None:
+        return Response({"error": "Authentification par clé API requise."}, status=status.HTTP_400_BAD_REQUEST)
+    params = request.query_params
+    granularity = (params.get("granularity") or "day").strip().lower()
+    if granularity not in USAGE_MAX_RANGE:
+        return Response({"error": "granularity doit être hour ou day."}, status=status.HTTP_400_BAD_REQUEST)
+    now = timezone.now()
+    try:
+        until = _parse_usage_datetime(params["until"], "until") if params.get("until") else now
+        since = _parse_usage_datetime(params["since"], "since") if params.get("since") else until - USAGE_DEFAULT_RANGE[granularity]
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if since >= until or until - since > USAGE_MAX_RANGE[granularity]:
+        return Response(
+            {"error": f"Plage invalide : since < until et au plus {USAGE_MAX_RANGE[granularity].days} jours ({granularity})."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    by_endpoint = (params.get("by_endpoint") or "").lower() in ("1", "true", "yes")
+    buckets = APIKeyUsageBucket.objects.filter(
+        api_key=api_key, granularity=granularity, start__gte=since, start__lt=until
+    )
+    if params.get("endpoint"):
+        buckets = buckets.filter(endpoint=params["endpoint"].strip())
+    group = ("start", "endpoint") if by_endpoint else ("start",)
+    series = [
+        {**{k: row[k] for k in group}, "calls": row["calls"]}
+        for row in buckets.values(*group).annotate(calls=Sum("call_count")).order_by(*group)
+    ]
+    period = now.strftime("%Y-%m")
+    return Response({
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "current_month": {"period": period, "calls": usage.used(api_key.pk, period), "quota": api_key.monthly_quota},
+        "total": sum(row["calls"] for row in series),
+        "series": series,
+    })
+
+
+# ---------------------------------------------------------------------------
+# Santé : plateformes (sonde en cache) + fraîcheur des snapshots — sans authentification
+# ---------------------------------------------------------------------------
+CACHE_HEALTH_KEY = "usdt_agg_health_endpoint"
+CACHE_HEALTH_TTL = 5
+
+
+def _health_payload() -> dict:
+    """Lecture cache (santé plateformes) + updated_at des snapshots (sans décoder les offres)."""
+    from django.core.cache import cache
+    from django.utils import timezone
+    from platforms.health import get_all_health
+
+    cached = cache.get(CACHE_HEALTH_KEY)
+    if cached is not None:
+        return cached
+    max_age = getattr(settings, "HEALTH_SNAPSHOT_MAX_AGE", 900)
+    now = timezone.now()
+    snapshots = []
+    for platform, fiat, trade_type, country, updated_at in OffersSnapshot.objects.values_list(
+        "platform", "fiat", "trade_type", "country", "updated_at"
+    ):
+        age = int((now - updated_at).total_seconds())
+        snapshots.append({
+            "platform": platform,
+            "fiat": fiat,
+            "trade_type": trade_type,
+            "country": country,
+            "age_seconds": age,
+            "stale": age > max_age,
+        })
+    platforms = {}
+    for code, health in get_all_health().items():
+        platforms[code] = health or {"code": code, "available": None, "stale": True}
+    stale_count = sum(1 for s in snapshots if s["stale"])
+    any_platform_up = any(h.get("available") is not False for h in platforms.values())
+    if not any_platform_up or (snapshots and stale_count == len(snapshots)):
+        status_label = "down"
+    elif stale_count or any(h.get("available") is False for h in platforms.values()):
+        status_label = "degraded"
+    else:
+        status_label = "ok"
+    payload = {
+        "status": status_label,
+        "checked_at": now.isoformat(),
+        "platforms": platforms,
+        "snapshots": {"count": len(snapshots), "stale": stale_count, "max_age_seconds": max_age, "items": snapshots},
+    }
+    cache.set(CACHE_HEALTH_KEY, payload, CACHE_HEALTH_TTL)
+    return payload
+
+
+@extend_schema(
+    description="Santé du service : disponibilité des plateformes (sonde périodique, lue en cache) et âge de chaque snapshot. "
+    "200 si ok/degraded, 503 si aucune plateforme disponible ou tous les snapshots périmés. Sans authentification.",
+    responses={200: OpenApiResponse(description="ok / degraded"), 503: OpenApiResponse(description="down")},
+)
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def health(request):
+    payload = _health_payload()
+    code = status.HTTP_503_SERVICE_UNAVAILABLE if payload["status"] == "down" else status.HTTP_200_OK
+    return Response(payload, status=code)
+
+
 # xof_countries_list — désactivé ; utiliser GET /countries/?fiat=XOF
 # best_rates_list — désactivé (hors scope des 4 APIs)
@@ -1,5 +1,4 @@
-from django.utils import timezone
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (
     Currency,
     Country,
@@ -9,9 +8,13 @@ from .models import (
     PlatformConfig,
     APIKey,
     APIKeyUsage,
+    APIKeyUsageBucket,
+    AdvertiserStats,
+    AdvertiserKeyStats,
     BillingConfig,
     BestRatesRefreshConfig,
     BestRate,
+    RateAlert,
 )
 
 
@@ -85,6 +88,50 @@ class APIKeyUsageAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(APIKeyUsageBucket)
+class APIKeyUsageBucketAdmin(admin.ModelAdmin):
+    list_display = ("api_key", "granularity", "start", "endpoint", "call_count")
+    list_filter = ("granularity", "endpoint")
+    date_hierarchy = "start"
+    readonly_fields = ("api_key", "granularity", "start", "endpoint", "call_count")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AdvertiserStats)
+class AdvertiserStatsAdmin(admin.ModelAdmin):
+    list_display = ("reference", "fiat", "trade_type", "declarations", "total_amount", "last_declared_at")
+    list_filter = ("fiat", "trade_type")
+    search_fields = ("reference",)
+    readonly_fields = ("reference", "fiat", "trade_type", "declarations", "total_amount", "last_declared_at")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AdvertiserKeyStats)
+class AdvertiserKeyStatsAdmin(admin.ModelAdmin):
+    list_display = ("api_key", "period", "declarations", "total_amount")
+    list_filter = ("period",)
+    readonly_fields = ("api_key", "period", "declarations", "total_amount")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RateAlert)
+class RateAlertAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "kind", "source_currency", "target_currency", "trade_type", "country", "platform", "value", "expected", "zscore", "quarantined", "acknowledged")
+    list_filter = ("kind", "quarantined", "acknowledged", "trade_type")
+    list_editable = ("acknowledged",)
+    date_hierarchy = "created_at"
+    readonly_fields = ("kind", "source_currency", "target_currency", "trade_type", "country", "platform", "value", "expected", "zscore", "quarantined", "created_at")
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(BillingConfig)
 class BillingConfigAdmin(admin.ModelAdmin):
     list_display = ("price_per_call", "currency", "updated_at")
@@ -100,22 +147,24 @@ class BillingConfigAdmin(admin.ModelAdmin):
 class APIKeyAdmin(admin.ModelAdmin):
     list_display = ("name", "key_preview", "active", "billing_exempt", "monthly_quota", "usage_current_month", "created_at")
     list_filter = ("active", "billing_exempt")
-    readonly_fields = ("key",)
+    readonly_fields = ("prefix",)
 
     def key_preview(self, obj):
-        if not obj.key:
+        if not obj.prefix:
             return "—"
-        return f"{obj.key[:8]}…" if len(obj.key) > 8 else obj.key
+        return f"{obj.prefix}…"
     key_preview.short_description = "Clé"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if getattr(obj, "plaintext_key", None):
+            # Seule occasion de voir la clé : seule son empreinte est enregistrée
+            messages.warning(request, f"Clé API « {obj.name} » : {obj.plaintext_key} — copiez-la maintenant, elle ne sera plus affichée.")
+
     def usage_current_month(self, obj):
-        period = timezone.now().strftime("%Y-%m")
-        try:
-            u = APIKeyUsage.objects.get(api_key=obj, period=period)
-            quota = f" / {obj.monthly_quota}" if obj.monthly_quota else ""
-            return f"{u.call_count}{quota}"
-        except APIKeyUsage.DoesNotExist:
-            return f"0{f' / {obj.monthly_quota}' if obj.monthly_quota else ''}"
+        from core import usage
+        quota = f" / {obj.monthly_quota}" if obj.monthly_quota else ""
+        return f"{usage.used(obj.pk)}{quota}"
     usage_current_month.short_description = "Appels ce mois"
 
 
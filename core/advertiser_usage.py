@@ -0,0 +1,150 @@
+"""
+Déclarations clients « offre exécutée » (POST /api/v1/advertiser/usage/) : écriture par lots et cumuls.
+
+Les déclarations passent par un tampon du process (core.buffered) : un lot = un bulk_create dans
+AdvertiserUsage (journal brut) et, dans la même transaction, les cumuls mis à jour par incrément :
+- AdvertiserStats (reference, devise, type) : déclarations, montant, dernière déclaration → score des offres ;
+- AdvertiserKeyStats (clé API, mois) : déclarations et montant déclarés → facturation / dashboard.
+Lignes de cumul manquantes créées en un bulk_create, incréments appliqués par UPDATE ... F() + CASE.
+Les lectures (executed_counts, dashboard) ne parcourent jamais le journal brut.
+
+Tampon : ADVERTISER_USAGE_BUFFER_SIZE déclarations ou ADVERTISER_USAGE_FLUSH_SECONDS s (0 = écriture immédiate).
+AdvertiserUsage.created_at est l'heure d'écriture du lot ; les cumuls utilisent l'heure de déclaration.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.buffered import BufferedWriter, register
+
+logger = logging.getLogger(__name__)
+
+# Groupes par UPDATE ... CASE (taille de la requête bornée)
+UPDATE_CHUNK = 200
+
+
+def declaration(
+    api_key_id: int, reference: str, fiat: str = "", trade_type: str = "",
+    amount: Optional[Decimal] = None, declared_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Déclaration prête pour le tampon (valeurs déjà validées par la vue)."""
+    return {
+        "api_key_id": api_key_id,
+        "reference": reference[:64],
+        "fiat": (fiat or "")[:10],
+        "trade_type": (trade_type or "")[:4],
+        "amount": amount,
+        "declared_at": declared_at or timezone.now(),
+    }
+
+
+def write_declarations(batch: List[Dict[str, Any]]) -> None:
+    """Écrit un lot : journal brut + cumuls annonceur et clé, en une transaction."""
+    from core.models import AdvertiserKeyStats, AdvertiserStats, AdvertiserUsage
+
+    by_advertiser: Dict[Tuple[str, str, str], List] = defaultdict(lambda: [0, Decimal("0"), None])
+    by_key: Dict[Tuple[int, str], List] = defaultdict(lambda: [0, Decimal("0")])
+    for d in batch:
+        amount = d["amount"] or Decimal("0")
+        row = by_advertiser[(d["reference"], d["fiat"], d["trade_type"])]
+        row[0] += 1
+        row[1] += amount
+        row[2] = d["declared_at"] if row[2] is None else max(row[2], d["declared_at"])
+        row = by_key[(d["api_key_id"], d["declared_at"].strftime("%Y-%m"))]
+        row[0] += 1
+        row[1] += amount
+
+    with transaction.atomic():
+        AdvertiserUsage.objects.bulk_create(
+            [
+                AdvertiserUsage(
+                    api_key_id=d["api_key_id"], reference=d["reference"], fiat=d["fiat"],
+                    trade_type=d["trade_type"], amount=d["amount"],
+                )
+                for d in batch
+            ],
+            batch_size=500,
+        )
+        AdvertiserStats.objects.bulk_create(
+            [AdvertiserStats(reference=r, fiat=f, trade_type=t) for r, f, t in by_advertiser],
+            ignore_conflicts=True,
+        )
+        groups = list(by_advertiser.items())
+        for i in range(0, len(groups), UPDATE_CHUNK):
+            chunk = groups[i : i + UPDATE_CHUNK]
+
+            def case(index, default):
+                return Case(
+                    *(When(reference=r, fiat=f, trade_type=t, then=Value(v[index])) for (r, f, t), v in chunk),
+                    default=default,
+                )
+
+            declared_at = case(2, F("last_declared_at"))
+            AdvertiserStats.objects.filter(reference__in={r for (r, _, _), _ in chunk}).update(
+                declarations=F("declarations") + case(0, Value(0)),
+                total_amount=F("total_amount") + case(1, Value(Decimal("0"))),
+                # Plus récente des deux (lots de process différents écrits dans le désordre)
+                last_declared_at=Greatest(Coalesce(F("last_declared_at"), declared_at), declared_at),
+            )
+
+        AdvertiserKeyStats.objects.bulk_create(
+            [AdvertiserKeyStats(api_key_id=api_key_id, period=p) for api_key_id, p in by_key],
+            ignore_conflicts=True,
+        )
+        for p in {p for _, p in by_key}:
+            counts = {api_key_id: v for (api_key_id, row_period), v in by_key.items() if row_period == p}
+            AdvertiserKeyStats.objects.filter(period=p, api_key_id__in=list(counts)).update(
+                declarations=F("declarations")
+                + Case(*(When(api_key_id=k, then=Value(v[0])) for k, v in counts.items()), default=Value(0)),
+                total_amount=F("total_amount")
+                + Case(*(When(api_key_id=k, then=Value(v[1])) for k, v in counts.items()), default=Value(Decimal("0"))),
+            )
+    logger.debug("advertiser_usage: %s déclaration(s), %s annonceur(s) écrits", len(batch), len(by_advertiser))
+
+
+_writer: Optional[BufferedWriter] = None
+
+
+def get_writer() -> BufferedWriter:
+    global _writer
+    if _writer is None:
+        _writer = register(BufferedWriter(
+            "advertiser_usage",
+            write_declarations,
+            max_items=getattr(settings, "ADVERTISER_USAGE_BUFFER_SIZE", 200),
+            max_age=getattr(settings, "ADVERTISER_USAGE_FLUSH_SECONDS", 5.0),
+        ))
+    return _writer
+
+
+def declare(declarations: Iterable[Dict[str, Any]]) -> int:
+    """Met des déclarations (voir declaration()) en tampon ; retourne le nombre accepté."""
+    return get_writer().add(declarations)
+
+
+def executed_counts(fiat: str, trade_type: str, references: Iterable[str]) -> Dict[str, int]:
+    """
+    {reference: déclarations} pour un carnet, en une requête sur les cumuls (déclarations sans devise ou
+    sans type comprises).
+    """
+    from core.models import AdvertiserStats
+
+    references = [r for r in set(references) if r]
+    if not references:
+        return {}
+    return dict(
+        AdvertiserStats.objects.filter(
+            reference__in=references, fiat__in=[fiat, ""], trade_type__in=[trade_type, ""]
+        )
+        .values("reference")
+        .annotate(n=Sum("declarations"))
+        .values_list("reference", "n")
+    )
@@ -0,0 +1,185 @@
+"""
+Détection d'anomalies en continu sur les taux : moyenne et variance glissantes (EWMA) par flux, score z
+de chaque nouvelle valeur avant sa prise en compte. O(1) par mise à jour (trois nombres par flux).
+
+Valeurs suivies en logarithme (écarts relatifs : un même seuil vaut pour XOF et pour GHS) ; écart-type
+plancher RATE_ANOMALY_MIN_STD pour qu'un flux très stable n'alerte pas sur une variation infime.
+Pas de score avant RATE_ANOMALY_MIN_SAMPLES valeurs. Alerte au-delà de RATE_ANOMALY_Z.
+
+Flux :
+- rate : taux calculés (rates.history.record), état en mémoire du process ;
+- snapshot : meilleur prix de chaque carnet au refresh (core.best_rates) ;
+- divergence : meilleur prix d'un carnet pays rapporté au carnet tous pays du même refresh.
+Les flux du refresh gardent leur état dans le cache partagé (le refresh tourne dans un process par passage).
+Au refresh, un score au-delà de RATE_ANOMALY_QUARANTINE_Z met le carnet en quarantaine : il n'est pas
+enregistré et la génération précédente reste servie, au plus RATE_ANOMALY_MAX_QUARANTINE fois de suite
+(au-delà le marché a vraiment bougé : le carnet est accepté).
+
+Alertes enregistrées dans RateAlert par lots (core.buffered), visibles au dashboard.
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.buffered import BufferedWriter, register
+
+logger = logging.getLogger(__name__)
+
+CACHE_ANOMALY_PREFIX = "usdt_agg_anomaly"
+STATE_TTL = 7 * 24 * 3600
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class EWMA:
+    """Moyenne / variance exponentielles d'un flux (Welford pondéré) et compteur de quarantaines."""
+
+    __slots__ = ("mean", "var", "count", "quarantined")
+
+    def __init__(self, mean: float = 0.0, var: float = 0.0, count: int = 0, quarantined: int = 0):
+        self.mean = mean
+        self.var = var
+        self.count = count
+        self.quarantined = quarantined
+
+    def score(self, x: float) -> Optional[float]:
+        """Score z de x par rapport au flux ; None tant que le flux a moins de RATE_ANOMALY_MIN_SAMPLES valeurs."""
+        if self.count < _setting("RATE_ANOMALY_MIN_SAMPLES", 20):
+            return None
+        std = max(math.sqrt(self.var), _setting("RATE_ANOMALY_MIN_STD", 0.001))
+        return (x - self.mean) / std
+
+    def update(self, x: float) -> None:
+        if self.count == 0:
+            self.mean, self.var = x, 0.0
+        else:
+            alpha = _setting("RATE_ANOMALY_ALPHA", 0.1)
+            diff = x - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+
+    def state(self) -> Tuple[float, float, int, int]:
+        return (self.mean, self.var, self.count, self.quarantined)
+
+
+_local: Dict[Tuple, EWMA] = {}
+_local_lock = threading.Lock()
+
+
+def observe(key: Tuple, value: float) -> Tuple[Optional[float], float]:
+    """Flux en mémoire du process : (score z de value, moyenne attendue) avant mise à jour, puis mise à jour."""
+    x = math.log(value)
+    with _local_lock:
+        stream = _local.get(key)
+        if stream is None:
+            stream = _local[key] = EWMA()
+        z, expected = stream.score(x), math.exp(stream.mean)
+        stream.update(x)
+    return z, expected
+
+
+def _shared_key(key: Tuple) -> str:
+    return f"{CACHE_ANOMALY_PREFIX}:" + ":".join(str(part) for part in key)
+
+
+def observe_shared(key: Tuple, value: float, quarantine: bool = False) -> Tuple[Optional[float], float, bool]:
+    """
+    Flux dont l'état est dans le cache partagé (refresh). Retourne (score z, moyenne attendue, quarantaine ?).
+    quarantine=True : un score au-delà de RATE_ANOMALY_QUARANTINE_Z met la valeur en quarantaine, hors du flux ;
+    après RATE_ANOMALY_MAX_QUARANTINE quarantaines de suite elle est acceptée (vrai changement de niveau).
+    """
+    x = math.log(value)
+    state = cache.get(_shared_key(key))
+    stream = EWMA(*state) if state else EWMA()
+    z, expected = stream.score(x), math.exp(stream.mean)
+    quarantined = (
+        quarantine
+        and z is not None
+        and abs(z) >= _setting("RATE_ANOMALY_QUARANTINE_Z", 8.0)
+        and stream.quarantined < _setting("RATE_ANOMALY_MAX_QUARANTINE", 3)
+    )
+    if quarantined:
+        stream.quarantined += 1
+    else:
+        stream.quarantined = 0
+        stream.update(x)
+    cache.set(_shared_key(key), stream.state(), STATE_TTL)
+    return z, expected, quarantined
+
+
+def is_alert(z: Optional[float]) -> bool:
+    return z is not None and abs(z) >= _setting("RATE_ANOMALY_Z", 4.0)
+
+
+# --- Alertes ------------------------------------------------------------------
+def _write_alerts(batch: List[Dict[str, Any]]) -> None:
+    from core.models import RateAlert
+
+    RateAlert.objects.bulk_create([RateAlert(**row) for row in batch])
+
+
+_writer: Optional[BufferedWriter] = None
+
+
+def get_writer() -> BufferedWriter:
+    global _writer
+    if _writer is None:
+        _writer = register(BufferedWriter(
+            "rate_alerts", _write_alerts, max_items=100, max_age=_setting("RATE_ANOMALY_FLUSH_SECONDS", 5.0)
+        ))
+    return _writer
+
+
+def alert(
+    kind: str, source: str, target: str, trade_type: str, value: float, expected: float, z: float,
+    country: Optional[str] = None, platform: str = "", quarantined: bool = False,
+) -> None:
+    """Journalise et met en tampon une alerte RateAlert (expected et value en unités naturelles)."""
+    logger.warning(
+        "rate_anomaly %s %s/%s %s %s z=%.1f (%.6g, attendu %.6g)%s",
+        kind, source, target, trade_type, country or "", z, value, expected, " — quarantaine" if quarantined else "",
+    )
+    get_writer().add([{
+        "kind": kind,
+        "source_currency": source,
+        "target_currency": target,
+        "trade_type": trade_type,
+        "country": country or "",
+        "platform": platform,
+        "value": value,
+        "expected": expected,
+        "zscore": round(z, 3),
+        "quarantined": quarantined,
+        "created_at": timezone.now(),
+    }])
+
+
+def check_snapshot(
+    platform: str, fiat: str, trade_type: str, country: str, best: float, global_best: Optional[float] = None
+) -> bool:
+    """
+    Contrôle d'un carnet au refresh avant enregistrement : meilleur prix (flux snapshot) et, pour un pays,
+    rapport au meilleur prix tous pays du même refresh (flux divergence). True = carnet en quarantaine.
+    """
+    suspect = False
+    streams = [("snapshot", best)]
+    if country and global_best:
+        streams.append(("divergence", best / global_best))
+    for kind, value in streams:
+        z, expected, quarantined = observe_shared((kind, platform, fiat, trade_type, country), value, quarantine=True)
+        if quarantined or is_alert(z):
+            alert(
+                kind, "USDT", fiat, trade_type, value, expected, z,
+                country=country, platform=platform, quarantined=quarantined,
+            )
+        suspect = suspect or quarantined
+    return suspect
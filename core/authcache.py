@@ -0,0 +1,106 @@
+"""
+Cache de l'authentification API (clés API et utilisateurs JWT) : zéro requête SQL en régime établi.
+
+Deux niveaux :
+- process : dict LRU borné (API_AUTH_CACHE_SIZE), entrées valables API_AUTH_CACHE_TTL secondes ;
+- partagé : cache Django (Redis en production), API_AUTH_SHARED_TTL secondes.
+Un save / delete d'APIKey ou d'utilisateur (core.signals), ou un UPDATE en masse de clés API
+(APIKey.objects.filter(...).update(), bulk_update, actions admin : APIKeyQuerySet), efface l'entrée des deux
+niveaux ; les autres process la relisent au plus tard après API_AUTH_CACHE_TTL s (désactivation effective en
+quelques secondes). Seule une écriture hors ORM (SQL brut) reste servie jusqu'à API_AUTH_SHARED_TTL s.
+
+Les clés API sont indexées par empreinte (key_hash) : ni le cache ni la base ne voient la clé en clair.
+Une clé inconnue ou inactive est aussi mise en cache (négatif) pour ne pas relire la base à chaque essai.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_AUTH_PREFIX = "usdt_agg_auth"
+
+# Valeur mise en cache pour « pas de clé active / pas d'utilisateur » (None = absent du cache)
+MISSING = False
+
+
+class AuthCache:
+    """Cache process (TTL + LRU) devant le cache Django partagé, devant `loader` (base)."""
+
+    def __init__(self, namespace: str, loader: Callable[[str], Any]):
+        self.namespace = namespace
+        self.loader = loader
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared_key(self, ident: str) -> str:
+        return f"{CACHE_AUTH_PREFIX}:{self.namespace}:{ident}"
+
+    def get(self, ident: str) -> Any:
+        """Objet en cache ou chargé ; MISSING si loader ne trouve rien."""
+        ident = str(ident)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(ident)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(ident)
+                return entry[1]
+        value = cache.get(self._shared_key(ident))
+        if value is None:
+            value = self.loader(ident)
+            if value is None:
+                value = MISSING
+            cache.set(self._shared_key(ident), value, getattr(settings, "API_AUTH_SHARED_TTL", 300))
+        self._remember(ident, value, now)
+        return value
+
+    def _remember(self, ident: str, value: Any, now: float) -> None:
+        ttl = getattr(settings, "API_AUTH_CACHE_TTL", 5)
+        size = getattr(settings, "API_AUTH_CACHE_SIZE", 4096)
+        with self._lock:
+            self._local[ident] = (now + ttl, value)
+            self._local.move_to_end(ident)
+            while len(self._local) > size:
+                self._local.popitem(last=False)
+
+    def invalidate(self, ident: str) -> None:
+        ident = str(ident)
+        with self._lock:
+            self._local.pop(ident, None)
+        cache.delete(self._shared_key(ident))
+
+    def invalidate_many(self, idents: Iterable[str]) -> None:
+        idents = [str(ident) for ident in idents]
+        if not idents:
+            return
+        with self._lock:
+            for ident in idents:
+                self._local.pop(ident, None)
+        cache.delete_many([self._shared_key(ident) for ident in idents])
+
+    def invalidate_now_and_on_commit(self, idents: Iterable[str]) -> None:
+        """Efface maintenant et après commit : une lecture concurrente ne doit pas remettre l'ancienne valeur en cache."""
+        idents = list(idents)
+        self.invalidate_many(idents)
+        transaction.on_commit(lambda: self.invalidate_many(idents))
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+
+def _load_api_key(key_hash: str) -> Optional[Any]:
+    from core.models import APIKey
+    return APIKey.objects.filter(key_hash=key_hash, active=True).first()
+
+
+def _load_user(pk: str) -> Optional[Any]:
+    from django.contrib.auth import get_user_model
+    return get_user_model().objects.filter(pk=pk).first()
+
+
+api_keys = AuthCache("apikey", _load_api_key)
+users = AuthCache("user", _load_user)
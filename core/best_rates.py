@@ -1,12 +1,18 @@
 """
 Refresh = seule source de vérité.
 Récupère les offres brutes (plateforme) et les enregistre telles quelles dans OffersSnapshot.
-Aucun calcul : pas de tri top 3, pas de BestRate, pas de config ni ajustement.
+Pas de top 3 ni de BestRate, ni config ni ajustement : seulement le tri du carnet et ses index
+(offers.index), puis la matrice des taux croisés.
 Les APIs lisent OffersSnapshot puis appliquent config liquidité + ajustements.
+Avant enregistrement, chaque carnet passe la détection d'anomalies (core.anomaly) : un carnet en quarantaine
+n'est pas enregistré, la génération précédente reste servie.
 """
 import logging
 
-from core.models import Currency, Country, OffersSnapshot
+from core import anomaly
+from core.cross_matrix import build_cross_matrix
+from core.models import Currency, Country
+from offers.index import store_snapshot
 from offers.services import fetch_offers_raw
 from platforms.registry import init_platforms, get_all_platforms
 
@@ -21,6 +27,21 @@ def _country_list_for_fiat(fiat: str):
     return result
 
 
+def _best_price(offers, trade_type: str):
+    """Meilleur prix du carnet (BUY : le plus bas, SELL : le plus haut) ; None si aucun prix."""
+    prices = []
+    for o in offers:
+        try:
+            price = float(o.get("price") or 0)
+        except (TypeError, ValueError):
+            continue
+        if price > 0:
+            prices.append(price)
+    if not prices:
+        return None
+    return max(prices) if trade_type == "SELL" else min(prices)
+
+
 def refresh_best_rates() -> dict:
     """
     Récupère les offres brutes pour chaque (plateforme, devise, pays, BUY/SELL)
@@ -39,7 +60,10 @@ def refresh_best_rates() -> dict:
 
     logger.info("refresh_best_rates: plateformes=%s, devises=%s", list(platforms.keys()), supported_fiat)
     updated = 0
+    quarantined = 0
     errors = []
+    # Meilleur prix tous pays de ce refresh par (plateforme, devise, type) : référence des carnets pays
+    global_best = {}
 
     for platform_code, platform in platforms.items():
         for fiat in supported_fiat:
@@ -59,14 +83,24 @@ def refresh_best_rates() -> dict:
                             country=country_param,
                             platform_code=platform_code,
                             use_cache=False,
+                            strict=True,
                         )
-                        snapshot, _ = OffersSnapshot.objects.update_or_create(
-                            platform=platform_code,
-                            fiat=fiat,
-                            trade_type=trade_type,
-                            country=country or "",
-                            defaults={"data": offers},
-                        )
+                        best = _best_price(offers, trade_type)
+                        if best is not None:
+                            if anomaly.check_snapshot(
+                                platform_code, fiat, trade_type, country, best,
+                                global_best.get((platform_code, fiat, trade_type)),
+                            ):
+                                quarantined += 1
+                                logger.warning(
+                                    "refresh_best_rates: %s %s %s %s — carnet en quarantaine (meilleur prix %s)",
+                                    platform_code, fiat, country_label, trade_type, best,
+                                )
+                                continue
+                            if not country:
+                                global_best[(platform_code, fiat, trade_type)] = best
+                        # Carnet trié meilleur prix d'abord + index (profondeur, references...) calculés une fois ici
+                        store_snapshot(platform_code, fiat, trade_type, country, offers)
                         updated += 1
                         logger.info(
                             "refresh_best_rates: %s %s %s %s — %s offres enregistrées",
@@ -77,5 +111,16 @@ def refresh_best_rates() -> dict:
                         errors.append(msg)
                         logger.exception("refresh_best_rates: %s", msg)
 
-    logger.info("refresh_best_rates: fin — total snapshots=%s, errors=%s", updated, len(errors))
-    return {"updated": updated, "errors": errors}
+    try:
+        # Meilleurs prix extraits une fois + matrice croisée ajustée (API /rates/cross/matrix/, dashboard)
+        build_cross_matrix()
+    except Exception as e:
+        errors.append(f"matrice taux croisés: {e}")
+        logger.exception("refresh_best_rates: matrice taux croisés non calculée")
+
+    # Alertes du refresh écrites avant la fin de la commande (pas d'attente du thread du tampon)
+    anomaly.get_writer().flush()
+    logger.info(
+        "refresh_best_rates: fin — total snapshots=%s, quarantaine=%s, errors=%s", updated, quarantined, len(errors)
+    )
+    return {"updated": updated, "quarantined": quarantined, "errors": errors}
@@ -0,0 +1,186 @@
+"""
+Écriture différée par lots (write-behind) : les requêtes ajoutent des éléments à un tampon du process,
+un thread les écrit en un appel de `flush_fn` dès que le tampon atteint `max_items` ou au plus tard
+`max_age` secondes après le premier élément en attente. Un dernier flush est fait à l'arrêt du process.
+
+En cas d'échec de `flush_fn`, le lot est coupé en deux jusqu'à isoler les éléments refusés :
+- d'autres éléments du même lot passent → les éléments refusés seuls sont fautifs : abandonnés et journalisés ;
+- rien ne passe (base indisponible) → tout est remis en tête du tampon (au plus `max_pending` éléments
+  gardés, les plus anciens sont abandonnés au-delà) et réessayé au flush suivant. Après `max_attempts`
+  flushs sans aucune écriture, un élément refusé seul (et le seul refusé) est abandonné, le reste est gardé.
+max_age <= 0 : pas de thread, chaque add() écrit immédiatement (tests, commandes).
+"""
+import atexit
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Tampon d'un process vidé par lots dans `flush_fn(items)` (voir le module)."""
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List], None],
+        max_items: int = 200,
+        max_age: float = 5.0,
+        max_pending: Optional[int] = None,
+        max_attempts: int = 5,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_items = max(1, int(max_items))
+        self.max_age = float(max_age)
+        self.max_pending = max_pending or self.max_items * 50
+        self.max_attempts = max(1, int(max_attempts))
+        self._failed_flushes = 0
+        self._items: List = []
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, items: Iterable) -> int:
+        """Ajoute des éléments au tampon ; retourne le nombre ajouté."""
+        items = list(items)
+        if not items:
+            return 0
+        if self.max_age <= 0:
+            self.flush_fn(items)
+            return len(items)
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._items.extend(items)
+            full = len(self._items) >= self.max_items
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+        return len(items)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def flush(self) -> int:
+        """Écrit tout le tampon maintenant (par lots de max_items) ; retourne le nombre d'éléments écrits."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._items, self._oldest = self._items, [], None
+            if not batch:
+                return 0
+            written = 0
+            for start in range(0, len(batch), self.max_items):
+                chunk_written, failed, untried = self._write(batch[start : start + self.max_items])
+                written += chunk_written
+                if chunk_written:
+                    self._failed_flushes = 0
+                    self._drop(failed)
+                    continue
+                # Rien d'écrit : base indisponible plutôt qu'éléments fautifs, le reste est remis en attente
+                self._failed_flushes += 1
+                rest = untried + batch[start + self.max_items :]
+                if len(failed) == 1 and self._failed_flushes >= self.max_attempts:
+                    # Un seul élément refusé, seul en attente ou placé en tête à chaque essai
+                    self._drop(failed)
+                else:
+                    rest = failed + rest
+                logger.error(
+                    "%s: écriture échouée (%s fois de suite), %s élément(s) remis en attente",
+                    self.name, self._failed_flushes, len(rest),
+                )
+                self._requeue(rest)
+                break
+            return written
+
+    def _write(self, batch: List) -> Tuple[int, List, List]:
+        """
+        Écrit `batch`, coupé en deux à chaque échec jusqu'à isoler les éléments refusés.
+        Retourne (éléments écrits, éléments refusés seuls, éléments non tentés). Arrêt dès que deux éléments
+        sont refusés seuls sans qu'aucun ne soit passé : l'échec ne vient pas des éléments.
+        """
+        written, failed = 0, []
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                self.flush_fn(part)
+                written += len(part)
+                continue
+            except Exception:
+                if part is batch:
+                    logger.exception("%s: écriture de %s élément(s) échouée", self.name, len(part))
+                if len(part) == 1:
+                    failed.extend(part)
+                else:
+                    middle = len(part) // 2
+                    parts.extend((part[middle:], part[:middle]))
+            if not written and len(failed) >= 2:
+                return 0, failed, [item for part in reversed(parts) for item in part]
+        return written, failed, []
+
+    def _drop(self, items: List) -> None:
+        if items:
+            logger.error(
+                "%s: %s élément(s) refusé(s) seuls, abandonnés : %s",
+                self.name, len(items), ", ".join(repr(item)[:200] for item in items[:5]),
+            )
+
+    def _requeue(self, batch: List) -> None:
+        with self._lock:
+            items = batch + self._items
+            dropped = len(items) - self.max_pending
+            if dropped > 0:
+                logger.error("%s: tampon plein, %s élément(s) les plus anciens abandonnés", self.name, dropped)
+                items = items[dropped:]
+            self._items = items
+            self._oldest = time.monotonic()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"buffered-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                wait = self.max_age if self._oldest is None else self._oldest + self.max_age - time.monotonic()
+            if wait > 0 and not self._wakeup.wait(wait):
+                with self._lock:
+                    if self._oldest is None or self._oldest + self.max_age > time.monotonic():
+                        continue
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # Connexions de ce thread : ni requête ni fin de requête pour les fermer
+                connections.close_all()
+
+
+_writers: List[BufferedWriter] = []
+
+
+def register(writer: BufferedWriter) -> BufferedWriter:
+    """Enregistre un tampon pour le flush final à l'arrêt du process."""
+    _writers.append(writer)
+    return writer
+
+
+@atexit.register
+def flush_all() -> None:
+    for writer in _writers:
+        try:
+            writer.flush()
+        except Exception:
+            logger.exception("%s: flush final échoué", writer.name)
@@ -0,0 +1,166 @@
+"""
+Matrice des taux croisés matérialisée (CrossRateMatrix).
+
+Après chaque refresh : meilleur prix BUY / SELL extrait une seule fois par (devise, pays) depuis
+les snapshots de la plateforme par défaut, puis matrice N×N ajustée calculée en un passage
+(règles CrossRateAdjustment chargées une fois, résolues par paire de devises et non par cellule).
+L'API /rates/cross/matrix/ et la page dashboard des taux croisés lisent la dernière génération.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from core.majoration import cross_adjustment_for, load_cross_rules
+from core.models import CrossRateMatrix, OffersSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Générations conservées (les plus anciennes sont supprimées à chaque nouvelle matrice)
+MATRIX_KEEP = 10
+
+
+def node_key(fiat: str, country: Optional[str] = None) -> str:
+    return f"{fiat}:{country}" if country else fiat
+
+
+def _float_price(o: Any) -> float:
+    try:
+        return float(o.get("price") or 0)
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+def extract_best_prices(platform_code: str) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+    """Meilleur prix brut par (devise, pays, type) : BUY = plus bas, SELL = plus haut. Chaque snapshot décodé une fois."""
+    best: Dict[str, Dict[str, Dict[str, Optional[float]]]] = {}
+    rows = OffersSnapshot.objects.filter(platform=platform_code).values_list("fiat", "country", "trade_type", "data")
+    for fiat, country, trade_type, data in rows.iterator():
+        prices = [_float_price(o) for o in data] if isinstance(data, list) else []
+        if not prices:
+            value = None
+        elif trade_type == "BUY":
+            value = min(prices)
+        else:
+            value = max(prices)
+        best.setdefault(fiat, {}).setdefault(country or "", {"BUY": None, "SELL": None})[trade_type] = value
+    return best
+
+
+def compute_rates(best_prices: Dict[str, Dict[str, Dict[str, Optional[float]]]]) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Matrice ajustée {nœud source: {nœud cible: taux}} : taux = SELL cible / BUY source après ajustement croisé.
+    None si un des deux côtés n'a pas d'offre ou si le BUY source est <= 0. Diagonale (même devise) = 1.
+    """
+    rules = load_cross_rules()
+    buys = {
+        fiat: [(node_key(fiat, c), sides.get("BUY")) for c, sides in countries.items()]
+        for fiat, countries in best_prices.items()
+    }
+    sells = {
+        fiat: [(node_key(fiat, c), sides.get("SELL")) for c, sides in countries.items()]
+        for fiat, countries in best_prices.items()
+    }
+    rates: Dict[str, Dict[str, Optional[float]]] = {key: {} for nodes in buys.values() for key, _ in nodes}
+    for from_fiat, from_nodes in buys.items():
+        for to_fiat, to_nodes in sells.items():
+            if from_fiat == to_fiat:
+                for from_key, _ in from_nodes:
+                    rates[from_key].update({to_key: 1.0 for to_key, _ in to_nodes})
+                continue
+            adjust = cross_adjustment_for(from_fiat, to_fiat, rules)
+            for from_key, buy in from_nodes:
+                row = rates[from_key]
+                valid_buy = buy is not None and buy > 0
+                for to_key, sell in to_nodes:
+                    row[to_key] = round(adjust(buy, sell), 8) if valid_buy and sell is not None else None
+    return rates
+
+
+def _next_generation() -> int:
+    return (CrossRateMatrix.objects.aggregate(g=Max("generation"))["g"] or 0) + 1
+
+
+def build_cross_matrix(platform_code: Optional[str] = None, best_prices: Optional[dict] = None) -> Optional[CrossRateMatrix]:
+    """
+    Calcule et enregistre une nouvelle génération. best_prices fourni (ex. après modification d'une règle) :
+    pas de relecture des snapshots. Retourne None si aucune plateforme.
+    """
+    if platform_code is None:
+        from platforms.registry import get_default_platform
+        platform = get_default_platform()
+        if not platform:
+            return None
+        platform_code = platform.code
+    if best_prices is None:
+        best_prices = extract_best_prices(platform_code)
+    rates = compute_rates(best_prices)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                matrix = CrossRateMatrix.objects.create(
+                    generation=_next_generation(), platform=platform_code, best_prices=best_prices, rates=rates,
+                )
+            break
+        except IntegrityError:
+            # Calcul concurrent (refresh + modification de règle) : prendre la génération suivante
+            continue
+    else:
+        logger.warning("cross matrix: génération non enregistrée (conflits répétés)")
+        return None
+    stale = list(CrossRateMatrix.objects.values_list("pk", flat=True)[MATRIX_KEEP:])
+    if stale:
+        CrossRateMatrix.objects.filter(pk__in=stale).delete()
+    logger.info("cross matrix: génération %s (%s, %s nœuds)", matrix.generation, platform_code, len(rates))
+    return matrix
+
+
+def rebuild_with_current_rules() -> Optional[CrossRateMatrix]:
+    """Nouvelle génération depuis les meilleurs prix de la dernière matrice (règles modifiées, prix inchangés)."""
+    latest = get_latest_matrix()
+    if latest is None:
+        return None
+    return build_cross_matrix(latest.platform, latest.best_prices)
+
+
+def get_latest_matrix() -> Optional[CrossRateMatrix]:
+    return CrossRateMatrix.objects.order_by("-generation").first()
+
+
+def lookup_rate(
+    matrix: CrossRateMatrix,
+    from_c: str,
+    to_c: str,
+    country_from: Optional[str] = None,
+    country_to: Optional[str] = None,
+    fallback_all: bool = False,
+) -> Tuple[Optional[float], Optional[str], Optional[List[str]]]:
+    """
+    (rate, detail, missing) comme _compute_cross_rate_for_pair, lu dans la matrice.
+    fallback_all=True : pays sans offre → nœud « tous pays » de la devise (comportement du dashboard).
+    """
+    if from_c == to_c:
+        return (1.0, None, None)
+    best = matrix.best_prices
+
+    def node(fiat, country, side):
+        countries = best.get(fiat) or {}
+        if country and (countries.get(country) or {}).get(side) is not None:
+            return node_key(fiat, country), countries[country][side]
+        if country and not fallback_all:
+            return node_key(fiat, country), None
+        return node_key(fiat), (countries.get("") or {}).get(side)
+
+    from_key, buy = node(from_c, country_from, "BUY")
+    to_key, sell = node(to_c, country_to, "SELL")
+    missing = []
+    if buy is None:
+        missing.append(f"offres {from_c} BUY" + (f" (pays: {country_from})" if country_from else ""))
+    if sell is None:
+        missing.append(f"offres {to_c} SELL" + (f" (pays: {country_to})" if country_to else ""))
+    if missing:
+        return (None, "Taux croisé indisponible : " + "; ".join(missing) + ".", missing)
+    if buy <= 0:
+        return (None, f"Taux croisé indisponible : prix invalide (<= 0) pour les offres {from_c} BUY.", [f"prix valide pour {from_c} BUY"])
+    return ((matrix.rates.get(from_key) or {}).get(to_key), None, None)
@@ -3,7 +3,7 @@ Ajustements : offres (RateAdjustment) et cross (CrossRateAdjustment).
 Offres : cible contient SELL ou BUY. Cross : modèle à part avec value_buy et value_sell.
 """
 from decimal import Decimal
-from typing import Union
+from typing import Callable, Dict, Optional, Union
 
 from core.models import RateAdjustment, CrossRateAdjustment
 
@@ -32,6 +32,39 @@ def _cross_candidate_targets(from_currency: str, to_currency: str) -> list[str]:
     return out
 
 
+def load_offer_rules() -> Dict[str, RateAdjustment]:
+    """Règles RateAdjustment actives par cible (une requête ; à réutiliser pour tout un lot de requêtes)."""
+    return {r.target: r for r in RateAdjustment.objects.filter(active=True)}
+
+
+def majoration_for(
+    currency: str = "",
+    trade_type: str = "",
+    country: str = "",
+    rules: Optional[Dict[str, RateAdjustment]] = None,
+) -> Callable[[Union[float, str]], float]:
+    """
+    Résout une fois la règle RateAdjustment (offres) la plus spécifique et retourne prix → prix ajusté.
+    Pour ajuster tout un carnet avec une seule requête au lieu d'une par offre.
+    rules = load_offer_rules() déjà chargé : aucune requête.
+    """
+    candidates = _candidate_targets(currency or "", country or "", trade_type or "")
+    if rules is None:
+        active = {r.target: r for r in RateAdjustment.objects.filter(active=True, target__in=candidates)}
+    else:
+        active = rules
+    adj = next((active[t] for t in candidates if t in active), None)
+    if adj is None:
+        return lambda price: float(Decimal(str(price)))
+    v = Decimal(str(adj.value))
+    if getattr(adj, "minorer", False):
+        v = -v
+    if adj.mode == RateAdjustment.MODE_PERCENT:
+        factor = Decimal("1") + v / 100
+        return lambda price: float(Decimal(str(price)) * factor)
+    return lambda price: float(Decimal(str(price)) + v)
+
+
 def apply_majoration(
     price: Union[float, str],
     currency: str = "",
@@ -39,21 +72,50 @@ def apply_majoration(
     country: str = "",
 ) -> float:
     """Applique la règle RateAdjustment (offres) la plus spécifique. Minorer / majorer selon le champ minorer de la règle."""
-    value = Decimal(str(price))
-    candidates = _candidate_targets(currency or "", country or "", trade_type or "")
-    active = {r.target: r for r in RateAdjustment.objects.filter(active=True)}
-    for target in candidates:
-        if target in active:
-            adj = active[target]
-            v = Decimal(str(adj.value))
-            if getattr(adj, "minorer", False):
-                v = -v
-            if adj.mode == RateAdjustment.MODE_PERCENT:
-                value = value * (Decimal("1") + v / 100)
+    return majoration_for(currency, trade_type, country)(price)
+
+
+def load_cross_rules() -> Dict[str, CrossRateAdjustment]:
+    """Règles CrossRateAdjustment actives par cible (une requête ; à réutiliser pour toute une matrice)."""
+    return {r.target: r for r in CrossRateAdjustment.objects.filter(active=True)}
+
+
+def cross_adjustment_for(
+    from_currency: str,
+    to_currency: str,
+    rules: Optional[Dict[str, CrossRateAdjustment]] = None,
+) -> Callable[[Union[float, str], Union[float, str]], float]:
+    """
+    Résout la règle CrossRateAdjustment la plus spécifique pour (from, to) et retourne
+    (price_buy, price_sell) → taux ajusté. rules = load_cross_rules() déjà chargé, sinon requête.
+    """
+    active = load_cross_rules() if rules is None else rules
+    candidates = _cross_candidate_targets(from_currency or "", to_currency or "")
+    adj = next((active[t] for t in candidates if t in active), None)
+    if adj is not None:
+        v_buy = Decimal(str(adj.value_buy))
+        v_sell = Decimal(str(adj.value_sell))
+        if getattr(adj, "minorer_buy", False):
+            v_buy = -v_buy
+        if getattr(adj, "minorer_sell", False):
+            v_sell = -v_sell
+        percent = adj.mode == CrossRateAdjustment.MODE_PERCENT
+
+    def rate(price_buy: Union[float, str], price_sell: Union[float, str]) -> float:
+        buy = Decimal(str(price_buy))
+        sell = Decimal(str(price_sell))
+        if buy <= 0:
+            return float(sell) / float(buy) if buy else 0.0
+        if adj is not None:
+            if percent:
+                buy = buy * (Decimal("1") + v_buy / 100)
+                sell = sell * (Decimal("1") + v_sell / 100)
             else:
-                value = value + v
-            break
-    return float(value)
+                buy = buy + v_buy
+                sell = sell + v_sell
+        return float(sell / buy)
+
+    return rate
 
 
 def apply_cross_adjustment(
@@ -66,26 +128,4 @@ def apply_cross_adjustment(
     Applique la règle CrossRateAdjustment : ajustement sur le BUY (leg source) et sur le SELL (leg cible).
     rate = (price_sell après ajustement) / (price_buy après ajustement).
     """
-    buy = Decimal(str(price_buy))
-    sell = Decimal(str(price_sell))
-    if buy <= 0:
-        return float(sell) / float(buy) if buy else 0.0
-    candidates = _cross_candidate_targets(from_currency or "", to_currency or "")
-    active = {r.target: r for r in CrossRateAdjustment.objects.filter(active=True)}
-    for target in candidates:
-        if target in active:
-            adj = active[target]
-            v_buy = Decimal(str(adj.value_buy))
-            v_sell = Decimal(str(adj.value_sell))
-            if getattr(adj, "minorer_buy", False):
-                v_buy = -v_buy
-            if getattr(adj, "minorer_sell", False):
-                v_sell = -v_sell
-            if adj.mode == CrossRateAdjustment.MODE_PERCENT:
-                buy = buy * (Decimal("1") + v_buy / 100)
-                sell = sell * (Decimal("1") + v_sell / 100)
-            else:
-                buy = buy + v_buy
-                sell = sell + v_sell
-            break
-    return float(sell / buy)
+    return cross_adjustment_for(from_currency, to_currency)(price_buy, price_sell)
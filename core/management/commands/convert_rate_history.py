@@ -0,0 +1,57 @@
+"""
+Convertit l'historique RateHistory existant en segments compacts (rates.segments), par paquets de lignes
+dans l'ordre des id. Reprend après la dernière ligne convertie (fichier .converted dans RATE_SEGMENT_DIR) ;
+--reset repart du début (doublons éliminés à la lecture). Les jours clos sont ensuite compactés en un bloc
+(un bloc par paquet sinon).
+
+  python manage.py convert_rate_history
+  python manage.py convert_rate_history --batch 20000
+"""
+import logging
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from offers.models import RateHistory
+from rates import segments
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("source_currency", "target_currency", "trade_type", "country", "platform", "rate", "created_at")
+
+
+class Command(BaseCommand):
+    help = "Convertit l'historique des taux (RateHistory) en segments binaires compacts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=5000, help="Lignes lues par paquet.")
+        parser.add_argument("--reset", action="store_true", help="Ignorer la reprise et tout reconvertir.")
+
+    def handle(self, *args, **options):
+        if not segments.enabled():
+            self.stdout.write(self.style.WARNING("RATE_SEGMENT_STORE désactivé : segments écrits mais pas encore lus par l'API."))
+        store = segments.get_store()
+        marker = Path(store.root) / ".converted"
+        last_pk = 0
+        if marker.exists() and not options["reset"]:
+            last_pk = int(marker.read_text().strip() or 0)
+        size_before = store.size()
+        converted = 0
+        while True:
+            rows = list(
+                RateHistory.objects.filter(pk__gt=last_pk).order_by("pk").values("pk", *FIELDS)[: max(1, options["batch"])]
+            )
+            if not rows:
+                break
+            converted += segments.append_rows(rows)
+            last_pk = rows[-1]["pk"]
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.write_text(str(last_pk))
+        if not converted:
+            self.stdout.write("Aucune ligne à convertir.")
+            return
+        store.compact_closed()
+        written = store.size() - size_before
+        self.stdout.write(self.style.SUCCESS(
+            f"{converted} point(s) convertis dans {store.root} ({written} octets, {written / converted:.1f} octets/point)."
+        ))
@@ -0,0 +1,49 @@
+"""
+Reporte dans APIKeyUsage les appels API comptés dans le cache (core.usage) : un UPDATE groupé par F().
+
+Les compteurs du cache font foi pour les quotas ; la base sert à la facturation et au dashboard.
+À lancer par cron (toutes les minutes) ou en tâche de fond :
+
+  * * * * * cd /chemin/vers/usdt_aggregator && .venv/bin/python manage.py flush_api_usage
+  python manage.py flush_api_usage --loop --interval 30
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.usage import flush
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Reporte les compteurs d'appels API du cache dans APIKeyUsage."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Reporter en boucle au lieu d'une seule fois.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=getattr(settings, "API_USAGE_FLUSH_INTERVAL", 30),
+            help="Secondes entre deux reports en mode --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                flushed = flush()
+            except Exception:
+                logger.exception("flush_api_usage: report en échec, nouvel essai au prochain passage")
+                flushed = {}
+            if flushed:
+                calls = sum(flushed.values())
+                self.stdout.write(self.style.SUCCESS(f"{calls} appel(s) reporté(s) sur {len(flushed)} compteur(s)."))
+            elif not options["loop"]:
+                self.stdout.write("Aucun appel en attente.")
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(max(1, options["interval"]))
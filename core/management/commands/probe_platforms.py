@@ -0,0 +1,48 @@
+"""
+Sonde la disponibilité des plateformes P2P et enregistre latence / succès dans le cache.
+
+Le dashboard, le fallback des offres et GET /api/v1/health/ lisent ce cache au lieu
+d'appeler les plateformes. À lancer par cron (toutes les minutes) ou en tâche de fond :
+
+  * * * * * cd /chemin/vers/usdt_aggregator && .venv/bin/python manage.py probe_platforms
+  python manage.py probe_platforms --loop --interval 30
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from platforms.health import probe_all
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Sonde les plateformes P2P (is_available) et met à jour leur santé en cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Sonder en boucle au lieu d'une seule fois.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=getattr(settings, "PLATFORM_HEALTH_INTERVAL", 30),
+            help="Secondes entre deux sondes en mode --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for code, summary in probe_all().items():
+                if summary.get("skipped"):
+                    self.stdout.write(f"{code}: non sondée (budget local épuisé)")
+                    continue
+                line = f"{code}: {'OK' if summary['available'] else 'KO'} ({summary['latency_ms']} ms, succès {summary['success_rate']:.0%})"
+                if summary["available"]:
+                    self.stdout.write(self.style.SUCCESS(line))
+                else:
+                    self.stdout.write(self.style.WARNING(line))
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(max(1, options["interval"]))
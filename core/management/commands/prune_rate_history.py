@@ -0,0 +1,59 @@
+"""
+Rétention de l'historique des taux (rates.candles.prune) : supprime les lignes RateHistory plus anciennes
+que RATE_HISTORY_RETENTION_DAYS (déjà agrégées en bougies au report) et les bougies minute / heure au-delà
+de RATE_CANDLE_RETENTION_DAYS. Suppression par paquets. Segments activés (RATE_SEGMENT_STORE) : jours clos
+compactés en un bloc (rates.segments.SegmentStore.compact_closed).
+À lancer par cron (toutes les heures) ou en tâche de fond :
+
+  0 * * * * cd /chemin/vers/usdt_aggregator && .venv/bin/python manage.py prune_rate_history
+  python manage.py prune_rate_history --loop --interval 3600
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rates import segments
+from rates.candles import prune
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Purge l'historique des taux agrégé en bougies et les bougies minute / heure anciennes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Purger en boucle au lieu d'une seule fois.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=getattr(settings, "RATE_HISTORY_PRUNE_INTERVAL", 3600),
+            help="Secondes entre deux purges en mode --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                deleted = prune()
+            except Exception:
+                logger.exception("prune_rate_history: purge en échec, nouvel essai au prochain passage")
+                deleted = {}
+            if segments.enabled():
+                try:
+                    files, saved = segments.get_store().compact_closed()
+                except Exception:
+                    logger.exception("prune_rate_history: compactage des segments en échec")
+                else:
+                    if files:
+                        self.stdout.write(self.style.SUCCESS(f"Segments compactés : {files} fichier(s), {saved} octets gagnés."))
+            if any(deleted.values()):
+                detail = ", ".join(f"{name}: {count}" for name, count in deleted.items() if count)
+                self.stdout.write(self.style.SUCCESS(f"Lignes supprimées ({detail})."))
+            elif not options["loop"]:
+                self.stdout.write("Rien à purger.")
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(max(1, options["interval"]))
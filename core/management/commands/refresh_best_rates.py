@@ -58,6 +58,10 @@ class Command(BaseCommand):
         config.save(update_fields=["last_run_at"])
         logger.info("refresh_best_rates: terminé — updated=%s, errors=%s", result["updated"], len(result["errors"]))
         self.stdout.write(self.style.SUCCESS(f"Mis à jour: {result['updated']} enregistrements."))
+        if result.get("quarantined"):
+            self.stdout.write(self.style.WARNING(
+                f"{result['quarantined']} carnet(s) en quarantaine (voir le dashboard, alertes taux)."
+            ))
         if result["errors"]:
             for err in result["errors"]:
                 self.stderr.write(self.style.WARNING(err))
@@ -0,0 +1,25 @@
+"""
+Serveur ASGI local (usdt_aggregator.asgi_local) : pour essayer le flux SSE /api/v1/stream/ sans uvicorn.
+
+  python manage.py run_asgi_local --port 8001
+  curl -N -H "X-API-Key: ..." "http://127.0.0.1:8001/api/v1/stream/?books=XOF:SELL&cross=XOF-GHS"
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Lance un serveur ASGI minimal (développement) : API complète, flux SSE compris."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+
+    def handle(self, *args, **options):
+        from usdt_aggregator.asgi import application
+        from usdt_aggregator.asgi_local import serve
+
+        self.stdout.write(self.style.SUCCESS(f"ASGI local sur http://{options['host']}:{options['port']}/"))
+        try:
+            serve(application, options["host"], options["port"])
+        except KeyboardInterrupt:
+            pass
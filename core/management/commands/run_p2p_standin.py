@@ -0,0 +1,28 @@
+"""
+Serveur P2P local simulé (platforms.standin) : carnets déterministes, paginés, sans réseau externe.
+
+  python manage.py run_p2p_standin --port 8765
+  P2P_PLATFORM_ADAPTERS=standin=platforms.standin.StandinP2PPlatform python manage.py refresh_best_rates
+"""
+from django.core.management.base import BaseCommand
+
+from platforms.standin import make_server
+
+
+class Command(BaseCommand):
+    help = "Lance le serveur P2P simulé utilisé par l'adaptateur de référence « standin »."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--seed", type=int, default=0, help="Graine des carnets générés (même graine → mêmes offres).")
+
+    def handle(self, *args, **options):
+        server = make_server(options["host"], options["port"], options["seed"])
+        self.stdout.write(self.style.SUCCESS(f"Stand-in P2P sur http://{options['host']}:{options['port']}/search"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,29 @@
+# Generated by hand
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_rate_adjustment_minorer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CrossRateMatrix",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("generation", models.PositiveBigIntegerField(unique=True)),
+                ("platform", models.CharField(max_length=30)),
+                ("best_prices", models.JSONField(default=dict)),
+                ("rates", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Matrice taux croisés",
+                "verbose_name_plural": "Matrices taux croisés",
+                "ordering": ["-generation"],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by hand
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_cross_rate_matrix"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offerssnapshot",
+            name="index",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Index précalculés au refresh (offers.index), positions dans data.",
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by hand
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_offers_snapshot_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OfferReference",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("reference", models.CharField(max_length=64)),
+                ("positions", models.JSONField(default=list, help_text="Positions dans data (ordre des prix).")),
+                (
+                    "snapshot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="references",
+                        to="core.offerssnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Référence annonceur (index)",
+                "verbose_name_plural": "Références annonceurs (index)",
+                "unique_together": {("snapshot", "reference")},
+                "indexes": [models.Index(fields=["reference"], name="core_offerref_reference_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by hand
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_offer_reference"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offerssnapshot",
+            name="generation",
+            field=models.PositiveBigIntegerField(default=0, help_text="Incrémentée à chaque refresh de ce carnet (journal OfferChange)."),
+        ),
+        migrations.CreateModel(
+            name="OfferChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("generation", models.PositiveBigIntegerField()),
+                ("added", models.JSONField(default=list)),
+                ("changed", models.JSONField(default=list)),
+                ("removed", models.JSONField(default=list)),
+                ("resync", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "snapshot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="changes",
+                        to="core.offerssnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Changement d'offres",
+                "verbose_name_plural": "Changements d'offres",
+                "ordering": ["snapshot", "generation"],
+                "unique_together": {("snapshot", "generation")},
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by hand
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    """Clés en clair → préfixe + empreinte sha256 (mêmes valeurs que core.models.hash_api_key)."""
+    APIKey = apps.get_model("core", "APIKey")
+    for api_key in APIKey.objects.all():
+        api_key.prefix = api_key.key[:8]
+        api_key.key_hash = hashlib.sha256(api_key.key.encode()).hexdigest()
+        api_key.save(update_fields=["prefix", "key_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_offer_changes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="prefix",
+            field=models.CharField(
+                db_index=True, default="", editable=False, help_text="Début de la clé (identification, non secret).", max_length=12
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="apikey",
+            name="key_hash",
+            field=models.CharField(default="", editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        # Irréversible : la clé en clair ne peut pas être reconstituée depuis son empreinte
+        migrations.RunPython(hash_existing_keys),
+        migrations.RemoveField(model_name="apikey", name="key"),
+        migrations.AlterField(
+            model_name="apikey",
+            name="key_hash",
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by hand
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_apikey_hashed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="apikey",
+            name="rate_limit",
+            field=models.FloatField(
+                blank=True, help_text="Débit max (requêtes/seconde). Vide = API_RATE_LIMIT ; 0 = sans limite.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="apikey",
+            name="rate_burst",
+            field=models.PositiveIntegerField(blank=True, help_text="Rafale max (requêtes). Vide = API_RATE_BURST.", null=True),
+        ),
+    ]
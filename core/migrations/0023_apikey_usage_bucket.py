@@ -0,0 +1,40 @@
+# Generated by hand
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_apikey_rate_limit"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="apikeyusage",
+            index=models.Index(fields=["period"], name="core_apikeyusage_period"),
+        ),
+        migrations.CreateModel(
+            name="APIKeyUsageBucket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("granularity", models.CharField(choices=[("hour", "Heure"), ("day", "Jour")], max_length=4)),
+                ("start", models.DateTimeField(help_text="Début de l'heure ou du jour (UTC).")),
+                ("endpoint", models.CharField(help_text="Vue API (ex. offers_list, offers_batch).", max_length=64)),
+                ("call_count", models.PositiveIntegerField(default=0)),
+                (
+                    "api_key",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="usage_buckets", to="core.apikey"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage API (heure / jour)",
+                "verbose_name_plural": "Usages API (heure / jour)",
+                "unique_together": {("api_key", "granularity", "start", "endpoint")},
+                "indexes": [models.Index(fields=["granularity", "start"], name="core_usagebucket_gran_start")],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by hand
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_apikey_usage_bucket"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AdvertiserStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("reference", models.CharField(max_length=64)),
+                ("fiat", models.CharField(blank=True, max_length=10)),
+                ("trade_type", models.CharField(blank=True, max_length=4)),
+                ("declarations", models.PositiveIntegerField(default=0)),
+                ("total_amount", models.DecimalField(decimal_places=8, default=0, max_digits=28)),
+                ("last_declared_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Annonceur (cumul déclarations)",
+                "verbose_name_plural": "Annonceurs (cumul déclarations)",
+                "ordering": ["-declarations"],
+                "unique_together": {("reference", "fiat", "trade_type")},
+            },
+        ),
+        migrations.CreateModel(
+            name="AdvertiserKeyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("period", models.CharField(help_text="YYYY-MM", max_length=7)),
+                ("declarations", models.PositiveIntegerField(default=0)),
+                ("total_amount", models.DecimalField(decimal_places=8, default=0, max_digits=28)),
+                (
+                    "api_key",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="advertiser_stats", to="core.apikey"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Déclarations annonceur (clé / mois)",
+                "verbose_name_plural": "Déclarations annonceur (clé / mois)",
+                "ordering": ["api_key", "-period"],
+                "unique_together": {("api_key", "period")},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by hand
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0024_advertiser_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateAlert",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("rate", "Taux calculé"),
+                            ("snapshot", "Carnet (refresh)"),
+                            ("divergence", "Écart pays / global"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_currency", models.CharField(max_length=10)),
+                ("target_currency", models.CharField(max_length=10)),
+                ("trade_type", models.CharField(max_length=4)),
+                ("country", models.CharField(blank=True, max_length=50)),
+                ("platform", models.CharField(blank=True, max_length=30)),
+                ("value", models.FloatField(help_text="Valeur observée (taux, meilleur prix ou écart relatif).")),
+                ("expected", models.FloatField(help_text="Moyenne glissante (EWMA) avant l'observation.")),
+                ("zscore", models.FloatField()),
+                ("quarantined", models.BooleanField(default=False)),
+                ("acknowledged", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                "verbose_name": "Alerte taux",
+                "verbose_name_plural": "Alertes taux",
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["acknowledged", "created_at"], name="core_ratealert_ack_created")],
+            },
+        ),
+    ]
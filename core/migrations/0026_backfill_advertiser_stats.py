@@ -0,0 +1,60 @@
+# Generated by hand
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_advertiser_stats(apps, schema_editor):
+    """
+    Cumuls AdvertiserStats / AdvertiserKeyStats recalculés depuis le journal AdvertiserUsage (créés vides
+    par 0024). Recalcul complet plutôt qu'ajout : les déclarations écrites depuis 0024 sont déjà dans les
+    cumuls et dans le journal. Le journal n'a que l'heure d'écriture du lot (created_at) : mois et dernière
+    déclaration en sont tirés.
+    """
+    AdvertiserUsage = apps.get_model("core", "AdvertiserUsage")
+    AdvertiserStats = apps.get_model("core", "AdvertiserStats")
+    AdvertiserKeyStats = apps.get_model("core", "AdvertiserKeyStats")
+
+    AdvertiserStats.objects.all().delete()
+    AdvertiserStats.objects.bulk_create(
+        [
+            AdvertiserStats(
+                reference=row["reference"], fiat=row["fiat"], trade_type=row["trade_type"],
+                declarations=row["declarations"], total_amount=row["total_amount"] or 0,
+                last_declared_at=row["last_declared_at"],
+            )
+            for row in AdvertiserUsage.objects.order_by()
+            .values("reference", "fiat", "trade_type")
+            .annotate(declarations=Count("id"), total_amount=Sum("amount"), last_declared_at=Max("created_at"))
+        ],
+        batch_size=500,
+    )
+
+    AdvertiserKeyStats.objects.all().delete()
+    AdvertiserKeyStats.objects.bulk_create(
+        [
+            AdvertiserKeyStats(
+                api_key_id=row["api_key_id"], period=row["month"].strftime("%Y-%m"),
+                declarations=row["declarations"], total_amount=row["total_amount"] or 0,
+            )
+            for row in AdvertiserUsage.objects.order_by()
+            .annotate(month=TruncMonth("created_at", tzinfo=dt_timezone.utc))
+            .values("api_key_id", "month")
+            .annotate(declarations=Count("id"), total_amount=Sum("amount"))
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_rate_alert"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_advertiser_stats, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 
 
 class Currency(models.Model):
@@ -194,10 +197,56 @@ def _generate_api_key():
     return secrets.token_urlsafe(32)
 
 
+def hash_api_key(key: str) -> str:
+    """Empreinte stockée d'une clé API (sha256 hex) : la clé en clair n'est gardée ni en base ni en cache."""
+    import hashlib
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+REFERENCE_MAX_LENGTH = 64
+
+
+def reference_key(reference: str) -> str:
+    """
+    Clé stockée d'une reference annonceur (OfferReference, AdvertiserStats) : la reference elle-même jusqu'à
+    REFERENCE_MAX_LENGTH caractères, au-delà "#" + début de son sha256 (même longueur, sans fusion de deux
+    references de même préfixe).
+    """
+    if len(reference) <= REFERENCE_MAX_LENGTH:
+        return reference
+    import hashlib
+    return "#" + hashlib.sha256(reference.encode()).hexdigest()[: REFERENCE_MAX_LENGTH - 1]
+
+
+class APIKeyQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        UPDATE en masse (actions admin, facturation, bulk_update) : aucun signal post_save, donc entrées du
+        cache d'authentification effacées ici, comme après un save (core.signals).
+        """
+        from core import authcache
+
+        key_hashes = list(self.values_list("key_hash", flat=True))
+        updated = super().update(**kwargs)
+        authcache.api_keys.invalidate_now_and_on_commit(key_hashes)
+        return updated
+
+    update.alters_data = True
+
+
 class APIKey(models.Model):
-    """Clé API pour authentification et facturation par nombre d'appels."""
+    """
+    Clé API pour authentification et facturation par nombre d'appels.
+    Seule l'empreinte (key_hash) est stockée ; la clé en clair n'est connue qu'à la création
+    (attribut plaintext_key après save, affiché une fois dans l'admin).
+    """
+    API_KEY_PREFIX_LENGTH = 8
+
     name = models.CharField(max_length=100, help_text="Usage ou identifiant client")
-    key = models.CharField(max_length=64, unique=True, blank=True, help_text="Laisser vide pour générer à l'enregistrement.")
+    prefix = models.CharField(
+        max_length=12, editable=False, db_index=True, help_text="Début de la clé (identification, non secret)."
+    )
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
     active = models.BooleanField(default=True)
     monthly_quota = models.PositiveIntegerField(
         null=True,
@@ -208,17 +257,47 @@ class APIKey(models.Model):
         default=False,
         help_text="Si coché, cette clé est exemptée de facturation (montant = 0).",
     )
+    rate_limit = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Débit max (requêtes/seconde). Vide = API_RATE_LIMIT ; 0 = sans limite.",
+    )
+    rate_burst = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Rafale max (requêtes). Vide = API_RATE_BURST.",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = APIKeyQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Clé API"
         verbose_name_plural = "Clés API"
 
+    def clean(self):
+        # Un appel qui coûte plus de jetons que la rafale ne passerait jamais (api.throttling)
+        costs = getattr(settings, "API_RATE_SCOPE_COSTS", {}) or {"default": 1}
+        if self.rate_burst and self.rate_limit != 0 and self.rate_burst < max(costs.values()):
+            raise ValidationError({
+                "rate_burst": f"Rafale inférieure au coût de l'endpoint le plus cher ({max(costs.values())} jetons, "
+                f"API_RATE_SCOPE_COSTS) : ces appels seraient toujours refusés."
+            })
+
     def save(self, *args, **kwargs):
-        if not self.key:
-            self.key = _generate_api_key()
+        if not self.key_hash:
+            self.set_key(_generate_api_key())
         super().save(*args, **kwargs)
 
+    def set_key(self, key: str) -> None:
+        """Remplace la clé (à enregistrer ensuite) ; plaintext_key reste disponible jusqu'à la fin de la requête."""
+        self.plaintext_key = key
+        self.prefix = key[: self.API_KEY_PREFIX_LENGTH]
+        self.key_hash = hash_api_key(key)
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix}…)"
+
 
 class APIKeyUsage(models.Model):
     """Compteur d'appels par clé API et par mois (pour facturation)."""
@@ -231,11 +310,97 @@ class APIKeyUsage(models.Model):
         verbose_name_plural = "Usages API (mois)"
         unique_together = [["api_key", "period"]]
         ordering = ["api_key", "-period"]
+        indexes = [models.Index(fields=["period"], name="core_apikeyusage_period")]
 
     def __str__(self):
         return f"{self.api_key.name} {self.period}: {self.call_count} appels"
 
 
+class APIKeyUsageBucket(models.Model):
+    """
+    Appels facturés par clé, endpoint et heure ou jour (séries d'usage, GET /api/v1/usage/).
+    Écrit par flush_api_usage à partir des compteurs du cache ; APIKeyUsage reste la base de facturation.
+    """
+    GRANULARITY_HOUR = "hour"
+    GRANULARITY_DAY = "day"
+    GRANULARITY_CHOICES = [(GRANULARITY_HOUR, "Heure"), (GRANULARITY_DAY, "Jour")]
+
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name="usage_buckets")
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    start = models.DateTimeField(help_text="Début de l'heure ou du jour (UTC).")
+    endpoint = models.CharField(max_length=64, help_text="Vue API (ex. offers_list, offers_batch).")
+    call_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Usage API (heure / jour)"
+        verbose_name_plural = "Usages API (heure / jour)"
+        unique_together = [["api_key", "granularity", "start", "endpoint"]]
+        indexes = [models.Index(fields=["granularity", "start"], name="core_usagebucket_gran_start")]
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.granularity} {self.start:%Y-%m-%d %H:00} {self.endpoint}: {self.call_count}"
+
+
+class AdvertiserUsage(models.Model):
+    """
+    Déclaration client : offre (reference annonceur) exécutée et montant (POST /api/v1/advertiser/usage/).
+    Journal brut, écrit par lots (core.advertiser_usage) ; lectures via AdvertiserStats / AdvertiserKeyStats.
+    """
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name="advertiser_usages")
+    reference = models.CharField(max_length=64, help_text="Id annonceur (reference retournée dans les offres)")
+    fiat = models.CharField(max_length=10, blank=True, help_text="Devise (ex. XOF)")
+    trade_type = models.CharField(max_length=4, blank=True, help_text="BUY ou SELL")
+    amount = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True, help_text="Montant de la transaction (optionnel)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Usage annonceur (déclaration client)"
+        verbose_name_plural = "Usages annonceur (déclarations clients)"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.reference} {self.fiat} {self.trade_type} {self.amount or ''} ({self.api_key_id})"
+
+
+class AdvertiserStats(models.Model):
+    """
+    Cumul des déclarations par annonceur (reference, devise, type), tenu à jour à chaque écriture de lot.
+    Alimente le score des offres (poids "executed") sans relire AdvertiserUsage.
+    """
+    reference = models.CharField(max_length=64)
+    fiat = models.CharField(max_length=10, blank=True)
+    trade_type = models.CharField(max_length=4, blank=True)
+    declarations = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+    last_declared_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Annonceur (cumul déclarations)"
+        verbose_name_plural = "Annonceurs (cumul déclarations)"
+        unique_together = [["reference", "fiat", "trade_type"]]
+        ordering = ["-declarations"]
+
+    def __str__(self):
+        return f"{self.reference} {self.fiat} {self.trade_type}: {self.declarations} déclarations"
+
+
+class AdvertiserKeyStats(models.Model):
+    """Cumul des déclarations par clé API et par mois (facturation, dashboard), tenu à jour comme AdvertiserStats."""
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name="advertiser_stats")
+    period = models.CharField(max_length=7, help_text="YYYY-MM")
+    declarations = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+
+    class Meta:
+        verbose_name = "Déclarations annonceur (clé / mois)"
+        verbose_name_plural = "Déclarations annonceur (clé / mois)"
+        unique_together = [["api_key", "period"]]
+        ordering = ["api_key", "-period"]
+
+    def __str__(self):
+        return f"{self.api_key_id} {self.period}: {self.declarations} déclarations"
+
+
 class BillingConfig(models.Model):
     """
     Configuration globale de facturation (une seule ligne = singleton).
@@ -311,7 +476,7 @@ class BestRate(models.Model):
 class OffersSnapshot(models.Model):
     """
     Snapshot des offres brutes (refresh = seule source de vérité).
-    Une ligne par (platform, fiat, trade_type, country). data = liste d'offres (JSON), aucun calcul.
+    Une ligne par (platform, fiat, trade_type, country). data = liste d'offres (JSON) triée meilleur prix d'abord.
     Les APIs lisent ici puis appliquent config liquidité + ajustements.
     """
     platform = models.CharField(max_length=30)
@@ -319,6 +484,8 @@ class OffersSnapshot(models.Model):
     trade_type = models.CharField(max_length=4)  # BUY, SELL
     country = models.CharField(max_length=10, blank=True, default="")
     data = models.JSONField(default=list, help_text="Liste d'offres brutes (price, min_fiat, max_fiat, advertiser, etc.)")
+    index = models.JSONField(default=dict, blank=True, help_text="Index précalculés au refresh (offers.index), positions dans data.")
+    generation = models.PositiveBigIntegerField(default=0, help_text="Incrémentée à chaque refresh de ce carnet (journal OfferChange).")
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -329,3 +496,104 @@ class OffersSnapshot(models.Model):
 
     def __str__(self):
         return f"{self.platform} {self.fiat} {self.trade_type} {self.country or 'all'} ({len(self.data)} offres)"
+
+
+class CrossRateMatrix(models.Model):
+    """
+    Matrice des taux croisés matérialisée après chaque refresh (et après modification d'un CrossRateAdjustment).
+    best_prices = meilleurs prix bruts par devise / pays : {"XOF": {"": {"BUY": p, "SELL": p}, "BJ": {...}}}.
+    rates = taux ajustés {"XOF": {"GHS:GH": taux ou null}} ; clé de nœud = "FIAT" (tous pays) ou "FIAT:PAYS".
+    Une ligne par génération ; seules les dernières sont conservées.
+    """
+    generation = models.PositiveBigIntegerField(unique=True)
+    platform = models.CharField(max_length=30)
+    best_prices = models.JSONField(default=dict)
+    rates = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Matrice taux croisés"
+        verbose_name_plural = "Matrices taux croisés"
+        ordering = ["-generation"]
+
+    def __str__(self):
+        return f"Génération {self.generation} ({self.platform}, {len(self.rates)} nœuds)"
+
+
+class OfferReference(models.Model):
+    """
+    Index reference annonceur (advertiser.user_no) → positions de ses offres dans OffersSnapshot.data.
+    Réécrit avec le snapshot à chaque refresh : la résolution d'une reference ne décode aucun carnet,
+    et une reference inconnue est rejetée sur une seule requête indexée.
+    """
+    snapshot = models.ForeignKey(OffersSnapshot, on_delete=models.CASCADE, related_name="references")
+    reference = models.CharField(max_length=64)
+    positions = models.JSONField(default=list, help_text="Positions dans data (ordre des prix).")
+
+    class Meta:
+        verbose_name = "Référence annonceur (index)"
+        verbose_name_plural = "Références annonceurs (index)"
+        unique_together = [["snapshot", "reference"]]
+        indexes = [models.Index(fields=["reference"], name="core_offerref_reference_idx")]
+
+    def __str__(self):
+        return f"{self.reference} → {self.snapshot_id} {self.positions}"
+
+
+class OfferChange(models.Model):
+    """
+    Journal des différences d'un carnet entre deux générations (diff par offer_id au refresh).
+    added / changed = offres brutes de la nouvelle génération ; removed = offer_id disparus.
+    resync = diff impossible (offres sans offer_id) : les clients doivent recharger le carnet.
+    Seules les dernières générations sont conservées (OFFER_CHANGES_KEEP par snapshot).
+    """
+    snapshot = models.ForeignKey(OffersSnapshot, on_delete=models.CASCADE, related_name="changes")
+    generation = models.PositiveBigIntegerField()
+    added = models.JSONField(default=list)
+    changed = models.JSONField(default=list)
+    removed = models.JSONField(default=list)
+    resync = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Changement d'offres"
+        verbose_name_plural = "Changements d'offres"
+        unique_together = [["snapshot", "generation"]]
+        ordering = ["snapshot", "generation"]
+
+    def __str__(self):
+        return f"{self.snapshot_id} g{self.generation} (+{len(self.added)} ~{len(self.changed)} -{len(self.removed)})"
+
+
+class RateAlert(models.Model):
+    """
+    Anomalie détectée sur un flux de taux (core.anomaly) : taux calculé, meilleur prix d'un carnet au refresh,
+    ou écart entre le carnet d'un pays et le carnet tous pays. quarantined = carnet non enregistré au refresh
+    (la génération précédente reste servie).
+    """
+    KIND_RATE = "rate"
+    KIND_SNAPSHOT = "snapshot"
+    KIND_DIVERGENCE = "divergence"
+    KIND_CHOICES = [(KIND_RATE, "Taux calculé"), (KIND_SNAPSHOT, "Carnet (refresh)"), (KIND_DIVERGENCE, "Écart pays / global")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    source_currency = models.CharField(max_length=10)
+    target_currency = models.CharField(max_length=10)
+    trade_type = models.CharField(max_length=4)
+    country = models.CharField(max_length=50, blank=True)
+    platform = models.CharField(max_length=30, blank=True)
+    value = models.FloatField(help_text="Valeur observée (taux, meilleur prix ou écart relatif).")
+    expected = models.FloatField(help_text="Moyenne glissante (EWMA) avant l'observation.")
+    zscore = models.FloatField()
+    quarantined = models.BooleanField(default=False)
+    acknowledged = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        verbose_name = "Alerte taux"
+        verbose_name_plural = "Alertes taux"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["acknowledged", "created_at"], name="core_ratealert_ack_created")]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.source_currency}/{self.target_currency} {self.trade_type} z={self.zscore:.1f}"
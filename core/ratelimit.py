@@ -0,0 +1,154 @@
+"""
+Limites partagées via le cache : débit (GCRA) et concurrence (baux expirants).
+
+Débit : GCRA (generic cell rate algorithm), équivalent exact d'un seau à jetons de débit `rate`/s et de
+rafale `burst`, sur une seule clé : l'heure théorique d'arrivée (TAT) de la prochaine requête.
+Consommer `cost` = TAT' = max(TAT, maintenant) + cost / rate ; refus si TAT' - burst / rate > maintenant.
+Pas de fenêtre : jamais plus de `burst` jetons d'un coup, y compris à cheval sur deux secondes.
+
+Concurrence : un bail par requête en vol, avec échéance (ttl) ; un bail non rendu (process tué)
+expire seul, et un compteur ne peut ni dériver ni devenir négatif.
+
+Redis (django-redis) : un script Lua par opération, atomique, un seul aller-retour, horloge du serveur Redis.
+Autre cache (LocMem en local, propre au process) : même calcul sous verrou du process.
+"""
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from django.core.cache import cache, caches
+
+CACHE_BUCKET_PREFIX = "usdt_agg_bucket"
+CACHE_LEASE_PREFIX = "usdt_agg_lease"
+
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+local increment = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+if tat < now then tat = now end
+local new_tat = tat + increment
+local allow_at = new_tat - tolerance
+if allow_at > now then
+  return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return '0'
+"""
+
+_LEASE_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[1]) then
+  return -count
+end
+local ttl = tonumber(ARGV[2])
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl) + 1)
+return count + 1
+"""
+
+_LEASE_COUNT_SCRIPT = """
+local t = redis.call('TIME')
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(t[1]) + tonumber(t[2]) / 1000000)
+return redis.call('ZCARD', KEYS[1])
+"""
+
+_scripts: Dict[str, object] = {}
+_local_lock = threading.Lock()
+_local_leases: Dict[str, Dict[str, float]] = {}
+
+
+def _redis():
+    """Client Redis brut si le cache par défaut est django-redis, sinon None (calcul local)."""
+    if not type(caches["default"]).__module__.startswith("django_redis"):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def _script(client, source: str):
+    script = _scripts.get(source)
+    if script is None:
+        # EVALSHA (EVAL au premier appel sur un serveur qui ne connaît pas le script)
+        script = _scripts[source] = client.register_script(source)
+    return script
+
+
+def consume(name: str, rate: float, burst: int, cost: int = 1) -> Tuple[bool, float]:
+    """
+    Consomme `cost` jetons du seau `name` (GCRA, voir le module).
+    Retourne (autorisé, secondes à attendre avant que `cost` jetons soient disponibles si refusé).
+    rate <= 0 ou burst <= 0 = pas de limite. cost > burst ne passerait jamais : ValueError (à refuser en amont).
+    """
+    if not rate or not burst or rate <= 0 or burst <= 0:
+        return True, 0.0
+    cost = max(1, int(cost))
+    if cost > burst:
+        raise ValueError(f"coût {cost} supérieur à la rafale {burst} du seau {name}")
+    increment = cost / float(rate)
+    tolerance = burst / float(rate)
+    key = f"{CACHE_BUCKET_PREFIX}:{name}"
+    client = _redis()
+    if client is not None:
+        wait = float(_script(client, _GCRA_SCRIPT)(keys=[cache.make_key(key)], args=[increment, tolerance], client=client))
+        return wait <= 0, wait
+    with _local_lock:
+        now = time.time()
+        new_tat = max(float(cache.get(key) or 0.0), now) + increment
+        allow_at = new_tat - tolerance
+        if allow_at > now:
+            return False, allow_at - now
+        cache.set(key, new_tat, int(new_tat - now) + 2)
+    return True, 0.0
+
+
+def acquire_lease(name: str, limit: float, ttl: float) -> Tuple[Optional[str], int]:
+    """
+    Prend un bail de concurrence sur `name` si moins de `limit` baux sont en cours.
+    Retourne (jeton à rendre avec release_lease, ou None si refusé ; baux en cours, celui-ci compris).
+    """
+    token = uuid.uuid4().hex
+    key = f"{CACHE_LEASE_PREFIX}:{name}"
+    client = _redis()
+    if client is not None:
+        count = int(_script(client, _LEASE_ACQUIRE_SCRIPT)(keys=[cache.make_key(key)], args=[limit, ttl, token], client=client))
+        return (token, count) if count > 0 else (None, -count)
+    with _local_lock:
+        now = time.time()
+        leases = _local_leases.setdefault(key, {})
+        for expired in [t for t, deadline in leases.items() if deadline <= now]:
+            del leases[expired]
+        if len(leases) >= limit:
+            return None, len(leases)
+        leases[token] = now + ttl
+        return token, len(leases)
+
+
+def release_lease(name: str, token: Optional[str]) -> None:
+    """Rend un bail (sans effet s'il a déjà expiré)."""
+    if not token:
+        return
+    key = f"{CACHE_LEASE_PREFIX}:{name}"
+    client = _redis()
+    if client is not None:
+        client.zrem(cache.make_key(key), token)
+        return
+    with _local_lock:
+        _local_leases.get(key, {}).pop(token, None)
+
+
+def lease_count(name: str) -> int:
+    """Baux en cours (non expirés) sur `name`."""
+    key = f"{CACHE_LEASE_PREFIX}:{name}"
+    client = _redis()
+    if client is not None:
+        return int(_script(client, _LEASE_COUNT_SCRIPT)(keys=[cache.make_key(key)], client=client))
+    with _local_lock:
+        now = time.time()
+        return sum(1 for deadline in _local_leases.get(key, {}).values() if deadline > now)
@@ -0,0 +1,45 @@
+"""
+Signaux core : une modification des ajustements croisés recalcule la matrice des taux croisés
+(depuis les meilleurs prix de la dernière génération, sans relire les snapshots) ; une modification
+de clé API ou d'utilisateur efface son entrée du cache d'authentification (core.authcache).
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import authcache
+from core.models import APIKey, CrossRateAdjustment
+
+logger = logging.getLogger(__name__)
+
+
+def _rebuild_cross_matrix():
+    from core.cross_matrix import rebuild_with_current_rules
+    try:
+        rebuild_with_current_rules()
+    except Exception:
+        logger.exception("cross matrix: recalcul après modification d'un ajustement croisé en échec")
+
+
+@receiver(post_save, sender=CrossRateAdjustment)
+@receiver(post_delete, sender=CrossRateAdjustment)
+def cross_rate_adjustment_changed(sender, **kwargs):
+    transaction.on_commit(_rebuild_cross_matrix)
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def api_key_changed(sender, instance, **kwargs):
+    # UPDATE en masse (sans signal) : APIKeyQuerySet.update
+    authcache.api_keys.invalidate_now_and_on_commit([instance.key_hash])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    pk = instance.pk  # remis à None après la suppression
+    authcache.users.invalidate(pk)
+    transaction.on_commit(lambda: authcache.users.invalidate(pk))
@@ -0,0 +1,294 @@
+"""
+Compteurs d'appels API par clé et par mois dans le cache Django (INCR atomique sur Redis ; LocMem en
+local et dans les tests : atomique dans le process seulement).
+
+Deux compteurs par (clé, mois) :
+- used : appels du mois, base + non encore écrits + réservations en cours. Lu et réservé par le contrôle
+  de quota : réserver = INCR puis annulation (DECR) si le quota est dépassé, donc deux requêtes
+  concurrentes ne peuvent pas consommer le même dernier appel. Absent du cache → amorcé depuis la base.
+- pending : appels facturés pas encore reportés dans APIKeyUsage. La commande flush_api_usage les
+  retire (DECR du montant lu : les appels arrivés entre-temps restent) et les applique en base par F().
+Plus un compteur par (clé, vue API, heure), reporté de la même façon dans APIKeyUsageBucket (heure et jour).
+
+Une requête réserve avant la vue (api.auth.reserve_quota) ; le middleware règle après la réponse :
+appels facturés reportés dans pending, réservation non facturée rendue (settle).
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CACHE_USAGE_PREFIX = "usdt_agg_usage"
+# Durée de vie des compteurs : au-delà du mois pour laisser le flush du mois précédent passer
+USAGE_TTL = 40 * 24 * 3600
+FLUSH_LOCK_KEY = f"{CACHE_USAGE_PREFIX}:flush_lock"
+# Compteurs horaires : gardés 3 jours, relus au plus 48 h en arrière après une interruption du flush
+HOUR_TTL = 3 * 24 * 3600
+FLUSH_MAX_HOURS = 48
+LAST_FLUSH_HOUR_KEY = f"{CACHE_USAGE_PREFIX}:last_flush_hour"
+
+
+def current_period() -> str:
+    return timezone.now().strftime("%Y-%m")
+
+
+def _used_key(api_key_id: int, period: str) -> str:
+    return f"{CACHE_USAGE_PREFIX}:used:{api_key_id}:{period}"
+
+
+def _pending_key(api_key_id: int, period: str) -> str:
+    return f"{CACHE_USAGE_PREFIX}:pending:{api_key_id}:{period}"
+
+
+def _incr(key: str, delta: int, initial, ttl: int = USAGE_TTL) -> int:
+    """INCR de `delta` ; clé absente → créée (add atomique) avec initial() + delta."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        value = initial() + delta
+        if cache.add(key, value, ttl):
+            return value
+        return cache.incr(key, delta)
+
+
+def _seed_used(api_key_id: int, period: str) -> int:
+    from core.models import APIKeyUsage
+
+    stored = (
+        APIKeyUsage.objects.filter(api_key_id=api_key_id, period=period).values_list("call_count", flat=True).first()
+        or 0
+    )
+    return stored + (cache.get(_pending_key(api_key_id, period)) or 0)
+
+
+def used(api_key_id: int, period: Optional[str] = None) -> int:
+    """Appels du mois (réservations en cours comprises)."""
+    period = period or current_period()
+    return _incr(_used_key(api_key_id, period), 0, lambda: _seed_used(api_key_id, period))
+
+
+def used_many(api_key_ids: Iterable[int], period: Optional[str] = None) -> Dict[int, int]:
+    """
+    used() pour plusieurs clés : {api_key_id: appels du mois}. Compteurs lus en un get_many ; clés absentes
+    du cache amorcées en une requête APIKeyUsage (+ pending en un get_many), puis posées par add.
+    """
+    from core.models import APIKeyUsage
+
+    period = period or current_period()
+    keys = {_used_key(api_key_id, period): api_key_id for api_key_id in api_key_ids}
+    counts = {keys[k]: v for k, v in cache.get_many(list(keys)).items()}
+    missing = [api_key_id for api_key_id in keys.values() if api_key_id not in counts]
+    if not missing:
+        return counts
+    stored = dict(
+        APIKeyUsage.objects.filter(period=period, api_key_id__in=missing).values_list("api_key_id", "call_count")
+    )
+    pending_keys = {_pending_key(api_key_id, period): api_key_id for api_key_id in missing}
+    pending = {pending_keys[k]: v for k, v in cache.get_many(list(pending_keys)).items()}
+    for api_key_id in missing:
+        value = stored.get(api_key_id, 0) + (pending.get(api_key_id) or 0)
+        key = _used_key(api_key_id, period)
+        # Un autre process a pu amorcer entre-temps : sa valeur (réservations comprises) fait foi
+        counts[api_key_id] = value if cache.add(key, value, USAGE_TTL) else (cache.get(key) or value)
+    return counts
+
+
+def reserve(api_key_id: int, quota: Optional[int], cost: int = 1, period: Optional[str] = None) -> bool:
+    """Réserve `cost` appels sur le quota du mois. False (rien réservé) si le quota serait dépassé."""
+    if quota is None or cost <= 0:
+        return True
+    period = period or current_period()
+    key = _used_key(api_key_id, period)
+    total = _incr(key, cost, lambda: _seed_used(api_key_id, period))
+    if total > quota:
+        cache.decr(key, cost)
+        return False
+    return True
+
+
+def settle(
+    api_key_id: int, calls: int, reserved: int = 0, period: Optional[str] = None, endpoint: Optional[str] = None
+) -> None:
+    """
+    Après la réponse : `calls` appels facturés (à écrire), `reserved` réservés avant la vue.
+    endpoint = nom de la vue API : les appels sont aussi comptés dans le compteur de l'heure (séries d'usage).
+    """
+    period = period or current_period()
+    if calls != reserved:
+        _incr(_used_key(api_key_id, period), calls - reserved, lambda: _seed_used(api_key_id, period))
+    if calls > 0:
+        _incr(_pending_key(api_key_id, period), calls, lambda: 0)
+        if endpoint:
+            _incr(_hour_key(api_key_id, endpoint, _hour_index(time.time())), calls, lambda: 0, HOUR_TTL)
+
+
+def _previous_period(period: str) -> str:
+    year, month = map(int, period.split("-"))
+    return f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+
+
+# --- Séries heure / jour ------------------------------------------------------
+def _hour_index(timestamp: float) -> int:
+    return int(timestamp // 3600)
+
+
+def _hour_key(api_key_id: int, endpoint: str, hour: int) -> str:
+    return f"{CACHE_USAGE_PREFIX}:hour:{api_key_id}:{endpoint}:{hour}"
+
+
+def endpoint_name(callback) -> str:
+    """Étiquette d'une vue : nom de la fonction décorée par @api_view (view_class), sinon de la vue."""
+    view_class = getattr(callback, "view_class", None) or getattr(callback, "cls", None)
+    return getattr(view_class, "__name__", None) or callback.__name__
+
+
+def api_endpoint_names() -> List[str]:
+    """Noms des vues servies sous api/ (étiquettes d'endpoint des compteurs horaires)."""
+    names = set()
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route)
+            elif route.startswith("api/") and pattern.callback is not None:
+                names.add(endpoint_name(pattern.callback))
+
+    walk(get_resolver().url_patterns, "")
+    return sorted(names)
+
+
+def _flush_hours() -> List[int]:
+    """Heures à relire : depuis le dernier flush (au plus FLUSH_MAX_HOURS), toujours l'heure précédente comprise."""
+    now = _hour_index(time.time())
+    last = cache.get(LAST_FLUSH_HOUR_KEY)
+    first = now - 1 if last is None else max(min(int(last), now - 1), now - FLUSH_MAX_HOURS)
+    return list(range(first, now + 1))
+
+
+def flush(api_key_ids: Optional[Iterable[int]] = None) -> Dict[Tuple[int, str], int]:
+    """
+    Reporte les appels en attente dans APIKeyUsage (mois courant et précédent) et APIKeyUsageBucket (heures
+    depuis le dernier flush, jours correspondants) : lignes manquantes créées en un bulk_create, incréments
+    appliqués par UPDATE ... F() + CASE (un par mois / heure / jour touché). Retourne {(api_key_id, période): appels}.
+    En cas d'échec en base, les montants retirés sont remis en attente.
+    """
+    from core.models import APIKey
+
+    if api_key_ids is None:
+        api_key_ids = list(APIKey.objects.values_list("pk", flat=True))
+    if not api_key_ids:
+        return {}
+    period = current_period()
+    monthly = {
+        _pending_key(api_key_id, p): (api_key_id, p)
+        for api_key_id in api_key_ids
+        for p in (period, _previous_period(period))
+    }
+    hours = _flush_hours()
+    hourly = {
+        _hour_key(api_key_id, endpoint, hour): (api_key_id, endpoint, hour)
+        for api_key_id in api_key_ids
+        for endpoint in api_endpoint_names()
+        for hour in hours
+    }
+    # Un seul flush à la fois : deux lecteurs du même montant le retireraient deux fois
+    if not cache.add(FLUSH_LOCK_KEY, 1, 60):
+        logger.info("usage: flush déjà en cours, ignoré")
+        return {}
+    try:
+        flushed = _flush(monthly, hourly)
+        cache.set(LAST_FLUSH_HOUR_KEY, hours[-1], HOUR_TTL)
+        return flushed
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _take(keys: Dict[str, tuple]) -> Dict[tuple, int]:
+    """Montants en attente retirés du cache (DECR du montant lu) : {identifiant: appels}."""
+    taken = {}
+    cache_keys = list(keys)
+    for i in range(0, len(cache_keys), 1000):
+        for cache_key, count in cache.get_many(cache_keys[i : i + 1000]).items():
+            if count and count > 0:
+                cache.decr(cache_key, count)
+                taken[keys[cache_key]] = count
+    return taken
+
+
+def _flush(monthly: Dict[str, Tuple[int, str]], hourly: Dict[str, Tuple[int, str, int]]) -> Dict[Tuple[int, str], int]:
+    from core.models import APIKeyUsage
+
+    pending = _take(monthly)
+    pending_hours = _take(hourly)
+    if not pending and not pending_hours:
+        return {}
+    try:
+        with transaction.atomic():
+            if pending:
+                APIKeyUsage.objects.bulk_create(
+                    [APIKeyUsage(api_key_id=api_key_id, period=p, call_count=0) for api_key_id, p in pending],
+                    ignore_conflicts=True,
+                )
+                for p in {p for _, p in pending}:
+                    counts = {api_key_id: n for (api_key_id, row_period), n in pending.items() if row_period == p}
+                    APIKeyUsage.objects.filter(period=p, api_key_id__in=list(counts)).update(
+                        call_count=F("call_count")
+                        + Case(*(When(api_key_id=api_key_id, then=Value(n)) for api_key_id, n in counts.items()), default=Value(0))
+                    )
+            if pending_hours:
+                _write_buckets(pending_hours)
+    except Exception:
+        logger.exception(
+            "usage: report en base échoué, %s compteur(s) remis en attente", len(pending) + len(pending_hours)
+        )
+        for (api_key_id, p), count in pending.items():
+            _incr(_pending_key(api_key_id, p), count, lambda: 0)
+        for (api_key_id, endpoint, hour), count in pending_hours.items():
+            _incr(_hour_key(api_key_id, endpoint, hour), count, lambda: 0, HOUR_TTL)
+        raise
+    if pending_hours:
+        logger.debug("usage: %s compteur(s) horaires reportés", len(pending_hours))
+    return pending
+
+
+def _write_buckets(pending_hours: Dict[Tuple[int, str, int], int]) -> None:
+    from core.models import APIKeyUsageBucket
+
+    # {(granularité, début): {(api_key_id, endpoint): appels}}
+    increments: Dict[Tuple[str, datetime], Dict[Tuple[int, str], int]] = defaultdict(lambda: defaultdict(int))
+    for (api_key_id, endpoint, hour), count in pending_hours.items():
+        start = datetime.fromtimestamp(hour * 3600, tz=dt_timezone.utc)
+        day = start.replace(hour=0)
+        increments[(APIKeyUsageBucket.GRANULARITY_HOUR, start)][(api_key_id, endpoint)] += count
+        increments[(APIKeyUsageBucket.GRANULARITY_DAY, day)][(api_key_id, endpoint)] += count
+    APIKeyUsageBucket.objects.bulk_create(
+        [
+            APIKeyUsageBucket(api_key_id=api_key_id, granularity=granularity, start=start, endpoint=endpoint)
+            for (granularity, start), counts in increments.items()
+            for api_key_id, endpoint in counts
+        ],
+        ignore_conflicts=True,
+    )
+    for (granularity, start), counts in increments.items():
+        APIKeyUsageBucket.objects.filter(
+            granularity=granularity,
+            start=start,
+            api_key_id__in={api_key_id for api_key_id, _ in counts},
+            endpoint__in={endpoint for _, endpoint in counts},
+        ).update(
+            call_count=F("call_count")
+            + Case(
+                *(When(api_key_id=api_key_id, endpoint=endpoint, then=Value(n)) for (api_key_id, endpoint), n in counts.items()),
+                default=Value(0),
+            )
+        )
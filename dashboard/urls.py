@@ -23,4 +23,5 @@ urlpatterns = [
     path("platforms/set-default/", views.platform_set_default, name="platform_set_default"),
     path("refresh-config/", views.refresh_config, name="refresh_config"),
     path("facturation/", views.billing, name="billing"),
+    path("alertes-taux/", views.rate_alerts, name="rate_alerts"),
 ]
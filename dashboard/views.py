@@ -3,18 +3,26 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
+from django.db.models import Count, Sum
 
+from collections import defaultdict
+from datetime import timedelta
 from django.utils import timezone
 from decimal import Decimal
 from core.models import (
     LiquidityConfig, RateAdjustment, CrossRateAdjustment,
-    PlatformConfig, BestRatesRefreshConfig, APIKey, APIKeyUsage, BillingConfig,
+    PlatformConfig, BestRatesRefreshConfig, APIKey, APIKeyUsage, APIKeyUsageBucket, BillingConfig,
+    AdvertiserStats, AdvertiserKeyStats, RateAlert,
     Currency, Country,
 )
 from platforms.registry import init_platforms, get_all_platforms, get_default_platform
+from platforms.circuit import get_circuit_breaker
+from platforms.health import get_platform_health
 from django.conf import settings
 from offers.services import fetch_offers, fetch_offers_raw, get_offers_from_snapshot
 from core.majoration import apply_cross_adjustment
+from core import usage
+from core.cross_matrix import get_latest_matrix, lookup_rate
 
 
 def _parse_rate_adjustment_target(target: str):
@@ -46,25 +54,59 @@ def _build_rate_adjustment_target(trade_type: str, currency: str, country: str)
     return f"{currency}:{country}:{trade_type}"
 
 
+BILLING_HISTORY_MONTHS = 6
+
+
 @staff_member_required
 def billing(request):
-    """Page dashboard facturation : config globale, clés API, usage et montant estimé."""
+    """
+    Page dashboard facturation : config globale, clés API, usage et montant estimé.
+    Historique agrégé en base (index période / début de bucket) : quelques requêtes quel que soit le nombre de mois.
+    """
     now = timezone.now()
     current_period = now.strftime("%Y-%m")
     billing_config = BillingConfig.objects.first()
     if not billing_config:
         billing_config = BillingConfig(price_per_call=Decimal("0"), currency="EUR")
     api_keys = list(APIKey.objects.all().order_by("-created_at"))
-    usages = {
-        (u.api_key_id, u.period): u.call_count
-        for u in APIKeyUsage.objects.filter(api_key__in=api_keys)
+    first_period = (now.replace(day=1) - timedelta(days=31 * BILLING_HISTORY_MONTHS)).strftime("%Y-%m")
+    other_periods = defaultdict(list)
+    for api_key_id, period, count in (
+        APIKeyUsage.objects.filter(period__gte=first_period)
+        .exclude(period=current_period)
+        .order_by("api_key_id", "-period")
+        .values_list("api_key_id", "period", "call_count")
+    ):
+        other_periods[api_key_id].append((period, count))
+    totals = dict(
+        APIKeyUsage.objects.exclude(period=current_period)
+        .values("api_key_id")
+        .annotate(total=Sum("call_count"))
+        .values_list("api_key_id", "total")
+    )
+    last_24h = dict(
+        APIKeyUsageBucket.objects.filter(granularity=APIKeyUsageBucket.GRANULARITY_HOUR, start__gte=now - timedelta(hours=24))
+        .values("api_key_id")
+        .annotate(calls=Sum("call_count"))
+        .values_list("api_key_id", "calls")
+    )
+    endpoints = list(
+        APIKeyUsageBucket.objects.filter(granularity=APIKeyUsageBucket.GRANULARITY_DAY, start__gte=now - timedelta(days=7))
+        .values("endpoint")
+        .annotate(calls=Sum("call_count"), keys=Count("api_key", distinct=True))
+        .order_by("-calls")
+    )
+    declared = {
+        row.api_key_id: row
+        for row in AdvertiserKeyStats.objects.filter(period=current_period)
     }
+    top_advertisers = list(AdvertiserStats.objects.order_by("-declarations")[:10])
+    # Mois courant : compteurs du cache (appels pas encore reportés en base compris), lus en un get_many
+    current_usage = usage.used_many([key.id for key in api_keys], current_period)
     price = billing_config.price_per_call
     rows = []
     for key in api_keys:
-        current = usages.get((key.id, current_period), 0)
-        other = [(p, c) for (kid, p), c in usages.items() if kid == key.id and p != current_period]
-        other.sort(key=lambda x: x[0], reverse=True)
+        current = current_usage.get(key.id, 0)
         if key.billing_exempt:
             estimated_amount = None
         else:
@@ -72,13 +114,19 @@ def billing(request):
         rows.append({
             "key": key,
             "current_usage": current,
-            "other_periods": other,
+            "last_24h": last_24h.get(key.id, 0),
+            "declared": declared.get(key.id),
+            "other_periods": other_periods.get(key.id, []),
+            "history_total": totals.get(key.id, 0),
             "estimated_amount": estimated_amount,
         })
     return render(request, "dashboard/billing.html", {
         "billing_config": billing_config,
         "rows": rows,
         "current_period": current_period,
+        "endpoints": endpoints,
+        "top_advertisers": top_advertisers,
+        "history_months": BILLING_HISTORY_MONTHS,
     })
 
 
@@ -93,8 +141,13 @@ def dashboard_home(request):
     init_platforms()
     platforms = get_all_platforms()
     default = get_default_platform()
+    circuits = {code: get_circuit_breaker(code).snapshot() for code in platforms}
     return render(request, "dashboard/home.html", {
         "platforms": platforms,
+        "platform_rows": [
+            {"code": code, "platform": platform, "circuit": circuits[code], "health": get_platform_health(code)}
+            for code, platform in platforms.items()
+        ],
         "default_platform": default.code if default else None,
     })
 
@@ -344,6 +397,24 @@ def _compute_cross_rate_for_pair(from_c: str, to_c: str, country_from=None, coun
     return (rate, None, None)
 
 
+def _cross_rate_matrix():
+    """Dernière matrice matérialisée si les snapshots sont la source et qu'elle vient de la plateforme par défaut, sinon None."""
+    if not getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        return None
+    matrix = get_latest_matrix()
+    default_platform = get_default_platform()
+    if matrix is None or not default_platform or matrix.platform != default_platform.code:
+        return None
+    return matrix
+
+
+def _cross_rate(matrix, from_c: str, to_c: str, country_from=None, country_to=None):
+    """(rate, detail, missing) lu dans la matrice si disponible, sinon calcul paire par paire."""
+    if matrix is not None:
+        return lookup_rate(matrix, from_c, to_c, country_from, country_to, fallback_all=True)
+    return _compute_cross_rate_for_pair(from_c, to_c, country_from, country_to)
+
+
 def _parse_cross_target(target: str):
     """Extrait (from_currency, to_currency) de target ex. cross:XOF:GHS -> (XOF, GHS)."""
     if not target or not target.startswith("cross"):
@@ -369,12 +440,13 @@ def cross_rates_list(request):
     country_to = (request.GET.get("country_to") or "").strip() or None
 
     rows = []
+    matrix = _cross_rate_matrix() if from_c else None
     if from_c:
         if to_c:
             if to_c == from_c:
                 rows = [{"from_currency": from_c, "to_currency": to_c, "country_from": country_from or "—", "country_to": country_to or "—", "rate": 1.0, "detail": None, "missing": None}]
             else:
-                rate, detail, missing = _compute_cross_rate_for_pair(from_c, to_c, country_from, country_to)
+                rate, detail, missing = _cross_rate(matrix, from_c, to_c, country_from, country_to)
                 rows = [{
                     "from_currency": from_c,
                     "to_currency": to_c,
@@ -388,7 +460,7 @@ def cross_rates_list(request):
             for c in currencies:
                 if c.code == from_c:
                     continue
-                rate, detail, missing = _compute_cross_rate_for_pair(from_c, c.code, country_from, country_to)
+                rate, detail, missing = _cross_rate(matrix, from_c, c.code, country_from, country_to)
                 rows.append({
                     "from_currency": from_c,
                     "to_currency": c.code,
@@ -407,6 +479,7 @@ def cross_rates_list(request):
         "country_from": country_from or "",
         "country_to": country_to or "",
         "rows": rows,
+        "matrix": matrix,
     })
 
 
@@ -414,12 +487,13 @@ def cross_rates_list(request):
 def rate_cross(request):
     """Page dashboard : liste des ajustements taux croisé + taux calculé pour chaque paire. Modifier / Supprimer / Ajouter."""
     adjustments = list(CrossRateAdjustment.objects.all().order_by("target"))
+    matrix = _cross_rate_matrix()
     rows = []
     for adj in adjustments:
         from_c, to_c = _parse_cross_target(adj.target)
         example_rate, _detail, _missing = None, None, None
         if from_c and to_c:
-            example_rate, _detail, _missing = _compute_cross_rate_for_pair(from_c, to_c)
+            example_rate, _detail, _missing = _cross_rate(matrix, from_c, to_c)
         rows.append({
             "adjustment": adj,
             "from_currency": from_c or "—",
@@ -499,6 +573,43 @@ def refresh_config(request):
     return render(request, "dashboard/refresh_config.html", {"config": config})
 
 
+@require_http_methods(["GET", "POST"])
+@staff_member_required
+def rate_alerts(request):
+    """
+    Alertes de la détection d'anomalies (core.anomaly) : taux calculés, carnets au refresh (dont quarantaines),
+    écarts pays / global. POST : acquitter une alerte (id) ou toutes (all).
+    """
+    if request.method == "POST":
+        pending = RateAlert.objects.filter(acknowledged=False)
+        if request.POST.get("all"):
+            n = pending.update(acknowledged=True)
+        else:
+            n = pending.filter(pk=request.POST.get("id") or 0).update(acknowledged=True)
+        messages.success(request, f"{n} alerte(s) acquittée(s).")
+        return redirect("dashboard:rate_alerts")
+
+    show_all = request.GET.get("all") == "1"
+    alerts = RateAlert.objects.all() if show_all else RateAlert.objects.filter(acknowledged=False)
+    page_obj = Paginator(alerts, 50).get_page(request.GET.get("page"))
+    since = timezone.now() - timedelta(hours=24)
+    counts = dict(
+        RateAlert.objects.filter(acknowledged=False).values("kind").annotate(n=Count("id")).values_list("kind", "n")
+    )
+    return render(request, "dashboard/rate_alerts.html", {
+        "page_obj": page_obj,
+        "show_all": show_all,
+        "pending_by_kind": [(label, counts.get(kind, 0)) for kind, label in RateAlert.KIND_CHOICES],
+        "pending_total": sum(counts.values()),
+        "quarantined_24h": RateAlert.objects.filter(quarantined=True, created_at__gte=since).count(),
+        "thresholds": {
+            "alert": getattr(settings, "RATE_ANOMALY_Z", 4.0),
+            "quarantine": getattr(settings, "RATE_ANOMALY_QUARANTINE_Z", 8.0),
+            "min_samples": getattr(settings, "RATE_ANOMALY_MIN_SAMPLES", 20),
+        },
+    })
+
+
 @require_http_methods(["POST"])
 @staff_member_required
 def platform_set_default(request):
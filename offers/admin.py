@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import RateHistory
+from .models import RateCandle, RateHistory
 
 
 @admin.register(RateHistory)
 class RateHistoryAdmin(admin.ModelAdmin):
     list_display = ("source_currency", "target_currency", "rate", "trade_type", "platform", "created_at")
     list_filter = ("platform", "trade_type")
+
+
+@admin.register(RateCandle)
+class RateCandleAdmin(admin.ModelAdmin):
+    list_display = ("source_currency", "target_currency", "trade_type", "country", "platform", "granularity", "start", "open", "high", "low", "close", "samples")
+    list_filter = ("granularity", "platform", "trade_type")
+    date_hierarchy = "start"
@@ -0,0 +1,133 @@
+"""
+Requêtes groupées (POST /api/v1/offers/batch/) : plusieurs requêtes offres / meilleures offres / taux croisé
+évaluées ensemble.
+
+- Carnets : tous les snapshots nécessaires chargés en une requête (get_books), cache du process inclus.
+- Configuration figée pour le lot (PinnedConfig) : règles RateAdjustment, CrossRateAdjustment et liquidité
+  lues une fois au début ; toutes les sous-requêtes voient la même version (config_version dans la réponse).
+"""
+import hashlib
+import logging
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from core.majoration import cross_adjustment_for, load_cross_rules, load_offer_rules
+from offers.index import SnapshotBook, get_books
+from offers.services import _liquidity_predicate, _offer_predicate, _platform_book, _ranked_book
+from platforms.registry import get_default_platform
+
+logger = logging.getLogger(__name__)
+
+
+class PinnedConfig:
+    """Règles d'ajustement et de liquidité lues une fois pour tout un lot."""
+
+    def __init__(self):
+        self.offer_rules = load_offer_rules()
+        self.cross_rules = load_cross_rules()
+        self.liquidity = {trade_type: _liquidity_predicate(trade_type) for trade_type in ("BUY", "SELL")}
+        self.version = self._fingerprint()
+
+    def _fingerprint(self) -> str:
+        """Empreinte courte des règles actives : deux lots avec la même valeur ont vu les mêmes règles."""
+        parts = [
+            f"o:{t}:{r.mode}:{r.value}:{int(bool(getattr(r, 'minorer', False)))}"
+            for t, r in sorted(self.offer_rules.items())
+        ]
+        parts += [
+            f"c:{t}:{r.mode}:{r.value_buy}:{r.value_sell}:{int(bool(r.minorer_buy))}:{int(bool(r.minorer_sell))}"
+            for t, r in sorted(self.cross_rules.items())
+        ]
+        from core.models import LiquidityConfig
+        parts += [
+            f"l:{trade_type}:{min_a}:{max_a}:{int(inclusion)}:{int(in_fiat)}"
+            for trade_type, min_a, max_a, inclusion, in_fiat in LiquidityConfig.objects.filter(active=True)
+            .order_by("trade_type")
+            .values_list("trade_type", "min_amount", "max_amount", "require_inclusion", "amount_in_fiat")
+        ]
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def book_keys(queries: List[Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+    """Carnets (fiat, trade_type, country) nécessaires au lot."""
+    keys = []
+    for q in queries:
+        if q["type"] == "cross":
+            keys.append((q["from_currency"], "BUY", q["country_from"] or ""))
+            keys.append((q["to_currency"], "SELL", q["country_to"] or ""))
+        else:
+            keys.append((q["fiat"], q["trade_type"], q["country"] or ""))
+    return keys
+
+
+def _load_books(keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], SnapshotBook]:
+    platform = get_default_platform()
+    if not platform:
+        return {}
+    if getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        return get_books(platform.code, keys)
+    return {
+        key: _platform_book(platform, None, "USDT", key[0], key[1], key[2] or None, True)
+        for key in dict.fromkeys(keys)
+    }
+
+
+def run_batch(queries: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], PinnedConfig]:
+    """
+    queries : requêtes déjà validées, chacune avec id et type :
+      - "offers" / "best" : fiat, trade_type, country, limit, filters (arguments d'iter_offers hors platforms) ;
+      - "cross" : from_currency, to_currency, country_from, country_to.
+    Retourne ({id: résultat}, config figée). Résultat offres : {"offers": [...]} (offres brutes avec adjusted_price) ;
+    cross : {"rate", "best_offer_from", "best_offer_to"} ou {"error", "detail", "missing", "status": 404}.
+    """
+    config = PinnedConfig()
+    books = _load_books(book_keys(queries))
+    results: Dict[str, Dict[str, Any]] = {}
+    for q in queries:
+        if q["type"] == "cross":
+            results[q["id"]] = _cross_result(q, books, config)
+            continue
+        key = (q["fiat"], q["trade_type"], q["country"] or "")
+        book = books.get(key)
+        if book is None:
+            results[q["id"]] = {"offers": []}
+            continue
+        filters = q.get("filters") or {}
+        accept = _offer_predicate(config.liquidity[q["trade_type"]], filters.get("quality"))
+        ranked = _ranked_book(book, q["fiat"], q["trade_type"], q["country"], accept, rules=config.offer_rules, **filters)
+        offers = list(islice(ranked, q["limit"]))
+        for o in offers:
+            o.setdefault("fiat", q["fiat"])
+        results[q["id"]] = {"offers": offers}
+    logger.debug("batch: %s requêtes, %s carnets, config %s", len(queries), len(books), config.version)
+    return results, config
+
+
+def _cross_result(q: Dict[str, Any], books: Dict[Tuple[str, str, str], SnapshotBook], config: PinnedConfig) -> Dict[str, Any]:
+    """Taux croisé sur les meilleurs prix bruts (même calcul que /rates/cross/ sans amount), règles figées."""
+    from_c, to_c = q["from_currency"], q["to_currency"]
+    country_from, country_to = q["country_from"], q["country_to"]
+    if from_c == to_c:
+        return {"rate": 1.0, "best_offer_from": None, "best_offer_to": None}
+    book_from: Optional[SnapshotBook] = books.get((from_c, "BUY", country_from or ""))
+    book_to: Optional[SnapshotBook] = books.get((to_c, "SELL", country_to or ""))
+    best_from = dict(book_from.offers[0]) if book_from is not None and len(book_from) else None
+    best_to = dict(book_to.offers[0]) if book_to is not None and len(book_to) else None
+    missing = []
+    if not best_from:
+        missing.append(f"offres {from_c} BUY" + (f" (pays: {country_from})" if country_from else ""))
+    if not best_to:
+        missing.append(f"offres {to_c} SELL" + (f" (pays: {country_to})" if country_to else ""))
+    if missing:
+        detail = "Taux croisé indisponible : " + "; ".join(missing) + "."
+        return {"error": "Taux non disponible", "detail": detail, "missing": missing, "status": 404}
+    price_buy = float(best_from.get("price") or 0)
+    if price_buy <= 0:
+        detail = f"Taux croisé indisponible : prix invalide (<= 0) pour les offres {from_c} BUY."
+        return {"error": "Taux non disponible", "detail": detail, "missing": [f"prix valide pour {from_c} BUY"], "status": 404}
+    rate = cross_adjustment_for(from_c, to_c, config.cross_rules)(price_buy, float(best_to.get("price") or 0))
+    best_from.setdefault("fiat", from_c)
+    best_to.setdefault("fiat", to_c)
+    return {"rate": round(rate, 8), "best_offer_from": best_from, "best_offer_to": best_to}
@@ -0,0 +1,99 @@
+"""
+Flux de différences des carnets (GET /api/v1/offers/changes/?since=<génération>).
+
+Au refresh (store_snapshot), le nouveau carnet est comparé au précédent par offer_id : offres ajoutées,
+modifiées (hors champ raw) et retirées sont enregistrées dans OfferChange sous la nouvelle génération
+du snapshot. Un client qui recopie le carnet demande les changements depuis sa dernière génération au lieu
+de recharger toutes les pages ; trop en retard (journal purgé) → marqueur resync.
+
+Appliquer les changements est idempotent (dernier état par offer_id) : un client qui recharge le carnet
+puis reprend depuis la génération annoncée par le resync ne perd aucun changement.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from core.models import OfferChange, OffersSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Champs ignorés dans la comparaison (réponse brute de la plateforme, non exposée)
+IGNORED_FIELDS = ("raw",)
+
+
+def _comparable(o: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in o.items() if k not in IGNORED_FIELDS}
+
+
+def diff_books(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Optional[Dict[str, list]]:
+    """{"added", "changed", "removed"} entre deux carnets, par offer_id. None si une offre n'a pas d'offer_id."""
+    old_by_id = {}
+    for o in old:
+        if not o.get("offer_id"):
+            return None
+        old_by_id[o["offer_id"]] = o
+    added, changed, seen = [], [], set()
+    for o in new:
+        offer_id = o.get("offer_id")
+        if not offer_id:
+            return None
+        seen.add(offer_id)
+        previous = old_by_id.get(offer_id)
+        if previous is None:
+            added.append(o)
+        elif _comparable(previous) != _comparable(o):
+            changed.append(o)
+    removed = [offer_id for offer_id in old_by_id if offer_id not in seen]
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def record_changes(snapshot_id: int, generation: int, old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> None:
+    """Enregistre le diff de `generation` et purge les générations au-delà de OFFER_CHANGES_KEEP (même transaction que data)."""
+    diff = diff_books(old, new)
+    if diff is None:
+        OfferChange.objects.create(snapshot_id=snapshot_id, generation=generation, resync=True)
+    else:
+        OfferChange.objects.create(snapshot_id=snapshot_id, generation=generation, **diff)
+    keep = getattr(settings, "OFFER_CHANGES_KEEP", 50)
+    OfferChange.objects.filter(snapshot_id=snapshot_id, generation__lte=generation - keep).delete()
+
+
+def changes_since(
+    platform_code: str, fiat: str, trade_type: str, country: Optional[str], since: int
+) -> Dict[str, Any]:
+    """
+    Changements cumulés des générations since+1 .. courante : {"generation", "resync", "upserts", "removed"}.
+    upserts = dernier état brut des offres ajoutées ou modifiées ; removed = offer_id retirés.
+    resync=True si le snapshot est inconnu, since hors journal (purgé, 0, ou dans le futur) ou un diff impossible.
+    """
+    row = (
+        OffersSnapshot.objects.filter(platform=platform_code, fiat=fiat, trade_type=trade_type, country=country or "")
+        .values_list("pk", "generation")
+        .first()
+    )
+    if row is None:
+        return {"generation": 0, "resync": True, "upserts": [], "removed": []}
+    snapshot_id, generation = row
+    if since == generation:
+        return {"generation": generation, "resync": False, "upserts": [], "removed": []}
+    resync = {"generation": generation, "resync": True, "upserts": [], "removed": []}
+    if since <= 0 or since > generation:
+        return resync
+    entries = list(
+        OfferChange.objects.filter(snapshot_id=snapshot_id, generation__gt=since, generation__lte=generation)
+        .order_by("generation")
+        .values_list("generation", "added", "changed", "removed", "resync")
+    )
+    if len(entries) != generation - since or entries[0][0] != since + 1 or any(e[4] for e in entries):
+        return resync
+    upserts: Dict[str, Dict[str, Any]] = {}
+    removed = set()
+    for _, added, changed, gone, _ in entries:
+        for offer_id in gone:
+            upserts.pop(offer_id, None)
+            removed.add(offer_id)
+        for o in added + changed:
+            upserts[o["offer_id"]] = o
+            removed.discard(o["offer_id"])
+    return {"generation": generation, "resync": False, "upserts": list(upserts.values()), "removed": sorted(removed)}
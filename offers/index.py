@@ -0,0 +1,623 @@
+"""
+Index précalculés par snapshot (OffersSnapshot.index), construits au refresh à partir du carnet trié.
+
+Le carnet (data) est enregistré trié meilleur prix d'abord (BUY = plus bas, SELL = plus haut) :
+les positions de l'index sont des positions dans data.
+
+depth : sommes préfixes de capacité et de contrepartie, dans l'unité d'entrée du client
+  - BUY (client donne du fiat, reçoit de l'USDT) : entrée = fiat, sortie = USDT ;
+  - SELL (client donne de l'USDT, reçoit du fiat) : entrée = USDT, sortie = fiat.
+  Un devis pour un montant = recherche dichotomique dans cap au lieu d'un parcours du carnet.
+
+payment_methods : index inversé identifiant de moyen de paiement (minuscules) → bitset des positions
+  (entier encodé en hexadécimal) ; filtre ET / OU = opérations sur entiers.
+
+quality : bitsets annonceur — merchant, et par palier de taux de complétion / nombre d'ordres
+  (offres >= palier). Un seuil de requête prend le plus haut palier <= seuil, puis vérification exacte.
+
+score : classement composite prix / fiabilité (OFFER_SCORE_WEIGHTS) — score par position et ordre des
+  positions par score décroissant, recalculé en mémoire seulement si les poids ont changé depuis le refresh.
+  Critère "executed" : exécutions déclarées par nos clients (AdvertiserStats), lues au refresh.
+
+generation / OfferChange (offers.changes) : diff par offer_id avec le carnet précédent, à chaque refresh.
+
+references (table OfferReference, réécrite avec le snapshot) : advertiser.user_no → positions,
+  pour résoudre une reference sans décoder de carnet. Stockée et cherchée sous reference_key() (longues
+  references hachées), comparée en entier aux offres du carnet.
+
+En mémoire (SnapshotBook, gardé par process et invalidé par updated_at) : le carnet décodé et des
+structures dérivées construites à la demande, ex. l'arbre d'intervalles centré [min, max] des offres.
+"""
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from core.advertiser_usage import executed_counts
+from core.models import OfferReference, OffersSnapshot, reference_key
+from offers.changes import record_changes
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter quand la structure change : les index plus anciens sont reconstruits à la lecture
+INDEX_VERSION = 3
+
+# Paliers des bitsets quality (taux de complétion 0..1, nombre d'ordres sur 30 jours)
+FINISH_RATE_STEPS = (0.5, 0.8, 0.9, 0.95, 0.98, 0.99)
+ORDER_COUNT_STEPS = (10, 50, 100, 200, 500, 1000)
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def sort_book(offers: List[Dict[str, Any]], trade_type: str) -> List[Dict[str, Any]]:
+    """Carnet trié meilleur prix d'abord (tri stable : l'ordre plateforme départage les égalités)."""
+    return sorted(offers, key=lambda o: _num(o.get("price")), reverse=(trade_type == "SELL"))
+
+
+def leg_limits(o: Dict[str, Any], trade_type: str) -> Tuple[float, float, float]:
+    """
+    (min, max, sortie par unité d'entrée) d'une offre dans l'unité d'entrée du client.
+    Offre sans prix valide : capacité nulle.
+    """
+    price = _num(o.get("price"))
+    if price <= 0:
+        return 0.0, 0.0, 0.0
+    if trade_type == "BUY":
+        return _num(o.get("min_fiat")), _num(o.get("max_fiat")), 1.0 / price
+    max_usdt = _num(o.get("max_usdt")) or _num(o.get("max_fiat")) / price
+    min_usdt = _num(o.get("min_usdt")) or _num(o.get("min_fiat")) / price
+    return min_usdt, max_usdt, price
+
+
+def build_depth(offers: List[Dict[str, Any]], trade_type: str) -> Dict[str, List[float]]:
+    cap = [0.0]
+    out = [0.0]
+    for o in offers:
+        _, max_in, rate = leg_limits(o, trade_type)
+        cap.append(cap[-1] + max_in)
+        out.append(out[-1] + max_in * rate)
+    return {"cap": cap, "out": out}
+
+
+def payment_method_ids(o: Dict[str, Any]) -> List[str]:
+    out = []
+    for m in o.get("payment_methods") or []:
+        ident = m.get("identifier") if isinstance(m, dict) else m
+        if ident:
+            out.append(str(ident).lower())
+    return out
+
+
+def build_payment_index(offers: List[Dict[str, Any]]) -> Dict[str, str]:
+    bits: Dict[str, int] = {}
+    for pos, o in enumerate(offers):
+        for ident in payment_method_ids(o):
+            bits[ident] = bits.get(ident, 0) | (1 << pos)
+    return {ident: format(b, "x") for ident, b in bits.items()}
+
+
+def advertiser_stats(o: Dict[str, Any]) -> Tuple[float, float, float]:
+    """(taux de complétion 0..1, ordres sur 30 jours, taux d'avis positifs 0..1) de l'annonceur."""
+    adv = o.get("advertiser") if isinstance(o.get("advertiser"), dict) else {}
+    return (
+        min(1.0, max(0.0, _num(adv.get("month_finish_rate")))),
+        max(0.0, _num(adv.get("month_order_count"))),
+        min(1.0, max(0.0, _num(adv.get("positive_rate")))),
+    )
+
+
+def build_quality_index(offers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merchant = 0
+    finish = {step: 0 for step in FINISH_RATE_STEPS}
+    orders = {step: 0 for step in ORDER_COUNT_STEPS}
+    for pos, o in enumerate(offers):
+        bit = 1 << pos
+        if o.get("merchant"):
+            merchant |= bit
+        finish_rate, order_count, _ = advertiser_stats(o)
+        for step in FINISH_RATE_STEPS:
+            if finish_rate >= step:
+                finish[step] |= bit
+        for step in ORDER_COUNT_STEPS:
+            if order_count >= step:
+                orders[step] |= bit
+    return {
+        "merchant": format(merchant, "x"),
+        "finish_rate": {str(step): format(b, "x") for step, b in finish.items()},
+        "orders": {str(step): format(b, "x") for step, b in orders.items()},
+    }
+
+
+def score_weights() -> Dict[str, float]:
+    weights = dict(getattr(settings, "OFFER_SCORE_WEIGHTS", None) or {"price": 1.0})
+    weights["orders_cap"] = float(getattr(settings, "OFFER_SCORE_ORDERS_CAP", 500))
+    weights["executed_cap"] = float(getattr(settings, "OFFER_SCORE_EXECUTED_CAP", 50))
+    return weights
+
+
+def build_scores(
+    offers: List[Dict[str, Any]], weights: Optional[Dict[str, float]] = None, executed: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """
+    Score composite par position (0..1, plus haut = meilleur) : prix normalisé entre le meilleur et le pire
+    prix du carnet, taux de complétion, ordres (plafonnés à orders_cap), avis positifs et exécutions
+    déclarées par nos clients (executed = {reference: déclarations}, plafonnées à executed_cap), pondérés.
+    order : positions par score décroissant, à score égal dans l'ordre des prix.
+    """
+    weights = weights or score_weights()
+    executed = executed or {}
+    w_price = weights.get("price", 0.0)
+    w_finish = weights.get("finish_rate", 0.0)
+    w_orders = weights.get("orders", 0.0)
+    w_positive = weights.get("positive_rate", 0.0)
+    w_executed = weights.get("executed", 0.0)
+    total = (w_price + w_finish + w_orders + w_positive + w_executed) or 1.0
+    cap = weights.get("orders_cap") or 1.0
+    executed_cap = weights.get("executed_cap") or 1.0
+    values = []
+    if offers:
+        best, worst = _num(offers[0].get("price")), _num(offers[-1].get("price"))
+        span = best - worst
+        for o in offers:
+            price_score = (_num(o.get("price")) - worst) / span if span else 1.0
+            finish_rate, order_count, positive_rate = advertiser_stats(o)
+            score = (
+                w_price * price_score + w_finish * finish_rate
+                + w_orders * min(1.0, order_count / cap) + w_positive * positive_rate
+                + w_executed * min(1.0, executed.get(reference_key(reference_of(o)), 0) / executed_cap)
+            ) / total
+            values.append(round(score, 6))
+    order = sorted(range(len(values)), key=lambda pos: -values[pos])
+    return {"weights": weights, "values": values, "order": order, "executed": executed}
+
+
+def build_snapshot_index(
+    offers: List[Dict[str, Any]], trade_type: str, executed: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """Index d'un carnet déjà trié (sort_book) ; executed : voir build_scores."""
+    return {
+        "version": INDEX_VERSION,
+        "trade_type": trade_type,
+        "size": len(offers),
+        "depth": build_depth(offers, trade_type),
+        "payment_methods": build_payment_index(offers),
+        "quality": build_quality_index(offers),
+        "score": build_scores(offers, executed=executed),
+    }
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Positions des bits à 1, par position croissante."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def ensure_index(offers: List[Dict[str, Any]], index: Optional[Dict[str, Any]], trade_type: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any], bool]:
+    """(carnet trié, index à jour, reconstruit ?) : reconstruit si absent, d'une autre version ou d'une autre taille."""
+    if isinstance(index, dict) and index.get("version") == INDEX_VERSION and index.get("size") == len(offers):
+        return offers, index, False
+    offers = sort_book(offers, trade_type)
+    return offers, build_snapshot_index(offers, trade_type), True
+
+
+def reference_of(o: Dict[str, Any]) -> str:
+    """Reference exposée aux clients pour une offre (advertiser.user_no), "" si absente."""
+    adv = o.get("advertiser")
+    return str(adv.get("user_no") or "") if isinstance(adv, dict) else ""
+
+
+def reference_positions(offers: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """{reference_key: positions} du carnet."""
+    out: Dict[str, List[int]] = {}
+    for pos, o in enumerate(offers):
+        ref = reference_of(o)
+        if ref:
+            out.setdefault(reference_key(ref), []).append(pos)
+    return out
+
+
+def write_references(snapshot_id: int, offers: List[Dict[str, Any]]) -> None:
+    """Réécrit l'index reference → positions d'un snapshot (à appeler dans la transaction qui écrit data)."""
+    OfferReference.objects.filter(snapshot_id=snapshot_id).delete()
+    OfferReference.objects.bulk_create(
+        [OfferReference(snapshot_id=snapshot_id, reference=ref, positions=positions) for ref, positions in reference_positions(offers).items()],
+        batch_size=500,
+    )
+
+
+def store_snapshot(platform_code: str, fiat: str, trade_type: str, country: Optional[str], offers: List[Dict[str, Any]]) -> OffersSnapshot:
+    """
+    Enregistre un carnet (refresh) : tri meilleur prix d'abord, index et references calculés une fois ici.
+    Nouvelle génération du snapshot + diff avec le carnet précédent (offers.changes).
+    """
+    offers = sort_book(offers, trade_type)
+    # Exécutions déclarées par les clients (cumuls AdvertiserStats, une requête) : critère du score
+    executed = executed_counts(fiat, trade_type, (reference_key(reference_of(o)) for o in offers))
+    index = build_snapshot_index(offers, trade_type, executed)
+    with transaction.atomic():
+        snapshot = (
+            OffersSnapshot.objects.select_for_update()
+            .filter(platform=platform_code, fiat=fiat, trade_type=trade_type, country=country or "")
+            .first()
+        )
+        if snapshot is None:
+            snapshot = OffersSnapshot.objects.create(
+                platform=platform_code, fiat=fiat, trade_type=trade_type, country=country or "",
+                data=offers, index=index, generation=1,
+            )
+        else:
+            previous = snapshot.data if isinstance(snapshot.data, list) else []
+            snapshot.data = offers
+            snapshot.index = index
+            snapshot.generation += 1
+            snapshot.save(update_fields=["data", "index", "generation", "updated_at"])
+            record_changes(snapshot.pk, snapshot.generation, previous, offers)
+        write_references(snapshot.pk, offers)
+    return snapshot
+
+
+def offer_bounds(o: Dict[str, Any], unit: str = "fiat") -> Tuple[float, float]:
+    """[min, max] d'une offre en fiat, ou en USDT (min_usdt/max_usdt, à défaut min_fiat/max_fiat ÷ prix)."""
+    if unit == "fiat":
+        return _num(o.get("min_fiat")), _num(o.get("max_fiat"))
+    price = _num(o.get("price"))
+    max_usdt = _num(o.get("max_usdt")) or (_num(o.get("max_fiat")) / price if price > 0 else 0.0)
+    min_usdt = _num(o.get("min_usdt")) or (_num(o.get("min_fiat")) / price if price > 0 else 0.0)
+    return min_usdt, max_usdt
+
+
+class IntervalTree:
+    """
+    Arbre d'intervalles centré, statique, sur les positions du carnet (donc dans l'ordre des prix).
+    Chaque nœud a un centre (médiane des bornes de ses intervalles) et garde les intervalles qui le
+    contiennent, triés par min croissant et par max décroissant ; les autres descendent à gauche (max < centre)
+    ou à droite (min > centre), d'où une profondeur O(log n). Une requête suit un seul chemin et, à chaque
+    nœud, ne lit que les intervalles qui acceptent le montant (arrêt au premier refus) : O(log n + k).
+    Les k positions trouvées sortent par position croissante via un tas (top-K en O(log n + k + K log k)).
+    """
+
+    def __init__(self, bounds: List[Tuple[float, float]]):
+        self.size = len(bounds)
+        self.center: List[float] = []
+        self.by_lo: List[List[Tuple[float, int]]] = []
+        self.by_hi: List[List[Tuple[float, int]]] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        # Limites incohérentes (min > max) : aucun montant accepté
+        self.root = self._build([(lo, hi, pos) for pos, (lo, hi) in enumerate(bounds) if lo <= hi])
+
+    def _build(self, items: List[Tuple[float, float, int]]) -> int:
+        if not items:
+            return -1
+        endpoints = sorted(v for lo, hi, _ in items for v in (lo, hi))
+        center = endpoints[len(endpoints) // 2]
+        here = [it for it in items if it[0] <= center <= it[1]]
+        node = len(self.center)
+        self.center.append(center)
+        self.by_lo.append(sorted((lo, pos) for lo, _, pos in here))
+        self.by_hi.append(sorted(((hi, pos) for _, hi, pos in here), key=lambda e: -e[0]))
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build([it for it in items if it[1] < center])
+        self.right[node] = self._build([it for it in items if it[0] > center])
+        return node
+
+    def iter_containing(self, amount: float) -> Iterator[int]:
+        """Positions dont [min, max] contient amount, par position croissante."""
+        found: List[int] = []
+        node = self.root
+        while node >= 0:
+            center = self.center[node]
+            if amount < center:
+                for lo, pos in self.by_lo[node]:
+                    if lo > amount:
+                        break
+                    found.append(pos)
+                node = self.left[node]
+            elif amount > center:
+                for hi, pos in self.by_hi[node]:
+                    if hi < amount:
+                        break
+                    found.append(pos)
+                node = self.right[node]
+            else:
+                found.extend(pos for _, pos in self.by_lo[node])
+                break
+        heapq.heapify(found)
+        while found:
+            yield heapq.heappop(found)
+
+
+class SnapshotBook:
+    """Carnet trié (meilleur prix d'abord) + index du refresh + structures dérivées construites à la demande."""
+
+    def __init__(self, offers: List[Dict[str, Any]], index: Dict[str, Any], trade_type: str):
+        self.offers = offers
+        self.index = index
+        self.trade_type = trade_type
+        self._trees: Dict[str, IntervalTree] = {}
+        self._payment_bits: Optional[Dict[str, int]] = None
+        self._quality_bits: Optional[Dict[str, Any]] = None
+        self._scores: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_offers(cls, offers: List[Dict[str, Any]], trade_type: str) -> "SnapshotBook":
+        """Carnet non indexé (source live) : tri + index calculés ici."""
+        offers = sort_book(offers, trade_type)
+        return cls(offers, build_snapshot_index(offers, trade_type), trade_type)
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    def interval_tree(self, unit: str = "fiat") -> IntervalTree:
+        tree = self._trees.get(unit)
+        if tree is None:
+            with self._lock:
+                tree = self._trees.get(unit)
+                if tree is None:
+                    tree = self._trees[unit] = IntervalTree([offer_bounds(o, unit) for o in self.offers])
+        return tree
+
+    def positions_accepting(self, amount: float, unit: str = "fiat") -> Iterator[int]:
+        """Positions (ordre des prix) des offres dont les limites acceptent exactement `amount` (fiat ou usdt)."""
+        return self.interval_tree(unit).iter_containing(amount)
+
+    def payment_bits(self, methods: List[str], match: str = "any") -> int:
+        """Bitset des offres qui proposent un des moyens (match="any") ou tous (match="all")."""
+        if self._payment_bits is None:
+            self._payment_bits = {ident: int(b, 16) for ident, b in (self.index.get("payment_methods") or {}).items()}
+        sets = [self._payment_bits.get(m.lower(), 0) for m in methods]
+        if not sets:
+            return (1 << len(self.offers)) - 1
+        result = sets[0]
+        for b in sets[1:]:
+            result = (result & b) if match == "all" else (result | b)
+        return result
+
+    def quality_bits(self, min_finish_rate: Optional[float] = None, min_orders: Optional[int] = None, merchant_only: bool = False) -> Optional[int]:
+        """
+        Bitset des candidats aux filtres annonceur (sur-ensemble : plus haut palier <= seuil), None si aucun filtre.
+        Le seuil exact reste à vérifier offre par offre (quality_predicate).
+        """
+        if min_finish_rate is None and min_orders is None and not merchant_only:
+            return None
+        if self._quality_bits is None:
+            q = self.index.get("quality") or {}
+            self._quality_bits = {
+                "merchant": int(q.get("merchant") or "0", 16),
+                "finish_rate": sorted((float(k), int(v, 16)) for k, v in (q.get("finish_rate") or {}).items()),
+                "orders": sorted((float(k), int(v, 16)) for k, v in (q.get("orders") or {}).items()),
+            }
+        result = (1 << len(self.offers)) - 1
+        if merchant_only:
+            result &= self._quality_bits["merchant"]
+        for name, threshold in (("finish_rate", min_finish_rate), ("orders", min_orders)):
+            if threshold is None:
+                continue
+            steps = [b for step, b in self._quality_bits[name] if step <= threshold]
+            if steps:
+                result &= steps[-1]
+        return result
+
+    def scores(self) -> Dict[str, Any]:
+        """{"values", "order"} du classement composite ; celui du refresh si les poids n'ont pas changé."""
+        if self._scores is None:
+            scores = self.index.get("score")
+            weights = score_weights()
+            if not isinstance(scores, dict) or scores.get("weights") != weights or len(scores.get("values") or []) != len(self.offers):
+                executed = scores.get("executed") if isinstance(scores, dict) else None
+                scores = build_scores(self.offers, weights, executed)
+            self._scores = scores
+        return self._scores
+
+
+def quality_predicate(min_finish_rate: Optional[float] = None, min_orders: Optional[int] = None, merchant_only: bool = False):
+    """Vérification exacte des filtres annonceur (None si aucun filtre)."""
+    if min_finish_rate is None and min_orders is None and not merchant_only:
+        return None
+
+    def accept(o: Dict[str, Any]) -> bool:
+        if merchant_only and not o.get("merchant"):
+            return False
+        finish_rate, order_count, _ = advertiser_stats(o)
+        if min_finish_rate is not None and finish_rate < min_finish_rate:
+            return False
+        if min_orders is not None and order_count < min_orders:
+            return False
+        return True
+
+    return accept
+
+
+# Carnets décodés gardés en mémoire du process : clé snapshot → (updated_at, SnapshotBook) ; carnets live
+# (cache partagé, offers.services) : ("live", ...) → (marque de l'entrée du cache, SnapshotBook)
+BOOK_CACHE_SIZE = 256
+_books: "OrderedDict[tuple, Tuple[Any, SnapshotBook]]" = OrderedDict()
+_books_lock = threading.Lock()
+
+
+def _empty_book(trade_type: str) -> SnapshotBook:
+    return SnapshotBook([], build_snapshot_index([], trade_type), trade_type)
+
+
+def _cached_book(key: tuple, updated_at) -> Optional[SnapshotBook]:
+    with _books_lock:
+        cached = _books.get(key)
+        if cached is not None and cached[0] == updated_at:
+            _books.move_to_end(key)
+            return cached[1]
+    return None
+
+
+def _load_book(key: tuple, pk: int, data: Any, index: Any, updated_at) -> SnapshotBook:
+    """Carnet décodé d'une ligne OffersSnapshot, réindexé si besoin, puis mis en cache."""
+    platform_code, fiat, trade_type, country = key
+    offers = data if isinstance(data, list) else []
+    offers, index, rebuilt = ensure_index(offers, index, trade_type)
+    if rebuilt:
+        # update() ne touche pas updated_at (auto_now) : la clé de cache reste valable
+        with transaction.atomic():
+            OffersSnapshot.objects.filter(pk=pk).update(data=offers, index=index)
+            write_references(pk, offers)
+        logger.info("index snapshot %s %s %s %s reconstruit (%s offres)", platform_code, fiat, trade_type, country or "all", len(offers))
+    return _remember(key, updated_at, SnapshotBook(offers, index, trade_type))
+
+
+def _remember(key: tuple, version, book: SnapshotBook) -> SnapshotBook:
+    with _books_lock:
+        _books[key] = (version, book)
+        _books.move_to_end(key)
+        while len(_books) > BOOK_CACHE_SIZE:
+            _books.popitem(last=False)
+    return book
+
+
+def get_live_book(key: tuple, stamp: str, offers: List[Dict[str, Any]], trade_type: str) -> SnapshotBook:
+    """
+    Carnet live (entrée du cache partagé marquée `stamp`) : construit une fois par process et par entrée,
+    tri et index compris, puis gardé avec les carnets de snapshot.
+    """
+    key = ("live",) + tuple(key)
+    book = _cached_book(key, stamp)
+    if book is not None:
+        return book
+    return _remember(key, stamp, SnapshotBook.from_offers(offers, trade_type))
+
+
+def get_book(platform_code: str, fiat: str, trade_type: str, country: Optional[str] = None) -> SnapshotBook:
+    """
+    Carnet d'un snapshot. Si la version en mémoire a le même updated_at, pas de décodage JSON
+    (une requête légère). Un snapshot antérieur à l'index est trié, indexé et réenregistré une fois.
+    """
+    key = (platform_code, fiat, trade_type, country or "")
+    qs = OffersSnapshot.objects.filter(platform=platform_code, fiat=fiat, trade_type=trade_type, country=country or "")
+    updated_at = qs.values_list("updated_at", flat=True).first()
+    if updated_at is None:
+        return _empty_book(trade_type)
+    book = _cached_book(key, updated_at)
+    if book is not None:
+        return book
+    row = qs.values_list("pk", "data", "index", "updated_at").first()
+    if row is None:
+        return _empty_book(trade_type)
+    pk, data, index, updated_at = row
+    return _load_book(key, pk, data, index, updated_at)
+
+
+def get_books(platform_code: str, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], SnapshotBook]:
+    """
+    Carnets de plusieurs snapshots (fiat, trade_type, country) : une requête légère pour tous les updated_at,
+    plus une seule requête pour les carnets absents ou périmés du cache. Clé sans snapshot = carnet vide.
+    """
+    keys = list(dict.fromkeys((fiat, trade_type, country or "") for fiat, trade_type, country in keys))
+    if not keys:
+        return {}
+    where = Q()
+    for fiat, trade_type, country in keys:
+        where |= Q(fiat=fiat, trade_type=trade_type, country=country)
+    qs = OffersSnapshot.objects.filter(where, platform=platform_code)
+    books: Dict[Tuple[str, str, str], SnapshotBook] = {}
+    missing = []
+    for pk, fiat, trade_type, country, updated_at in qs.values_list("pk", "fiat", "trade_type", "country", "updated_at"):
+        book = _cached_book((platform_code, fiat, trade_type, country), updated_at)
+        if book is None:
+            missing.append(pk)
+        else:
+            books[(fiat, trade_type, country)] = book
+    if missing:
+        rows = OffersSnapshot.objects.filter(pk__in=missing).values_list("pk", "fiat", "trade_type", "country", "data", "index", "updated_at")
+        for pk, fiat, trade_type, country, data, index, updated_at in rows:
+            books[(fiat, trade_type, country)] = _load_book((platform_code, fiat, trade_type, country), pk, data, index, updated_at)
+    for key in keys:
+        if key not in books:
+            books[key] = _empty_book(key[1])
+    return books
+
+
+def get_snapshot_book(
+    platform_code: str, fiat: str, trade_type: str, country: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """(carnet trié, index) d'un snapshot : voir get_book."""
+    book = get_book(platform_code, fiat, trade_type, country)
+    return book.offers, book.index
+
+
+def quote_depth(
+    offers: List[Dict[str, Any]], index: Dict[str, Any], amount: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Exécution de `amount` (unité d'entrée du carnet) en parcourant le carnet meilleur prix d'abord.
+    Offres pleines jusqu'à la position trouvée par dichotomie dans les sommes préfixes ; le reliquat va
+    à l'offre suivante s'il respecte son minimum, sinon à la première offre plus loin qui l'accepte.
+    Retourne {"input", "output", "fills": [(position, entrée, sortie)]} ou None si non exécutable.
+    """
+    if amount <= 0:
+        return None
+    trade_type = index["trade_type"]
+    cap = index["depth"]["cap"]
+    out = index["depth"]["out"]
+    i = bisect_left(cap, amount)
+    if i >= len(cap):
+        return None
+    # Offres 0..last-1 prises entièrement, reliquat > 0 à placer
+    last = i - 1
+    remainder = amount - cap[last]
+    fills = []
+    for pos in range(last):
+        taken = cap[pos + 1] - cap[pos]
+        if taken > 0:
+            fills.append((pos, taken, out[pos + 1] - out[pos]))
+    output = out[last]
+    for pos in range(last, len(offers)):
+        min_in, max_in, rate = leg_limits(offers[pos], trade_type)
+        if max_in > 0 and min_in <= remainder <= max_in + 1e-9:
+            fills.append((pos, remainder, remainder * rate))
+            output += remainder * rate
+            return {"input": amount, "output": output, "fills": fills}
+    return None
+
+
+def resolve_references(
+    references: List[str],
+    platform_code: str,
+    fiat: Optional[str] = None,
+    trade_type: Optional[str] = None,
+    country: Optional[str] = None,
+) -> Dict[str, List[Tuple[SnapshotBook, Dict[str, Any], List[int]]]]:
+    """
+    references → [(carnet, snapshot {fiat, trade_type, country}, positions)] via OfferReference (une requête).
+    Seuls les carnets qui contiennent au moins une reference demandée sont chargés (get_book, cache du process).
+    fiat / trade_type / country None = toutes valeurs. country "" = snapshot tous pays.
+    """
+    by_key = {reference_key(ref): ref for ref in references}
+    qs = OfferReference.objects.filter(reference__in=list(by_key), snapshot__platform=platform_code)
+    if fiat:
+        qs = qs.filter(snapshot__fiat=fiat)
+    if trade_type:
+        qs = qs.filter(snapshot__trade_type=trade_type)
+    if country is not None:
+        qs = qs.filter(snapshot__country=country)
+    rows = qs.values_list("reference", "positions", "snapshot__fiat", "snapshot__trade_type", "snapshot__country")
+    found: Dict[str, List[Tuple[SnapshotBook, Dict[str, Any], List[int]]]] = {}
+    for key, positions, s_fiat, s_trade_type, s_country in rows.order_by("snapshot__fiat", "snapshot__trade_type", "snapshot__country"):
+        ref = by_key[key]
+        book = get_book(platform_code, s_fiat, s_trade_type, s_country)
+        # Carnet remplacé entre les deux lectures : ne garder que les positions qui portent encore la reference
+        positions = [p for p in positions if p < len(book.offers) and reference_of(book.offers[p]) == ref]
+        if positions:
+            found.setdefault(ref, []).append((book, {"fiat": s_fiat, "trade_type": s_trade_type, "country": s_country}, positions))
+    return found
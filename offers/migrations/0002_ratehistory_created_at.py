@@ -0,0 +1,19 @@
+# Generated by hand
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("offers", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ratehistory",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
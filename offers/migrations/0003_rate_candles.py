@@ -0,0 +1,76 @@
+# Generated by hand
+
+from django.db import migrations, models
+
+BACKFILL_CHUNK = 2000
+
+
+def backfill_candles(apps, schema_editor):
+    """Agrège l'historique existant en bougies (les lignes écrites ensuite le sont au report, rates.history)."""
+    from rates.candles import rollup
+
+    RateHistory = apps.get_model("offers", "RateHistory")
+    RateCandle = apps.get_model("offers", "RateCandle")
+    fields = ("source_currency", "target_currency", "trade_type", "country", "platform", "rate", "created_at")
+    last_pk = 0
+    while True:
+        rows = list(RateHistory.objects.filter(pk__gt=last_pk).order_by("pk").values("pk", *fields)[:BACKFILL_CHUNK])
+        if not rows:
+            return
+        last_pk = rows[-1]["pk"]
+        rollup([row for row in rows if row["rate"]], candle_model=RateCandle)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("offers", "0002_ratehistory_created_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ratehistory",
+            index=models.Index(
+                fields=["source_currency", "target_currency", "trade_type", "created_at"], name="offers_ratehist_pair_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ratehistory",
+            index=models.Index(fields=["created_at"], name="offers_ratehist_created"),
+        ),
+        migrations.CreateModel(
+            name="RateCandle",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source_currency", models.CharField(max_length=10)),
+                ("target_currency", models.CharField(max_length=10)),
+                ("trade_type", models.CharField(max_length=4)),
+                ("country", models.CharField(blank=True, max_length=50)),
+                ("platform", models.CharField(max_length=30)),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("minute", "Minute"), ("hour", "Heure"), ("day", "Jour")], max_length=6
+                    ),
+                ),
+                ("start", models.DateTimeField(help_text="Début de la minute, de l'heure ou du jour (UTC).")),
+                ("open", models.DecimalField(decimal_places=8, max_digits=20)),
+                ("high", models.DecimalField(decimal_places=8, max_digits=20)),
+                ("low", models.DecimalField(decimal_places=8, max_digits=20)),
+                ("close", models.DecimalField(decimal_places=8, max_digits=20)),
+                ("samples", models.PositiveIntegerField(default=0)),
+                ("opened_at", models.DateTimeField(help_text="Heure du premier taux (open).")),
+                ("closed_at", models.DateTimeField(help_text="Heure du dernier taux (close).")),
+            ],
+            options={
+                "verbose_name": "Bougie taux",
+                "verbose_name_plural": "Bougies taux",
+                "ordering": ["source_currency", "target_currency", "trade_type", "granularity", "start"],
+                "indexes": [models.Index(fields=["granularity", "start"], name="offers_candle_gran_start")],
+                "unique_together": {
+                    ("source_currency", "target_currency", "trade_type", "granularity", "country", "platform", "start")
+                },
+            },
+        ),
+        migrations.RunPython(backfill_candles, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 from django.db import models
+from django.utils import timezone
 
 
 class RateHistory(models.Model):
-    """Historique des taux pour reporting et audit."""
+    """
+    Historique des taux pour reporting et audit. Écrit par lots (rates.history) et agrégé au même moment en
+    bougies (RateCandle) ; les lignes anciennes sont purgées (prune_rate_history).
+    """
 
     source_currency = models.CharField(max_length=10)
     target_currency = models.CharField(max_length=10)
@@ -10,9 +14,55 @@ class RateHistory(models.Model):
     trade_type = models.CharField(max_length=4)
     platform = models.CharField(max_length=30)
     country = models.CharField(max_length=50, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Heure de la cotation (l'écriture est différée, rates.history)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = "Historique taux"
         verbose_name_plural = "Historiques taux"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["source_currency", "target_currency", "trade_type", "created_at"], name="offers_ratehist_pair_created"
+            ),
+            models.Index(fields=["created_at"], name="offers_ratehist_created"),
+        ]
+
+
+class RateCandle(models.Model):
+    """
+    Bougie OHLC des taux (RateHistory) par clé (source, cible, type, pays, plateforme) et minute / heure / jour.
+    Tenue à jour au report de l'historique (rates.candles.rollup) ; samples = lignes d'historique agrégées
+    (taux inchangés non enregistrés : une minute sans changement n'a pas de bougie).
+    """
+    GRANULARITY_MINUTE = "minute"
+    GRANULARITY_HOUR = "hour"
+    GRANULARITY_DAY = "day"
+    GRANULARITY_CHOICES = [(GRANULARITY_MINUTE, "Minute"), (GRANULARITY_HOUR, "Heure"), (GRANULARITY_DAY, "Jour")]
+
+    source_currency = models.CharField(max_length=10)
+    target_currency = models.CharField(max_length=10)
+    trade_type = models.CharField(max_length=4)
+    country = models.CharField(max_length=50, blank=True)
+    platform = models.CharField(max_length=30)
+    granularity = models.CharField(max_length=6, choices=GRANULARITY_CHOICES)
+    start = models.DateTimeField(help_text="Début de la minute, de l'heure ou du jour (UTC).")
+    open = models.DecimalField(max_digits=20, decimal_places=8)
+    high = models.DecimalField(max_digits=20, decimal_places=8)
+    low = models.DecimalField(max_digits=20, decimal_places=8)
+    close = models.DecimalField(max_digits=20, decimal_places=8)
+    samples = models.PositiveIntegerField(default=0)
+    opened_at = models.DateTimeField(help_text="Heure du premier taux (open).")
+    closed_at = models.DateTimeField(help_text="Heure du dernier taux (close).")
+
+    class Meta:
+        verbose_name = "Bougie taux"
+        verbose_name_plural = "Bougies taux"
+        unique_together = [
+            ["source_currency", "target_currency", "trade_type", "granularity", "country", "platform", "start"]
+        ]
+        indexes = [models.Index(fields=["granularity", "start"], name="offers_candle_gran_start")]
+        ordering = ["source_currency", "target_currency", "trade_type", "granularity", "start"]
+
+    def __str__(self):
+        return f"{self.source_currency}/{self.target_currency} {self.trade_type} {self.granularity} {self.start:%Y-%m-%d %H:%M} {self.close}"
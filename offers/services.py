@@ -1,12 +1,17 @@
+import heapq
 import logging
+import uuid
 from decimal import Decimal
-from typing import List, Dict, Any, Optional
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from django.core.cache import cache
 from django.conf import settings
 
 from core.models import LiquidityConfig, OffersSnapshot
-from core.majoration import apply_majoration
-from platforms.registry import get_platform, get_default_platform, init_platforms
+from core.majoration import majoration_for
+from offers.index import SnapshotBook, get_book, get_live_book, iter_bits, offer_bounds, quality_predicate, resolve_references
+from platforms.options import get_platform_options
+from platforms.registry import get_platform, get_default_platform, get_all_platforms, init_platforms
 
 logger = logging.getLogger(__name__)
 
@@ -46,11 +51,11 @@ def get_offers_from_snapshot(
         return []
 
 
-def filter_by_liquidity(offers: List[Dict], trade_type: str) -> List[Dict]:
-    """Filtre par min/max selon amount_in_fiat (fiat => min_fiat/max_fiat, usdt => min_usdt/max_usdt). Puis inclusion ou chevauchement selon require_inclusion."""
+def _liquidity_predicate(trade_type: str) -> Callable[[Dict], bool]:
+    """Prédicat de filtre liquidité (config lue une fois) : voir filter_by_liquidity."""
     min_a, max_a, require_inclusion, amount_in_fiat = get_liquidity_bounds(trade_type)
-    out = []
-    for o in offers:
+
+    def accept(o: Dict) -> bool:
         try:
             if amount_in_fiat:
                 o_min = float(o.get("min_fiat") or 0)
@@ -59,94 +64,338 @@ def filter_by_liquidity(offers: List[Dict], trade_type: str) -> List[Dict]:
                 o_min = float(o.get("min_usdt") or 0)
                 o_max = float(o.get("max_usdt") or 0)
         except (TypeError, ValueError):
-            continue
+            return False
         if require_inclusion:
             # Inclusion : [o_min, o_max] doit être inclus dans [min_a, max_a]
             if o_min < min_a:
-                continue
+                return False
             if max_a is not None and o_max > max_a:
-                continue
+                return False
         else:
             # Chevauchement : intersection non vide
             if o_max < min_a:
-                continue
+                return False
             if max_a is not None and o_min > max_a:
-                continue
-        out.append(o)
+                return False
+        return True
+
+    return accept
+
+
+def filter_by_liquidity(offers: List[Dict], trade_type: str) -> List[Dict]:
+    """Filtre par min/max selon amount_in_fiat (fiat => min_fiat/max_fiat, usdt => min_usdt/max_usdt). Puis inclusion ou chevauchement selon require_inclusion."""
+    return list(filter(_liquidity_predicate(trade_type), offers))
+
+
+def _ranked_offers(
+    book: SnapshotBook,
+    fiat: str,
+    trade_type: str,
+    country: Optional[str],
+    accept: Callable[[Dict], bool],
+    positions: Optional[Iterable[int]] = None,
+    scores: Optional[List[float]] = None,
+    rules: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Offres d'un carnet trié, meilleure d'abord, filtrées (liquidité) et avec adjusted_price, produites à la demande.
+    positions : positions retenues par les index, dans l'ordre de sortie (None = tout le carnet, ordre des prix).
+    scores : score composite par position, ajouté à chaque offre (classement order=score).
+    rules : règles RateAdjustment déjà chargées (load_offer_rules), sinon une requête par pays.
+    L'ajustement est monotone pour un même (fiat, trade_type, pays) : l'ordre des prix bruts est celui des prix ajustés.
+    Chaque offre produite est une copie : le carnet peut être partagé (cache du process).
+    """
+    adjusters = {}
+    offers = book.offers
+    for pos in (range(len(offers)) if positions is None else positions):
+        o = offers[pos]
+        if not accept(o):
+            continue
+        o_country = o.get("country") or country or ""
+        adjust = adjusters.get(o_country)
+        if adjust is None:
+            adjust = adjusters[o_country] = majoration_for(fiat, trade_type, o_country, rules)
+        o = dict(o)
+        o["adjusted_price"] = adjust(o.get("price") or 0)
+        if scores is not None:
+            o["score"] = scores[pos]
+        yield o
+
+
+def _platform_book(platform, platform_code, asset, fiat, trade_type, country, use_cache: bool) -> SnapshotBook:
+    """Carnet trié d'une plateforme : OffersSnapshot si USE_REFRESH_AS_SOURCE, sinon plateforme (cache + fallback)."""
+    code = platform.code
+    if getattr(settings, "USE_REFRESH_AS_SOURCE", False):
+        book = get_book(code, fiat, trade_type, country)
+        logger.debug("fetch_offers: snapshot %s %s %s %s → %s offres", code, fiat, country or "all", trade_type, len(book))
+        return book
+    if not use_cache:
+        return SnapshotBook.from_offers(
+            _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country), trade_type
+        )
+    # Cache partagé : (marque, offres brutes) ; carnet trié et indexé une fois par process et par marque
+    book_key = (code, asset, fiat, trade_type, country or "")
+    cache_key = f"{CACHE_OFFERS_PREFIX}:{code}:{asset}:{fiat}:{trade_type}:{country or 'all'}"
+    cached = cache.get(cache_key)
+    if isinstance(cached, tuple) and len(cached) == 2:
+        logger.debug("fetch_offers: cache hit %s %s %s %s", code, fiat, country or "all", trade_type)
+        stamp, offers = cached
+        return get_live_book(book_key, stamp, offers, trade_type)
+    offers = _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country)
+    stamp = uuid.uuid4().hex
+    cache.set(cache_key, (stamp, offers), CACHE_TTL)
+    return get_live_book(book_key, stamp, offers, trade_type)
+
+
+def _book_positions(
+    book: SnapshotBook,
+    amount: Optional[float],
+    amount_unit: str,
+    payment_methods: Optional[List[str]] = None,
+    payment_match: str = "any",
+    quality: Optional[Dict[str, Any]] = None,
+    order: str = "price",
+) -> Optional[Iterable[int]]:
+    """
+    Positions retenues par les index du carnet, dans l'ordre de sortie (None = tout le carnet, ordre des prix).
+    order="price" : positions croissantes ; order="score" : ordre du classement composite précalculé.
+    """
+    bits = None
+    if payment_methods:
+        bits = book.payment_bits(payment_methods, payment_match)
+    if quality:
+        quality_bits = book.quality_bits(**quality)
+        if quality_bits is not None:
+            bits = quality_bits if bits is None else bits & quality_bits
+    if order == "score":
+        positions: Iterable[int] = book.scores()["order"]
+        if bits is not None:
+            positions = (pos for pos in positions if (bits >> pos) & 1)
+        if amount is not None:
+            offers = book.offers
+            positions = (pos for pos in positions if _bounds_contain(offer_bounds(offers[pos], amount_unit), amount))
+        return positions
+    if amount is None:
+        return None if bits is None else iter_bits(bits)
+    if bits is None:
+        return book.positions_accepting(amount, amount_unit)
+    return (pos for pos in book.positions_accepting(amount, amount_unit) if (bits >> pos) & 1)
+
+
+def _bounds_contain(bounds, amount: float) -> bool:
+    return bounds[0] <= amount <= bounds[1]
+
+
+def _offer_predicate(liquidity: Callable[[Dict], bool], quality: Optional[Dict[str, Any]] = None) -> Callable[[Dict], bool]:
+    """Filtre liquidité + vérification exacte des filtres annonceur (quality)."""
+    check_quality = quality_predicate(**quality) if quality else None
+    return liquidity if check_quality is None else (lambda o: liquidity(o) and check_quality(o))
+
+
+def _ranked_book(
+    book: SnapshotBook,
+    fiat: str,
+    trade_type: str,
+    country: Optional[str],
+    accept: Callable[[Dict], bool],
+    amount: Optional[float] = None,
+    amount_unit: str = "fiat",
+    payment_methods: Optional[List[str]] = None,
+    payment_match: str = "any",
+    quality: Optional[Dict[str, Any]] = None,
+    order: str = "price",
+    rules: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Offres d'un carnet avec les filtres d'iter_offers (index du carnet puis accept), dans l'ordre demandé."""
+    positions = _book_positions(book, amount, amount_unit, payment_methods, payment_match, quality, order)
+    scores = book.scores()["values"] if order == "score" else None
+    return _ranked_offers(book, fiat, trade_type, country, accept, positions, scores, rules)
+
+
+def get_aggregation_platforms(platform_codes: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Plateformes du mode agrégé → poids. platform_codes None/vide = toutes les plateformes chargées.
+    Exclues : options aggregation.excluded (PlatformConfig.config) ou PlatformConfig inactive.
+    """
+    from core.models import PlatformConfig
+    available = get_all_platforms()
+    codes = [c for c in (platform_codes or available) if c in available]
+    inactive = set(PlatformConfig.objects.filter(code__in=codes, active=False).values_list("code", flat=True))
+    out = {}
+    for code in codes:
+        agg = get_platform_options(code).get("aggregation") or {}
+        if code in inactive or agg.get("excluded"):
+            continue
+        try:
+            weight = float(agg.get("weight", 1.0))
+        except (TypeError, ValueError):
+            weight = 1.0
+        if weight > 0:
+            out[code] = weight
     return out
 
 
-def fetch_offers(
+def iter_offers(
     asset: str = "USDT",
     fiat: str = "XOF",
     trade_type: str = "SELL",
     country: Optional[str] = None,
     platform_code: Optional[str] = None,
     use_cache: bool = True,
-) -> List[Dict[str, Any]]:
-    """Récupère les offres : si USE_REFRESH_AS_SOURCE, lit OffersSnapshot ; sinon plateforme (et cache). Puis filtre liquidité + ajustement."""
-    init_platforms()
-    platform = get_platform(platform_code or "") or get_default_platform()
-    if not platform:
-        logger.warning("fetch_offers: aucune plateforme (code=%s)", platform_code or "default")
-        return []
-    code = platform.code
+    platforms: Optional[Iterable[str]] = None,
+    amount: Optional[float] = None,
+    amount_unit: str = "fiat",
+    payment_methods: Optional[List[str]] = None,
+    payment_match: str = "any",
+    quality: Optional[Dict[str, Any]] = None,
+    order: str = "price",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Offres filtrées (liquidité) et ajustées, meilleure d'abord, produites à la demande (islice pour un top-K).
 
-    use_refresh = getattr(settings, "USE_REFRESH_AS_SOURCE", False)
-    if use_refresh:
-        offers = get_offers_from_snapshot(code, fiat, trade_type, country)
-        logger.debug("fetch_offers: snapshot %s %s %s %s → %s offres", code, fiat, country or "all", trade_type, len(offers))
+    platforms=None : une plateforme (platform_code ou défaut, les autres en fallback).
+    platforms=[...] ou [] (= toutes) : mode agrégé, fusion k-voies (heapq.merge) des carnets déjà triés
+    de chaque plateforme, sans fallback. Le poids de la plateforme (aggregation.weight) ne sert qu'au
+    classement : prix / poids en BUY, prix × poids en SELL ; adjusted_price reste le prix réel.
+    amount : seulement les offres dont [min, max] (amount_unit = "fiat" ou "usdt") contient ce montant,
+    trouvées par l'arbre d'intervalles du carnet.
+    payment_methods : identifiants de moyens de paiement, payment_match "any" (OU) ou "all" (ET), via les
+    bitsets du carnet ; combinables avec amount et le filtre liquidité, ordre des prix conservé.
+    quality : filtres annonceur {min_finish_rate, min_orders, merchant_only} (bitsets par palier du carnet
+    puis vérification exacte). order="score" : classement composite prix / fiabilité précalculé au refresh,
+    chaque offre porte son score ; en mode agrégé la fusion se fait sur score × poids.
+    """
+    accept = _offer_predicate(_liquidity_predicate(trade_type), quality)
+
+    def ranked(book: SnapshotBook) -> Iterator[Dict[str, Any]]:
+        return _ranked_book(book, fiat, trade_type, country, accept, amount, amount_unit, payment_methods, payment_match, quality, order)
+
+    if platforms is None:
+        platform = get_platform(platform_code or "") or get_default_platform()
+        if not platform:
+            logger.warning("fetch_offers: aucune plateforme (code=%s)", platform_code or "default")
+            return iter(())
+        book = _platform_book(platform, platform_code, asset, fiat, trade_type, country, use_cache)
+        return ranked(book)
+
+    weights = get_aggregation_platforms(platforms)
+    streams = []
+    for code, weight in weights.items():
+        book = _platform_book(get_platform(code), code, asset, fiat, trade_type, country, use_cache)
+        if len(book):
+            streams.append(zip(ranked(book), repeat(weight)))
+    logger.debug("fetch_offers: agrégé %s %s %s — plateformes=%s", fiat, country or "all", trade_type, list(weights))
+    if order == "score":
+        merged = heapq.merge(*streams, key=lambda t: -t[0]["score"] * t[1])
+    elif trade_type == "SELL":
+        merged = heapq.merge(*streams, key=lambda t: -t[0]["adjusted_price"] * t[1])
     else:
-        cache_key = f"{CACHE_OFFERS_PREFIX}:{code}:{asset}:{fiat}:{trade_type}:{country or 'all'}"
-        if use_cache:
-            cached = cache.get(cache_key)
-            if cached is not None:
-                logger.debug("fetch_offers: cache hit %s %s %s %s", code, fiat, country or "all", trade_type)
-                offers = cached
-            else:
-                offers = _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country)
-                cache.set(cache_key, offers, CACHE_TTL)
-        else:
-            offers = _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country)
-    before_liquidity = len(offers)
-    offers = filter_by_liquidity(offers, trade_type)
-    logger.debug(
-        "fetch_offers: %s %s %s %s — brut=%s, après liquidité=%s",
-        code, fiat, country or "all", trade_type, before_liquidity, len(offers),
-    )
-    for o in offers:
-        raw_price = o.get("price") or 0
-        o["adjusted_price"] = apply_majoration(
-            raw_price, fiat, trade_type, o.get("country") or country or ""
-        )
-    # Meilleure offre en premier : BUY = prix le plus bas, SELL = prix le plus haut
-    def _price(o):
-        return float(o.get("adjusted_price") or o.get("price") or 0)
-    offers.sort(key=_price, reverse=(trade_type == "SELL"))
+        merged = heapq.merge(*streams, key=lambda t: t[0]["adjusted_price"] / t[1])
+    return (o for o, _ in merged)
+
+
+def fetch_offers(
+    asset: str = "USDT",
+    fiat: str = "XOF",
+    trade_type: str = "SELL",
+    country: Optional[str] = None,
+    platform_code: Optional[str] = None,
+    use_cache: bool = True,
+    platforms: Optional[Iterable[str]] = None,
+    amount: Optional[float] = None,
+    amount_unit: str = "fiat",
+    payment_methods: Optional[List[str]] = None,
+    payment_match: str = "any",
+    quality: Optional[Dict[str, Any]] = None,
+    order: str = "price",
+) -> List[Dict[str, Any]]:
+    """Récupère les offres : si USE_REFRESH_AS_SOURCE, lit OffersSnapshot ; sinon plateforme (et cache). Puis filtre liquidité + ajustement. Voir iter_offers (platforms = mode agrégé, amount, payment_methods, quality, order)."""
+    offers = list(iter_offers(
+        asset, fiat, trade_type, country, platform_code, use_cache, platforms, amount, amount_unit, payment_methods, payment_match,
+        quality, order,
+    ))
+    logger.debug("fetch_offers: %s %s %s → %s offres après liquidité", fiat, country or "all", trade_type, len(offers))
     return offers
 
 
+def resolve_reference_offers(
+    references: Iterable[str],
+    fiat: Optional[str] = None,
+    trade_type: Optional[str] = None,
+    country: Optional[str] = "",
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    reference annonceur → offres de la plateforme par défaut (liquidité + ajustement), via l'index OfferReference.
+    Pour chaque carnet : offres de la reference dans l'ordre des prix. Reference absente de l'index = absente
+    du résultat, sans décoder aucun carnet. fiat / trade_type None = tous ; country None = tous les snapshots.
+    """
+    platform = get_default_platform()
+    if not platform:
+        return {}
+    refs = list(dict.fromkeys(str(r) for r in references if r))
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    accepts: Dict[str, Callable[[Dict], bool]] = {}
+    for ref, hits in resolve_references(refs, platform.code, fiat, trade_type, country).items():
+        for book, meta, positions in hits:
+            accept = accepts.get(meta["trade_type"])
+            if accept is None:
+                accept = accepts[meta["trade_type"]] = _liquidity_predicate(meta["trade_type"])
+            for o in _ranked_offers(book, meta["fiat"], meta["trade_type"], meta["country"] or None, accept, positions):
+                o.setdefault("fiat", meta["fiat"])
+                o.setdefault("trade_type", meta["trade_type"])
+                o.setdefault("country", meta["country"] or None)
+                out.setdefault(ref, []).append(o)
+    return out
+
+
 def _fetch_offers_with_fallback(
-    platform, platform_code, asset, fiat, trade_type, country
+    platform, platform_code, asset, fiat, trade_type, country, strict: bool = False
 ) -> List[Dict[str, Any]]:
-    """Appelle la plateforme ; en cas d'échec, essaie les autres (fallback)."""
-    from platforms.registry import get_all_platforms
+    """
+    Appelle la plateforme ; en cas d'échec, essaie les autres (fallback).
+    strict=True : si toutes échouent, relève la dernière erreur au lieu de retourner [] (refresh :
+    ne pas écraser un snapshot avec un carnet vide parce que la plateforme nous a limités).
+    """
+    from platforms.base import LocalBudgetExhausted, PlatformUnavailable
+    from platforms.circuit import get_circuit_breaker
+    from platforms.health import is_platform_available
     to_try = [platform]
     if not platform_code:
         for code, p in get_all_platforms().items():
             if p is not platform:
                 to_try.append(p)
+        # Santé lue en cache (sonde probe_platforms) : plateformes connues KO en dernier, sans appel réseau
+        to_try.sort(key=lambda p: not is_platform_available(p.code))
+    last_error = None
     for p in to_try:
+        breaker = get_circuit_breaker(p.code)
+        if not breaker.allow_request():
+            logger.info("fetch_offers: %s ignorée (circuit %s)", p.code, breaker.state())
+            last_error = PlatformUnavailable(p.code, f"circuit {breaker.state()}")
+            continue
         try:
             logger.debug("fetch_offers: appel plateforme %s fiat=%s country=%s trade_type=%s", p.code, fiat, country or "all", trade_type)
             offers = p.fetch_offers(asset=asset, fiat=fiat, trade_type=trade_type, country=country)
+            breaker.record_success()
             if offers is not None:
                 logger.info("fetch_offers: %s → %s offres", p.code, len(offers or []))
                 return offers or []
+        except LocalBudgetExhausted as e:
+            # Notre budget, pas la plateforme : pas d'échec pour le circuit (sonde half_open rendue)
+            breaker.release_probe()
+            logger.warning("fetch_offers: %s non appelée — %s", p.code, e)
+            last_error = e
+            continue
         except Exception as e:
+            # Seules les erreurs transitoires de la plateforme (5xx, timeout, 429/418) comptent pour le circuit
+            if getattr(e, "retryable", False):
+                breaker.record_failure()
             logger.warning("fetch_offers: %s a échoué — %s", p.code, e)
+            last_error = e
             continue
     logger.warning("fetch_offers: toutes les plateformes ont échoué (fiat=%s %s)", fiat, trade_type)
+    if strict and last_error is not None:
+        raise last_error
     return []
 
 
@@ -157,11 +406,12 @@ def fetch_offers_raw(
     country: Optional[str] = None,
     platform_code: Optional[str] = None,
     use_cache: bool = False,
+    strict: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Récupère les offres brutes (plateforme uniquement).
     N'applique ni la config liquidité ni les ajustements de taux.
-    Utilisé par le refresh périodique (best rates).
+    Utilisé par le refresh périodique (best rates) avec strict=True : un échec lève une exception.
     """
     init_platforms()
     platform = get_platform(platform_code or "") or get_default_platform()
@@ -173,7 +423,7 @@ def fetch_offers_raw(
         cached = cache.get(cache_key)
         if cached is not None:
             return cached
-    offers = _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country)
+    offers = _fetch_offers_with_fallback(platform, platform_code, asset, fiat, trade_type, country, strict=strict)
     if use_cache and cache_key and offers:
         cache.set(cache_key, offers, CACHE_TTL)
     return offers
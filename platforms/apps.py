@@ -6,6 +6,5 @@ class PlatformsConfig(AppConfig):
     name = "platforms"
     verbose_name = "Plateformes P2P"
 
-    def ready(self):
-        from .registry import init_platforms
-        init_platforms()
+    # Pas d'init au démarrage : les adaptateurs (settings.P2P_PLATFORM_ADAPTERS) sont importés
+    # au premier get_platform() / init_platforms(), pour ne charger que ceux réellement utilisés.
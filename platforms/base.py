@@ -2,6 +2,37 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
 
+class PlatformError(Exception):
+    """Échec d'appel à une plateforme (réseau, HTTP, réponse invalide). Distinct d'une page vide."""
+
+    retryable = False
+
+    def __init__(self, code: str, message: str = ""):
+        self.code = code
+        super().__init__(f"{code}: {message}" if message else code)
+
+
+class PlatformUnavailable(PlatformError):
+    """Erreur transitoire (timeout, 5xx) : la requête peut être rejouée."""
+
+    retryable = True
+
+
+class PlatformThrottled(PlatformUnavailable):
+    """La plateforme limite nos appels (HTTP 429/418). retry_after en secondes si fourni."""
+
+    def __init__(self, code: str, retry_after: Optional[float] = None, message: str = ""):
+        self.retry_after = retry_after
+        super().__init__(code, message or f"limitation de débit (retry_after={retry_after})")
+
+
+class LocalBudgetExhausted(PlatformThrottled):
+    """
+    Notre propre budget partagé (platforms.ratelimit) est épuisé : aucun appel n'est parti.
+    Ni panne ni limitation de la plateforme : ne compte pas pour le disjoncteur ni pour la santé.
+    """
+
+
 class BaseP2PPlatform(ABC):
     """Interface pour toute plateforme P2P (Binance, Paxful, OKX, etc.)."""
 
@@ -18,7 +49,7 @@ class BaseP2PPlatform(ABC):
         page: int = 1,
         rows: int = 20,
     ) -> List[Dict[str, Any]]:
-        """Récupère les offres (BUY ou SELL) pour asset/fiat."""
+        """Récupère les offres (BUY ou SELL) pour asset/fiat. Lève PlatformError si l'appel échoue."""
         pass
 
     @abstractmethod
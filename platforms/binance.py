@@ -1,7 +1,8 @@
 import logging
-import requests
 from typing import List, Dict, Any, Optional
-from .base import BaseP2PPlatform
+from .base import PlatformError
+from .http import platform_post
+from .paginated import PaginatedHTTPPlatform
 
 logger = logging.getLogger(__name__)
 
@@ -56,8 +57,7 @@ def fetch_binance_p2p_raw(
 ) -> Dict[str, Any]:
     """Appel direct à l'API Binance P2P ; retourne la réponse JSON brute (une page)."""
     payload = _binance_search_payload(asset, fiat, trade_type, page, rows, country=country)
-    r = requests.post(BINANCE_P2P_SEARCH_URL, json=payload, timeout=15)
-    r.raise_for_status()
+    r = platform_post(BinanceP2PPlatform.code, BINANCE_P2P_SEARCH_URL, payload, timeout=15)
     return r.json()
 
 
@@ -79,12 +79,8 @@ def fetch_binance_p2p_raw_all_pages(
     code = "000000"
     while page <= 100:
         payload = _binance_search_payload(asset, fiat, trade_type, page, page_size, country=country)
-        try:
-            r = requests.post(BINANCE_P2P_SEARCH_URL, json=payload, timeout=15)
-            r.raise_for_status()
-            data = r.json()
-        except Exception:
-            break
+        # Erreurs (429, 5xx, timeout après rejeu) : remontées, pas de liste tronquée silencieusement
+        data = platform_post(BinanceP2PPlatform.code, BINANCE_P2P_SEARCH_URL, payload, timeout=15).json()
         code = data.get("code", "")
         if code != "000000":
             break
@@ -116,158 +112,89 @@ def fetch_binance_p2p_raw_all_pages(
     }
 
 
-class BinanceP2PPlatform(BaseP2PPlatform):
+class BinanceP2PPlatform(PaginatedHTTPPlatform):
     code = "binance"
     name = "Binance P2P"
+    search_url = BINANCE_P2P_SEARCH_URL
+    page_size = 20
+    max_pages = 100
+    items_key = "data"
+    probe_fiat = "XOF"
 
-    def fetch_offers(
-        self,
-        asset: str = "USDT",
-        fiat: str = "XOF",
-        trade_type: str = "SELL",
-        country: Optional[str] = None,
-        page: int = 1,
-        rows: int = 20,
-        fetch_all_pages: bool = True,
-    ) -> List[Dict[str, Any]]:
-        """
-        fetch_all_pages=True (défaut) : récupère toutes les pages (pagination) pour
-        avoir l’ensemble des offres avant tri → vrais meilleurs taux.
-        fetch_all_pages=False : un seul appel (page, rows) pour usage paginé côté API.
-        """
-        if not fetch_all_pages:
-            return self._fetch_offers_page(asset, fiat, trade_type, country, page, rows)
-        # Récupérer toutes les pages pour calculer les vrais meilleurs taux
-        country_label = country or "all"
-        logger.info("Binance: démarrage fetch fiat=%s country=%s trade_type=%s", fiat, country_label, trade_type)
-        all_adv = []
-        all_advertisers = {}
-        p = 1
-        page_size = min(rows, 20)
-        max_pages = 100
-        while p <= max_pages:
-            adv_list, advertisers, total = self._fetch_offers_page_raw(
-                asset, fiat, trade_type, country, p, page_size
-            )
-            logger.debug("Binance: page %s → %s annonces (total API=%s)", p, len(adv_list), total)
-            all_adv.extend(adv_list)
-            all_advertisers.update(advertisers)
-            if not adv_list or len(adv_list) < page_size or len(all_adv) >= (total or 0):
-                break
-            p += 1
-        result = self._normalize_offers(all_adv, all_advertisers)
-        logger.info("Binance: fiat=%s country=%s trade_type=%s → %s offres (%s pages)", fiat, country_label, trade_type, len(result), p)
-        return result
-
-    def _fetch_offers_page(
-        self,
-        asset: str,
-        fiat: str,
-        trade_type: str,
-        country: Optional[str],
-        page: int,
-        rows: int,
-    ) -> List[Dict[str, Any]]:
-        adv_list, advertisers, _ = self._fetch_offers_page_raw(
-            asset, fiat, trade_type, country, page, rows
-        )
-        return self._normalize_offers(adv_list, advertisers)
+    def build_payload(self, asset, fiat, trade_type, country, page, rows):
+        return _binance_search_payload(asset, fiat, trade_type, page, rows, country=country)
 
-    def _fetch_offers_page_raw(
-        self,
-        asset: str,
-        fiat: str,
-        trade_type: str,
-        country: Optional[str],
-        page: int,
-        rows: int,
-    ) -> tuple:
-        """Une requête, retourne (liste adv, dict advertisers, total)."""
-        payload = _binance_search_payload(asset, fiat, trade_type, page, rows, country=country)
-        try:
-            r = requests.post(BINANCE_P2P_SEARCH_URL, json=payload, timeout=15)
-            r.raise_for_status()
-            data = r.json()
-            if data.get("code") != "000000":
-                logger.warning("Binance API: code=%s page=%s fiat=%s", data.get("code"), page, fiat)
-                return [], {}, 0
-            d = data.get("data") or {}
-            total = data.get("total") or 0
-            if isinstance(d, list):
-                adv_list = []
-                advertisers = {}
-                for item in d:
-                    if not isinstance(item, dict):
-                        continue
-                    adv = item.get("adv")
-                    ad = item.get("advertiser")
-                    if adv:
-                        if isinstance(ad, dict) and ad.get("userNo"):
-                            adv = {**adv, "advertiserNo": ad["userNo"]}
-                            advertisers[str(ad["userNo"])] = ad
-                        adv_list.append(adv)
-                return adv_list, advertisers, total
-            adv_list = d.get("adv") or []
-            advertisers = d.get("advertisers") or {}
-            return adv_list, advertisers, total
-        except Exception as e:
-            logger.warning("Binance API: erreur requête page=%s fiat=%s — %s", page, fiat, e)
-            return [], {}, 0
+    def check_response(self, fields):
+        """Code API ≠ 000000 : erreur (et non page vide), pour ne pas tronquer le carnet."""
+        if fields.get("code") != "000000":
+            logger.warning("Binance API: code=%s", fields.get("code"))
+            raise PlatformError(self.code, f"code={fields.get('code')}")
 
-    def _normalize_offers(self, adv_list: List, advertisers: dict) -> List[Dict[str, Any]]:
-        """Normalise les annonces Binance : min/max fiat uniquement (Binance: minSingleTransAmount, maxSingleTransAmount / dynamicMaxSingleTransAmount)."""
-        result = []
-        for adv in adv_list or []:
+    def parse_response(self, data):
+        d = data.get("data") or {}
+        total = data.get("total") or 0
+        if isinstance(d, list):
+            return d, total
+        # Ancien format {adv: [...], advertisers: {userNo: {...}}}
+        advertisers = d.get("advertisers") or {}
+        items = []
+        for adv in d.get("adv") or []:
             if not isinstance(adv, dict):
                 continue
-            adv_id = adv.get("adNo") or adv.get("advNo")
             user = advertisers.get(str(adv.get("advertiserNo") or adv.get("userId") or ""), {})
             if isinstance(user, list):
                 user = user[0] if user else {}
-            min_fiat = float(adv.get("minSingleTransAmount") or adv.get("minTradeAmount") or 0)
-            max_fiat = float(adv.get("dynamicMaxSingleTransAmount") or adv.get("maxSingleTransAmount") or adv.get("maxTradeAmount") or 0)
-            min_usdt = float(adv.get("minSingleTransQuantity") or 0)
-            max_usdt = float(adv.get("dynamicMaxSingleTransQuantity") or adv.get("maxSingleTransQuantity") or 0)
-            price = float(adv.get("price") or 0)
-            trade_methods = adv.get("tradeMethods") or []
-            if trade_methods and isinstance(trade_methods[0], dict):
-                payment_methods = [
-                    {"identifier": m.get("identifier") or m.get("payType"), "name": m.get("tradeMethodName") or m.get("identifier") or ""}
-                    for m in trade_methods
-                ]
-            else:
-                payment_methods = [{"identifier": str(x), "name": str(x)} for x in trade_methods] if trade_methods else []
-            result.append({
-                "platform": self.code,
-                "offer_id": str(adv_id or ""),
-                "trade_type": adv.get("tradeType") or "SELL",
-                "price": price,
-                "min_fiat": min_fiat,
-                "max_fiat": max_fiat,
-                "min_usdt": min_usdt,
-                "max_usdt": max_usdt,
-                "advertiser": {
-                    "user_no": user.get("userNo"),
-                    "nick_name": user.get("nickName"),
-                    "month_order_count": user.get("monthOrderCount"),
-                    "month_finish_rate": user.get("monthFinishRate"),
-                    "positive_rate": user.get("positiveRate"),
-                    "user_type": user.get("userType"),
-                    "user_grade": user.get("userGrade"),
-                },
-                "payment_methods": payment_methods,
-                "merchant": bool(adv.get("merchant") or user.get("isMerchant")),
-                "raw": adv,
-            })
-        return result
-
-    def is_available(self) -> bool:
-        try:
-            r = requests.post(
-                BINANCE_P2P_SEARCH_URL,
-                json={"asset": "USDT", "fiat": "XOF", "tradeType": "SELL", "rows": 1, "page": 1},
-                timeout=5,
-            )
-            return r.status_code == 200 and r.json().get("code") == "000000"
-        except Exception:
-            return False
+            items.append({"adv": adv, "advertiser": user})
+        return items, total
+
+    def normalize_item(self, item):
+        """Élément {adv, advertiser} de la recherche Binance → offre normalisée."""
+        if not isinstance(item, dict):
+            return None
+        adv = item.get("adv")
+        if not isinstance(adv, dict) or not adv:
+            return None
+        ad = item.get("advertiser")
+        user = ad if isinstance(ad, dict) else {}
+        if user.get("userNo"):
+            adv["advertiserNo"] = user["userNo"]
+        return self._normalize_offer(adv, user)
+
+    def _normalize_offer(self, adv: dict, user: dict) -> Dict[str, Any]:
+        """Une annonce Binance (adv + advertiser) → offre normalisée."""
+        adv_id = adv.get("adNo") or adv.get("advNo")
+        min_fiat = float(adv.get("minSingleTransAmount") or adv.get("minTradeAmount") or 0)
+        max_fiat = float(adv.get("dynamicMaxSingleTransAmount") or adv.get("maxSingleTransAmount") or adv.get("maxTradeAmount") or 0)
+        min_usdt = float(adv.get("minSingleTransQuantity") or 0)
+        max_usdt = float(adv.get("dynamicMaxSingleTransQuantity") or adv.get("maxSingleTransQuantity") or 0)
+        price = float(adv.get("price") or 0)
+        trade_methods = adv.get("tradeMethods") or []
+        if trade_methods and isinstance(trade_methods[0], dict):
+            payment_methods = [
+                {"identifier": m.get("identifier") or m.get("payType"), "name": m.get("tradeMethodName") or m.get("identifier") or ""}
+                for m in trade_methods
+            ]
+        else:
+            payment_methods = [{"identifier": str(x), "name": str(x)} for x in trade_methods] if trade_methods else []
+        return {
+            "platform": self.code,
+            "offer_id": str(adv_id or ""),
+            "trade_type": adv.get("tradeType") or "SELL",
+            "price": price,
+            "min_fiat": min_fiat,
+            "max_fiat": max_fiat,
+            "min_usdt": min_usdt,
+            "max_usdt": max_usdt,
+            "advertiser": {
+                "user_no": user.get("userNo"),
+                "nick_name": user.get("nickName"),
+                "month_order_count": user.get("monthOrderCount"),
+                "month_finish_rate": user.get("monthFinishRate"),
+                "positive_rate": user.get("positiveRate"),
+                "user_type": user.get("userType"),
+                "user_grade": user.get("userGrade"),
+            },
+            "payment_methods": payment_methods,
+            "merchant": bool(adv.get("merchant") or user.get("isMerchant")),
+            "raw": adv,
+        }
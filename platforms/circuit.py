@@ -0,0 +1,112 @@
+"""
+Disjoncteur (circuit breaker) par plateforme, état partagé entre workers via le cache.
+
+- closed    : appels normaux ; les échecs sont comptés sur une fenêtre glissante (`window` s).
+- open      : après `failure_threshold` échecs, la plateforme est ignorée pendant `reset_timeout` s
+              (le fallback passe directement à la suivante, sans attendre le timeout HTTP).
+- half_open : à l'échéance, un seul worker obtient le droit de sonder ; succès → closed, échec → open.
+Réglages : section "circuit" de P2P_PLATFORM_OPTIONS / PlatformConfig.config.
+"""
+import logging
+import time
+from typing import Dict
+
+from django.core.cache import cache
+
+from .options import get_platform_options
+
+logger = logging.getLogger(__name__)
+
+CACHE_CIRCUIT_PREFIX = "usdt_agg_circuit"
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, code: str):
+        self.code = code
+
+    def _key(self, name: str) -> str:
+        return f"{CACHE_CIRCUIT_PREFIX}:{self.code}:{name}"
+
+    def _options(self) -> dict:
+        return get_platform_options(self.code).get("circuit") or {}
+
+    def enabled(self) -> bool:
+        return bool(self._options().get("enabled", True))
+
+    def state(self) -> str:
+        opened_until = cache.get(self._key("opened_until"))
+        if opened_until is None:
+            return STATE_CLOSED
+        if time.time() < float(opened_until):
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """True si l'appel peut partir. En half_open, un seul worker à la fois obtient la sonde."""
+        if not self.enabled():
+            return True
+        state = self.state()
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_OPEN:
+            return False
+        probe_timeout = int(self._options().get("probe_timeout", 30))
+        return cache.add(self._key("probe"), 1, probe_timeout)
+
+    def release_probe(self) -> None:
+        """Rend le droit de sonde half_open sans résultat (appel jamais parti : budget local épuisé)."""
+        cache.delete(self._key("probe"))
+
+    def record_success(self) -> None:
+        if self.state() != STATE_CLOSED:
+            logger.info("circuit %s: refermé", self.code)
+        cache.delete_many([self._key("opened_until"), self._key("failures"), self._key("probe")])
+
+    def record_failure(self) -> None:
+        if not self.enabled():
+            return
+        opts = self._options()
+        if self.state() == STATE_HALF_OPEN:
+            self._open(opts)
+            return
+        key = self._key("failures")
+        try:
+            failures = cache.incr(key)
+        except ValueError:
+            if cache.add(key, 1, int(opts.get("window", 60))):
+                failures = 1
+            else:
+                failures = cache.incr(key)
+        if failures >= int(opts.get("failure_threshold", 5)):
+            self._open(opts)
+
+    def _open(self, opts: dict) -> None:
+        reset_timeout = float(opts.get("reset_timeout", 30))
+        # Conserver la clé après l'échéance pour passer en half_open (et non en closed)
+        cache.set(self._key("opened_until"), time.time() + reset_timeout, int(reset_timeout) + 3600)
+        cache.delete_many([self._key("failures"), self._key("probe")])
+        logger.warning("circuit %s: ouvert pour %.0f s", self.code, reset_timeout)
+
+    def snapshot(self) -> dict:
+        """État pour affichage (dashboard)."""
+        opened_until = cache.get(self._key("opened_until"))
+        return {
+            "state": self.state(),
+            "failures": int(cache.get(self._key("failures")) or 0),
+            "retry_in": max(0, int(float(opened_until) - time.time())) if opened_until else 0,
+            "enabled": self.enabled(),
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(code: str) -> CircuitBreaker:
+    breaker = _breakers.get(code)
+    if breaker is None:
+        breaker = _breakers[code] = CircuitBreaker(code)
+    return breaker
@@ -0,0 +1,105 @@
+"""
+Santé des plateformes : sondage périodique (commande probe_platforms) et lecture depuis le cache.
+
+Le sondeur appelle is_available() hors requête utilisateur et enregistre latence + succès. Il passe par le
+disjoncteur (platforms.circuit) : circuit ouvert → pas d'appel, sonde en échec ; en half_open la sonde sert
+d'essai et son résultat referme ou rouvre le circuit.
+Budget local épuisé (LocalBudgetExhausted, aucun appel parti) : plateforme non sondée, ni échec pour le
+disjoncteur ni échantillon dans l'historique ; le résumé précédent est retourné avec skipped=True.
+Le dashboard, le fallback et l'endpoint /health/ ne lisent que le cache : jamais d'appel réseau.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .base import LocalBudgetExhausted
+from .circuit import get_circuit_breaker
+from .registry import get_all_platforms, init_platforms
+
+logger = logging.getLogger(__name__)
+
+CACHE_HEALTH_PREFIX = "usdt_agg_health"
+HISTORY_SIZE = 50
+HEALTH_TTL = 24 * 3600
+
+
+def _key(code: str, name: str) -> str:
+    return f"{CACHE_HEALTH_PREFIX}:{code}:{name}"
+
+
+def probe_platform(platform) -> Dict[str, Any]:
+    """Appelle is_available() et enregistre le résultat (historique borné + résumé) dans le cache."""
+    breaker = get_circuit_breaker(platform.code)
+    started = time.monotonic()
+    previous = cache.get(_key(platform.code, "summary")) or {}
+    if not breaker.allow_request():
+        ok = False
+    else:
+        try:
+            ok = bool(platform.is_available())
+        except LocalBudgetExhausted as e:
+            breaker.release_probe()
+            logger.info("health %s: non sondée — %s", platform.code, e)
+            return {**previous, "code": platform.code, "skipped": True}
+        except Exception as e:
+            logger.warning("health %s: sonde en erreur — %s", platform.code, e)
+            ok = False
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    latency_ms = round((time.monotonic() - started) * 1000, 1)
+    now = time.time()
+    history: List[dict] = cache.get(_key(platform.code, "history")) or []
+    history.append({"at": now, "ok": ok, "latency_ms": latency_ms})
+    history = history[-HISTORY_SIZE:]
+    ok_samples = [h for h in history if h["ok"]]
+    summary = {
+        "code": platform.code,
+        "available": ok,
+        "last_probe_at": now,
+        "last_ok_at": now if ok else previous.get("last_ok_at"),
+        "latency_ms": latency_ms,
+        "avg_latency_ms": round(sum(h["latency_ms"] for h in ok_samples) / len(ok_samples), 1) if ok_samples else None,
+        "success_rate": round(len(ok_samples) / len(history), 3),
+        "samples": len(history),
+    }
+    cache.set_many({_key(platform.code, "history"): history, _key(platform.code, "summary"): summary}, HEALTH_TTL)
+    if ok != previous.get("available", ok):
+        logger.warning("health %s: disponibilité %s → %s", platform.code, previous.get("available"), ok)
+    return summary
+
+
+def probe_all() -> Dict[str, Dict[str, Any]]:
+    init_platforms()
+    return {code: probe_platform(p) for code, p in get_all_platforms().items()}
+
+
+def get_platform_health(code: str) -> Optional[Dict[str, Any]]:
+    """Dernier résumé connu, ou None si jamais sondée. stale=True si la sonde est trop ancienne."""
+    summary = cache.get(_key(code, "summary"))
+    if summary is None:
+        return None
+    max_age = getattr(settings, "PLATFORM_HEALTH_MAX_AGE", 300)
+    summary["stale"] = (time.time() - summary["last_probe_at"]) > max_age
+    return summary
+
+
+def get_platform_history(code: str) -> List[dict]:
+    return cache.get(_key(code, "history")) or []
+
+
+def is_platform_available(code: str) -> bool:
+    """Disponibilité lue dans le cache. Inconnue ou périmée = considérée disponible (pas de blocage)."""
+    health = get_platform_health(code)
+    if health is None or health["stale"]:
+        return True
+    return bool(health["available"])
+
+
+def get_all_health() -> Dict[str, Optional[Dict[str, Any]]]:
+    init_platforms()
+    return {code: get_platform_health(code) for code in get_all_platforms()}
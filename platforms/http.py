@@ -0,0 +1,235 @@
+"""
+Appels HTTP vers les plateformes : limiteur de débit, classification des erreurs, rejeu.
+
+- 429 / 418 → PlatformThrottled (Retry-After respecté, concurrence réduite)
+- 5xx / timeout / erreur réseau → PlatformUnavailable (concurrence réduite)
+- autre 4xx → PlatformError (non rejouée)
+Les erreurs rejouables sont retentées jusqu'à rate_limit.max_retries ; au-delà l'exception
+remonte à l'appelant : une page en échec n'est jamais confondue avec une page vide.
+
+Connexions : une requests.Session par (plateforme, thread) pour réutiliser les connexions HTTP.
+
+Requêtes couvertes (hedging, section "hedge" des options) : si une requête dépasse le
+percentile de latence observé (p95 par défaut), un doublon est envoyé et la première
+réponse gagne. Désactivé par défaut ; le doublon consomme lui aussi le budget de débit.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+import requests
+from django.db import connections
+
+from .base import PlatformError, PlatformThrottled, PlatformUnavailable
+from .options import get_platform_options
+from .ratelimit import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS = (418, 429)
+LATENCY_SAMPLES = 200
+
+T = TypeVar("T")
+
+_latencies: Dict[str, Deque[float]] = {}
+_latencies_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="p2p-hedge")
+_sessions = threading.local()
+
+
+def get_session(code: str) -> requests.Session:
+    """Session HTTP (pool de connexions keep-alive) propre à la plateforme et au thread courant."""
+    sessions = getattr(_sessions, "by_code", None)
+    if sessions is None:
+        sessions = _sessions.by_code = {}
+    session = sessions.get(code)
+    if session is None:
+        session = sessions[code] = requests.Session()
+    return session
+
+
+def record_latency(code: str, seconds: float) -> None:
+    with _latencies_lock:
+        samples = _latencies.get(code)
+        if samples is None:
+            samples = _latencies[code] = deque(maxlen=LATENCY_SAMPLES)
+        samples.append(seconds)
+
+
+def latency_percentile(code: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+    """Percentile des latences récentes (process courant) ; None si pas assez d'échantillons."""
+    with _latencies_lock:
+        samples = sorted(_latencies.get(code) or ())
+    if len(samples) < max(1, min_samples):
+        return None
+    idx = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After en secondes (entier) ou date HTTP ; None si absent/illisible."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_once(
+    code: str, method: str, url: str, payload: Dict[str, Any], timeout: float, stream: bool = False
+) -> requests.Response:
+    limiter = get_rate_limiter(code)
+    lease = limiter.acquire()
+    started = time.monotonic()
+    try:
+        if method == "GET":
+            r = get_session(code).get(url, params=payload, timeout=timeout, stream=stream)
+        else:
+            r = get_session(code).request(method, url, json=payload, timeout=timeout, stream=stream)
+    except requests.Timeout as e:
+        limiter.on_failure()
+        raise PlatformUnavailable(code, f"timeout ({e})") from e
+    except requests.RequestException as e:
+        limiter.on_failure()
+        raise PlatformUnavailable(code, f"erreur réseau ({e})") from e
+    finally:
+        limiter.release(lease)
+    if r.status_code in THROTTLE_STATUS:
+        retry_after = parse_retry_after(r.headers.get("Retry-After"))
+        limiter.on_throttle(retry_after)
+        raise PlatformThrottled(code, retry_after=retry_after)
+    if r.status_code >= 500:
+        limiter.on_failure()
+        raise PlatformUnavailable(code, f"HTTP {r.status_code}")
+    if r.status_code >= 400:
+        raise PlatformError(code, f"HTTP {r.status_code}")
+    limiter.on_success()
+    record_latency(code, time.monotonic() - started)
+    return r
+
+
+def run_in_thread(fn, *args, **kwargs):
+    """Exécute fn dans un thread de pool puis ferme les connexions BDD que ce thread a pu ouvrir (options)."""
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Connexions BDD ouvertes par ce thread (lecture des options) : ne pas les laisser fuir
+        connections.close_all()
+
+
+def _request_hedged(
+    code: str,
+    method: str,
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float,
+    stream: bool = False,
+    hedge: Optional[dict] = None,
+) -> requests.Response:
+    hedge = hedge or {}
+    delay = latency_percentile(code, float(hedge.get("percentile", 95)), int(hedge.get("min_samples", 20)))
+    if delay is None:
+        return _request_once(code, method, url, payload, timeout, stream)
+    args = (_request_once, code, method, url, payload, timeout, stream)
+    pending = {_hedge_executor.submit(run_in_thread, *args)}
+    done, _ = wait(pending, timeout=delay)
+    if not done:
+        logger.debug("%s: requête au-delà de %.2f s, envoi d'un doublon", code, delay)
+        pending.add(_hedge_executor.submit(run_in_thread, *args))
+    last_error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except PlatformError as e:
+                last_error = e
+                continue
+            for other in (done | pending) - {future}:
+                other.cancel()
+                other.add_done_callback(_close_loser)
+            return response
+    raise last_error
+
+
+def _close_loser(future) -> None:
+    """Requête doublée perdante : fermer sa réponse (en stream, la connexion est sinon retenue jusqu'au GC)."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def send_once(
+    code: str,
+    method: str,
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float = 15,
+    stream: bool = False,
+) -> requests.Response:
+    """Une tentative (doublée si hedge est activé), sans rejeu : voir with_retries / platform_request."""
+    hedge = get_platform_options(code).get("hedge") or {}
+    if hedge.get("enabled"):
+        return _request_hedged(code, method, url, payload, timeout, stream, hedge)
+    return _request_once(code, method, url, payload, timeout, stream)
+
+
+def with_retries(code: str, attempt: Callable[[], T]) -> T:
+    """
+    Exécute attempt() et la rejoue sur erreur transitoire (PlatformError.retryable), jusqu'à
+    rate_limit.max_retries fois, après Retry-After ou un backoff exponentiel borné par max_wait.
+    attempt() peut englober la lecture du corps (décodage streaming) : une coupure en cours de lecture
+    est rejouée comme un échec de la requête.
+    """
+    opts = get_platform_options(code).get("rate_limit") or {}
+    max_retries = int(opts.get("max_retries", 3))
+    max_wait = float(opts.get("max_wait", 30))
+    tries = 0
+    while True:
+        try:
+            return attempt()
+        except PlatformError as e:
+            if not e.retryable or tries >= max_retries:
+                raise
+            tries += 1
+            delay = getattr(e, "retry_after", None)
+            if delay is None:
+                delay = min(max_wait, 0.5 * (2 ** tries))
+            if delay > max_wait:
+                raise
+            logger.info("%s: nouvelle tentative %s/%s dans %.1f s — %s", code, tries, max_retries, delay, e)
+            time.sleep(delay)
+
+
+def platform_request(
+    code: str,
+    method: str,
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float = 15,
+    stream: bool = False,
+) -> requests.Response:
+    """
+    Requête vers la plateforme `code` en respectant son budget ; rejoue les erreurs transitoires.
+    POST : payload envoyé en JSON ; GET : payload envoyé en query string.
+    stream=True : corps non lu (r.iter_content), à fermer par l'appelant ; une erreur pendant la lecture
+    n'est pas rejouée ici (englober requête + lecture dans with_retries).
+    """
+    return with_retries(code, partial(send_once, code, method, url, payload, timeout, stream))
+
+
+def platform_post(
+    code: str, url: str, payload: Dict[str, Any], timeout: float = 15, stream: bool = False
+) -> requests.Response:
+    """POST JSON vers la plateforme `code` (voir platform_request)."""
+    return platform_request(code, "POST", url, payload, timeout=timeout, stream=stream)
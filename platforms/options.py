@@ -0,0 +1,47 @@
+"""
+Options de réglage par plateforme (rate limit, etc.).
+
+Valeurs par défaut : settings.P2P_PLATFORM_OPTIONS (une section par sujet).
+Surcharge par plateforme : PlatformConfig.config (même structure, ex. {"rate_limit": {"rate": 2}}).
+Résultat gardé en mémoire du process quelques secondes pour ne pas requêter la BDD à chaque page.
+"""
+import copy
+import time
+from typing import Any, Dict
+
+from django.conf import settings
+
+OPTIONS_TTL = 30
+
+_cache: Dict[str, tuple] = {}
+
+
+def _db_config(code: str) -> Dict[str, Any]:
+    try:
+        from core.models import PlatformConfig
+        conf = PlatformConfig.objects.filter(code=code).values_list("config", flat=True).first()
+        return conf if isinstance(conf, dict) else {}
+    except Exception:
+        return {}
+
+
+def get_platform_options(code: str) -> Dict[str, Dict[str, Any]]:
+    """Options fusionnées (défauts settings + PlatformConfig.config) pour la plateforme `code`."""
+    now = time.monotonic()
+    cached = _cache.get(code)
+    if cached and cached[0] > now:
+        return cached[1]
+    defaults = getattr(settings, "P2P_PLATFORM_OPTIONS", {})
+    overrides = _db_config(code)
+    options = copy.deepcopy(defaults)
+    for section, values in overrides.items():
+        if isinstance(values, dict) and isinstance(options.get(section), dict):
+            options[section].update(values)
+        else:
+            options[section] = values
+    _cache[code] = (now + OPTIONS_TTL, options)
+    return options
+
+
+def clear_platform_options_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,270 @@
+"""
+Base réutilisable pour les sources P2P paginées en HTTP.
+
+Une sous-classe déclare uniquement :
+- search_url (+ http_method, page_size, items_key si besoin) ;
+- build_payload() : corps (POST) ou query string (GET) d'une page ;
+- parse_response() / check_response() si la réponse n'est pas {items_key: [...], "total": n} ;
+- field_map : champ normalisé → chemin dans l'élément source ("a.b.c") ou fonction(item).
+
+Elle obtient : pagination concurrente (page 1 puis pages restantes en parallèle, bornée par la
+concurrence AIMD du limiteur), sessions HTTP poolées, limitation de débit / rejeu / disjoncteur
+(platforms.http), décodage streaming, dédoublonnage par offer_id, métriques et normalisation.
+"""
+import logging
+import math
+import threading
+import time
+from abc import abstractmethod
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import requests
+
+from .base import BaseP2PPlatform, LocalBudgetExhausted, PlatformError, PlatformUnavailable
+from .http import run_in_thread, send_once, with_retries
+from .options import get_platform_options
+from .ratelimit import get_rate_limiter
+from .streaming import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+FLOAT_FIELDS = ("price", "min_fiat", "max_fiat", "min_usdt", "max_usdt")
+ADVERTISER_FIELDS = (
+    "user_no", "nick_name", "month_order_count", "month_finish_rate",
+    "positive_rate", "user_type", "user_grade",
+)
+
+_metrics: Dict[str, Dict[str, Any]] = {}
+_metrics_lock = threading.Lock()
+
+
+def _record_metrics(code: str, **values) -> None:
+    with _metrics_lock:
+        m = _metrics.setdefault(code, {"fetches": 0, "pages": 0, "offers": 0, "errors": 0, "last_duration_ms": None})
+        for name, value in values.items():
+            if name == "last_duration_ms":
+                m[name] = value
+            else:
+                m[name] += value
+
+
+def get_platform_metrics() -> Dict[str, Dict[str, Any]]:
+    """Compteurs du process courant par plateforme (fetches, pages, offres, erreurs, durée du dernier fetch)."""
+    with _metrics_lock:
+        return {code: dict(m) for code, m in _metrics.items()}
+
+
+def _get_path(item: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(item, dict):
+            return None
+        item = item.get(part)
+    return item
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PaginatedHTTPPlatform(BaseP2PPlatform):
+    """Plateforme P2P paginée : voir le docstring du module pour ce que la sous-classe déclare."""
+
+    search_url: str = ""
+    http_method: str = "POST"
+    page_size: int = 20
+    max_pages: int = 100
+    timeout: float = 15
+    # Clé du tableau d'offres dans la réponse (décodage streaming et parse_response par défaut)
+    items_key: str = "data"
+    field_map: Dict[str, Union[str, Callable[[dict], Any]]] = {}
+    # Devise de la page d'une offre demandée par is_available (sonde de disponibilité)
+    probe_fiat: str = "USD"
+
+    @abstractmethod
+    def build_payload(
+        self, asset: str, fiat: str, trade_type: str, country: Optional[str], page: int, rows: int
+    ) -> Dict[str, Any]:
+        """Corps JSON (POST) ou paramètres (GET) pour une page."""
+
+    def parse_response(self, data: Dict[str, Any]) -> Tuple[List[Any], Optional[int]]:
+        """Réponse complète → (éléments bruts, total annoncé ou None)."""
+        items = data.get(self.items_key) or []
+        return (items if isinstance(items, list) else []), self.response_total(data)
+
+    def check_response(self, fields: Dict[str, Any]) -> None:
+        """Champs de premier niveau hors items : lever PlatformError si la plateforme signale une erreur."""
+
+    def response_total(self, fields: Dict[str, Any]) -> Optional[int]:
+        total = fields.get("total")
+        try:
+            return int(total) if total is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    # --- Normalisation ------------------------------------------------------
+    def _field(self, item: dict, name: str) -> Any:
+        spec = self.field_map.get(name)
+        if spec is None:
+            return None
+        if callable(spec):
+            return spec(item)
+        return _get_path(item, spec)
+
+    def normalize_item(self, item: Any) -> Optional[Dict[str, Any]]:
+        """Élément source → offre normalisée (même format que Binance). None = élément ignoré."""
+        if not isinstance(item, dict):
+            return None
+        offer = {
+            "platform": self.code,
+            "offer_id": str(self._field(item, "offer_id") or ""),
+            "trade_type": self._field(item, "trade_type") or "SELL",
+        }
+        for name in FLOAT_FIELDS:
+            offer[name] = _to_float(self._field(item, name))
+        offer["advertiser"] = {name: self._field(item, f"advertiser.{name}") for name in ADVERTISER_FIELDS}
+        methods = self._field(item, "payment_methods") or []
+        offer["payment_methods"] = [
+            {"identifier": m.get("identifier"), "name": m.get("name") or m.get("identifier") or ""}
+            if isinstance(m, dict) else {"identifier": str(m), "name": str(m)}
+            for m in methods
+        ]
+        offer["merchant"] = bool(self._field(item, "merchant"))
+        offer["raw"] = item
+        return offer
+
+    # --- Pages --------------------------------------------------------------
+    def _stream_decode(self) -> bool:
+        return bool((get_platform_options(self.code).get("http") or {}).get("stream_decode", True))
+
+    def fetch_page(
+        self, asset: str, fiat: str, trade_type: str, country: Optional[str], page: int, rows: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Une page → (offres normalisées, total annoncé). Lève PlatformError en cas d'échec.
+        Requête et lecture du corps rejouées ensemble (with_retries) : une coupure en cours de lecture est
+        retentée comme un 5xx.
+        """
+        payload = self.build_payload(asset, fiat, trade_type, country, page, rows)
+        return with_retries(self.code, partial(self._fetch_page_once, payload, page, fiat))
+
+    def _fetch_page_once(self, payload: Dict[str, Any], page: int, fiat: str) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        if not self._stream_decode():
+            r = send_once(self.code, self.http_method, self.search_url, payload, timeout=self.timeout)
+            try:
+                data = r.json()
+            except ValueError as e:
+                raise PlatformError(self.code, f"réponse invalide page={page} fiat={fiat}") from e
+            self.check_response(data)
+            items, total = self.parse_response(data)
+            return [o for o in map(self.normalize_item, items) if o is not None], total
+        chunk_size = int((get_platform_options(self.code).get("http") or {}).get("chunk_size", 8192))
+        fields: Dict[str, Any] = {}
+        offers = []
+        r = send_once(self.code, self.http_method, self.search_url, payload, timeout=self.timeout, stream=True)
+        with r:
+            try:
+                for item in iter_json_array(r.iter_content(chunk_size=chunk_size), self.items_key, fields):
+                    offer = self.normalize_item(item)
+                    if offer is not None:
+                        offers.append(offer)
+            except ValueError as e:
+                raise PlatformError(self.code, f"réponse invalide page={page} fiat={fiat}") from e
+            except requests.RequestException as e:
+                raise PlatformUnavailable(self.code, f"lecture interrompue page={page} fiat={fiat} ({e})") from e
+        self.check_response(fields)
+        if fields.get(self.items_key) is not None:
+            # Le tableau d'offres n'était pas au premier niveau : laisser parse_response l'extraire
+            items, _ = self.parse_response(fields)
+            offers.extend(o for o in map(self.normalize_item, items) if o is not None)
+        return offers, self.response_total(fields)
+
+    def fetch_offers(
+        self,
+        asset: str = "USDT",
+        fiat: str = "XOF",
+        trade_type: str = "SELL",
+        country: Optional[str] = None,
+        page: int = 1,
+        rows: int = 20,
+        fetch_all_pages: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        fetch_all_pages=True : page 1, puis les pages restantes (d'après le total annoncé) en parallèle ;
+        sans total, pages suivantes une à une jusqu'à une page incomplète.
+        fetch_all_pages=False : une seule page (page, rows).
+        """
+        if not fetch_all_pages:
+            return self.fetch_page(asset, fiat, trade_type, country, page, rows)[0]
+        started = time.monotonic()
+        page_size = min(rows, self.page_size)
+        pages_done = 1
+        try:
+            first, total = self.fetch_page(asset, fiat, trade_type, country, 1, page_size)
+            pages = [first]
+            if total is not None and len(first) >= page_size:
+                last_page = min(self.max_pages, int(math.ceil(total / float(page_size))))
+                pages.extend(self._fetch_pages_concurrently(asset, fiat, trade_type, country, range(2, last_page + 1), page_size))
+                pages_done = max(1, last_page)
+            elif total is None:
+                p = 2
+                while len(pages[-1]) >= page_size and p <= self.max_pages:
+                    pages.append(self.fetch_page(asset, fiat, trade_type, country, p, page_size)[0])
+                    p += 1
+                pages_done = p - 1
+        except PlatformError:
+            _record_metrics(self.code, fetches=1, errors=1)
+            raise
+        result = []
+        seen = set()
+        for page_offers in pages:
+            for o in page_offers:
+                # Le carnet bouge pendant la pagination : une offre peut apparaître sur deux pages
+                if o["offer_id"]:
+                    if o["offer_id"] in seen:
+                        continue
+                    seen.add(o["offer_id"])
+                result.append(o)
+        duration_ms = round((time.monotonic() - started) * 1000)
+        _record_metrics(self.code, fetches=1, pages=pages_done, offers=len(result), last_duration_ms=duration_ms)
+        logger.info(
+            "%s: fiat=%s country=%s trade_type=%s → %s offres (%s pages, %s ms)",
+            self.code, fiat, country or "all", trade_type, len(result), pages_done, duration_ms,
+        )
+        return result
+
+    def _fetch_pages_concurrently(self, asset, fiat, trade_type, country, page_numbers, page_size) -> List[List[Dict[str, Any]]]:
+        page_numbers = list(page_numbers)
+        if not page_numbers:
+            return []
+        workers = max(1, min(len(page_numbers), int(get_rate_limiter(self.code).concurrency_limit())))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"p2p-{self.code}")
+        futures = {
+            pool.submit(run_in_thread, self.fetch_page, asset, fiat, trade_type, country, p, page_size): i
+            for i, p in enumerate(page_numbers)
+        }
+        pages: List[List[Dict[str, Any]]] = [[] for _ in page_numbers]
+        try:
+            for future in as_completed(futures):
+                pages[futures[future]] = future.result()[0]
+        except BaseException:
+            # Première erreur : pages pas encore parties annulées (pas de carnet tronqué, budget préservé) ;
+            # les pages en cours se terminent sans être attendues
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return pages
+
+    def is_available(self) -> bool:
+        """Une page d'une offre. Budget local épuisé : LocalBudgetExhausted remonte (plateforme non sondée)."""
+        try:
+            self.fetch_page("USDT", self.probe_fiat, "SELL", None, 1, 1)
+            return True
+        except LocalBudgetExhausted:
+            raise
+        except Exception:
+            return False
@@ -0,0 +1,131 @@
+"""
+Limiteur de débit adaptatif par plateforme (partagé entre process via le cache).
+
+- Seau à jetons (core.ratelimit) : débit moyen `rate` req/s, rafale `burst`.
+- Concurrence AIMD : la limite de requêtes simultanées augmente doucement à chaque succès
+  (additive increase) et est multipliée par `decrease` sur 429, 5xx ou timeout. Requêtes en vol comptées
+  par baux expirants (core.ratelimit, INFLIGHT_TTL s) : un process tué ne bloque pas de créneau.
+- Retry-After : un 429 bloque la plateforme jusqu'à l'échéance annoncée, pour tous les process.
+
+Le refresh (cron) et le trafic API partagent donc un seul budget par plateforme.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from django.core.cache import cache
+
+from core.ratelimit import acquire_lease, consume, lease_count, release_lease
+from .base import LocalBudgetExhausted
+from .options import get_platform_options
+
+logger = logging.getLogger(__name__)
+
+CACHE_LIMITER_PREFIX = "usdt_agg_platform_rl"
+STATE_TTL = 3600
+INFLIGHT_TTL = 120
+
+
+class PlatformRateLimiter:
+    def __init__(self, code: str):
+        self.code = code
+
+    def _key(self, name: str) -> str:
+        return f"{CACHE_LIMITER_PREFIX}:{self.code}:{name}"
+
+    def _options(self) -> dict:
+        return get_platform_options(self.code).get("rate_limit") or {}
+
+    # --- Concurrence AIMD -------------------------------------------------
+    def concurrency_limit(self) -> float:
+        opts = self._options()
+        value = cache.get(self._key("limit"))
+        if value is None:
+            return float(opts.get("initial_concurrency", 2))
+        return float(value)
+
+    def _set_limit(self, value: float) -> None:
+        opts = self._options()
+        low = float(opts.get("min_concurrency", 1))
+        high = float(opts.get("max_concurrency", 8))
+        cache.set(self._key("limit"), max(low, min(high, value)), STATE_TTL)
+
+    def in_flight(self) -> int:
+        return lease_count(self._key("inflight"))
+
+    # --- Retry-After ------------------------------------------------------
+    def blocked_for(self) -> float:
+        until = cache.get(self._key("blocked_until"))
+        return max(0.0, float(until) - time.time()) if until else 0.0
+
+    # --- Cycle d'une requête ----------------------------------------------
+    def acquire(self, max_wait: Optional[float] = None) -> str:
+        """
+        Attend un créneau (Retry-After, concurrence, jeton) ; retourne le bail à rendre avec release().
+        Lève LocalBudgetExhausted si l'attente dépasse max_wait.
+        """
+        opts = self._options()
+        if max_wait is None:
+            max_wait = float(opts.get("max_wait", 30))
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.blocked_for()
+            if wait <= 0:
+                lease, _ = acquire_lease(self._key("inflight"), max(1, int(self.concurrency_limit())), INFLIGHT_TTL)
+                if lease:
+                    allowed, wait = consume(
+                        f"platform:{self.code}",
+                        float(opts.get("rate", 0) or 0),
+                        int(opts.get("burst", 0) or 0),
+                    )
+                    if allowed:
+                        return lease
+                    self.release(lease)
+                else:
+                    wait = 0.05
+            if time.monotonic() + wait > deadline:
+                raise LocalBudgetExhausted(self.code, retry_after=wait, message="budget local épuisé")
+            time.sleep(min(wait, 1.0))
+
+    def release(self, lease: Optional[str]) -> None:
+        release_lease(self._key("inflight"), lease)
+
+    @contextmanager
+    def slot(self, max_wait: Optional[float] = None):
+        lease = self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    def on_success(self) -> None:
+        opts = self._options()
+        limit = self.concurrency_limit()
+        self._set_limit(limit + float(opts.get("increase", 1)) / max(limit, 1.0))
+
+    def on_failure(self) -> None:
+        """5xx ou timeout : décroissance multiplicative."""
+        opts = self._options()
+        limit = self.concurrency_limit()
+        self._set_limit(limit * float(opts.get("decrease", 0.5)))
+        logger.info("rate_limit %s: échec → concurrence %.2f → %.2f", self.code, limit, self.concurrency_limit())
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """429 : décroissance multiplicative + blocage jusqu'à Retry-After (ou cooldown par défaut)."""
+        self.on_failure()
+        opts = self._options()
+        delay = retry_after if retry_after is not None else float(opts.get("default_cooldown", 2))
+        if delay > 0:
+            cache.set(self._key("blocked_until"), time.time() + delay, int(delay) + 1)
+        logger.warning("rate_limit %s: limité par la plateforme, pause %.1f s", self.code, delay)
+
+
+_limiters: Dict[str, PlatformRateLimiter] = {}
+
+
+def get_rate_limiter(code: str) -> PlatformRateLimiter:
+    limiter = _limiters.get(code)
+    if limiter is None:
+        limiter = _limiters[code] = PlatformRateLimiter(code)
+    return limiter
@@ -1,20 +1,51 @@
+import logging
+import threading
 from typing import Dict, Type, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
 from .base import BaseP2PPlatform
-from .binance import BinanceP2PPlatform
 
+logger = logging.getLogger(__name__)
 
 _platforms: Dict[str, BaseP2PPlatform] = {}
+_load_lock = threading.Lock()
 
 
 def register_platform(platform: BaseP2PPlatform) -> None:
     _platforms[platform.code] = platform
 
 
+def _adapter_paths() -> Dict[str, str]:
+    return dict(getattr(settings, "P2P_PLATFORM_ADAPTERS", {"binance": "platforms.binance.BinanceP2PPlatform"}))
+
+
+def _load_platform(code: str) -> Optional[BaseP2PPlatform]:
+    """Importe et instancie l'adaptateur déclaré dans settings.P2P_PLATFORM_ADAPTERS (une seule fois)."""
+    path = _adapter_paths().get(code)
+    if not path:
+        return None
+    with _load_lock:
+        if code in _platforms:
+            return _platforms[code]
+        try:
+            cls: Type[BaseP2PPlatform] = import_string(path)
+            platform = cls()
+        except Exception as e:
+            logger.error("Adaptateur P2P %s (%s) non chargé : %s", code, path, e)
+            return None
+        platform.code = code
+        register_platform(platform)
+        return platform
+
+
 def get_platform(code: str) -> Optional[BaseP2PPlatform]:
-    return _platforms.get(code)
+    return _platforms.get(code) or _load_platform(code)
 
 
 def get_all_platforms() -> Dict[str, BaseP2PPlatform]:
+    init_platforms()
     return dict(_platforms)
 
 
@@ -23,15 +54,16 @@ def get_default_platform() -> Optional[BaseP2PPlatform]:
     try:
         from core.models import PlatformConfig
         default = PlatformConfig.objects.filter(active=True, is_default=True).first()
-        if default and _platforms.get(default.code):
+        if default and get_platform(default.code):
             return _platforms[default.code]
     except Exception:
         pass
-    from django.conf import settings
     code = getattr(settings, "DEFAULT_P2P_PLATFORM", "binance")
-    return _platforms.get(code) or (_platforms.get("binance") if _platforms else None)
+    return get_platform(code) or get_platform("binance")
 
 
 def init_platforms():
-    if "binance" not in _platforms:
-        register_platform(BinanceP2PPlatform())
+    """Charge tous les adaptateurs déclarés (les imports n'ont lieu qu'ici ou au premier get_platform)."""
+    for code in _adapter_paths():
+        if code not in _platforms:
+            _load_platform(code)
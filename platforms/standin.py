@@ -0,0 +1,129 @@
+"""
+Plateforme de référence pour PaginatedHTTPPlatform + serveur local qui la simule.
+
+- StandinP2PPlatform : exemple minimal d'adaptateur (GET paginé, field_map déclaratif).
+- serve() / commande run_p2p_standin : serveur HTTP local qui génère des carnets déterministes
+  (même graine → mêmes offres), pour développer et tester sans dépendre d'une plateforme réelle.
+
+Activation : P2P_PLATFORM_ADAPTERS="standin=platforms.standin.StandinP2PPlatform" et
+P2P_STANDIN_URL (défaut http://127.0.0.1:8765/search).
+"""
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+
+from .paginated import PaginatedHTTPPlatform
+
+STANDIN_PAY_METHODS = ["MTNMobileMoney", "OrangeMoney", "Wave", "MoovMoney", "BankTransfer"]
+STANDIN_BASE_PRICES = {"XOF": 610.0, "XAF": 612.0, "GHS": 15.4, "NGN": 1580.0, "KES": 129.0, "USD": 1.0, "EUR": 0.93}
+
+
+class StandinP2PPlatform(PaginatedHTTPPlatform):
+    code = "standin"
+    name = "Stand-in P2P (local)"
+    http_method = "GET"
+    page_size = 50
+    items_key = "items"
+    field_map = {
+        "offer_id": "id",
+        "trade_type": "side",
+        "price": "price",
+        "min_fiat": "limits.min_fiat",
+        "max_fiat": "limits.max_fiat",
+        "min_usdt": "limits.min_asset",
+        "max_usdt": "limits.max_asset",
+        "advertiser.user_no": "maker.id",
+        "advertiser.nick_name": "maker.name",
+        "advertiser.month_order_count": "maker.orders_30d",
+        "advertiser.month_finish_rate": "maker.completion",
+        "advertiser.positive_rate": "maker.rating",
+        "advertiser.user_type": "maker.kind",
+        "payment_methods": "methods",
+        "merchant": "maker.verified",
+    }
+
+    @property
+    def search_url(self) -> str:
+        return getattr(settings, "P2P_STANDIN_URL", "http://127.0.0.1:8765/search")
+
+    def build_payload(self, asset, fiat, trade_type, country, page, rows):
+        params = {"asset": asset, "fiat": fiat, "side": trade_type, "page": page, "size": rows}
+        if country:
+            params["country"] = country
+        return params
+
+
+def generate_book(asset: str, fiat: str, side: str, country: str = "", size: Optional[int] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """Carnet déterministe pour (fiat, side, country), trié par meilleur prix pour le client."""
+    rng = random.Random(f"{seed}:{asset}:{fiat}:{side}:{country}")
+    base = STANDIN_BASE_PRICES.get(fiat, 100.0)
+    size = size if size is not None else rng.randint(40, 160)
+    items = []
+    for i in range(size):
+        price = round(base * (1 + rng.uniform(-0.03, 0.03)), 2)
+        max_fiat = round(rng.choice([50_000, 150_000, 500_000, 2_000_000]) * base / STANDIN_BASE_PRICES["XOF"], 2)
+        items.append({
+            "id": f"{fiat}-{side}-{country or 'all'}-{i}",
+            "side": side,
+            "price": str(price),
+            "limits": {
+                "min_fiat": str(round(max_fiat * rng.choice([0.01, 0.05, 0.1]), 2)),
+                "max_fiat": str(max_fiat),
+                "min_asset": None,
+                "max_asset": str(round(max_fiat / price, 2)),
+            },
+            "maker": {
+                "id": f"mk{rng.randint(1, 60)}",
+                "name": f"Maker {i}",
+                "orders_30d": rng.randint(0, 2000),
+                "completion": round(rng.uniform(0.7, 1.0), 4),
+                "rating": round(rng.uniform(0.8, 1.0), 4),
+                "kind": rng.choice(["user", "merchant"]),
+                "verified": rng.random() < 0.3,
+            },
+            "methods": rng.sample(STANDIN_PAY_METHODS, rng.randint(1, 3)),
+        })
+    items.sort(key=lambda x: float(x["price"]), reverse=(side == "SELL"))
+    return items
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """GET /search?asset=&fiat=&side=&country=&page=&size= → {"items": [...], "total": n}."""
+
+    seed = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/search":
+            self.send_error(404)
+            return
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            page = max(1, int(q.get("page", 1)))
+            size = min(200, max(1, int(q.get("size", 50))))
+        except ValueError:
+            self.send_error(400)
+            return
+        book = generate_book(q.get("asset", "USDT"), q.get("fiat", "XOF").upper(), q.get("side", "SELL").upper(), q.get("country", ""), seed=self.seed)
+        body = json.dumps({"items": book[(page - 1) * size: page * size], "total": len(book)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, seed: int = 0) -> ThreadingHTTPServer:
+    handler = type("SeededStandinHandler", (StandinHandler,), {"seed": seed})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, seed: int = 0) -> None:
+    make_server(host, port, seed).serve_forever()
@@ -0,0 +1,104 @@
+"""
+Décodage JSON incrémental (sans dépendance) pour les réponses de recherche P2P.
+
+iter_json_array() lit le corps HTTP par morceaux et produit un à un les éléments du tableau
+`array_key` de l'objet racine (ex. "data" chez Binance). Les autres champs de premier niveau
+(code, total, ...) sont recopiés dans `fields` au fil de la lecture. Seul l'élément en cours
+est gardé en mémoire : la mémoire par page reste constante quelle que soit sa taille.
+"""
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Ajoute le morceau suivant au tampon ; False si le flux est déjà terminé."""
+        if self.eof:
+            return False
+        if self.pos:
+            # Oublier ce qui a déjà été consommé
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.buf += self._utf8.decode(chunk)
+                return True
+        self.buf += self._utf8.decode(b"", final=True)
+        self.eof = True
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def take(self, expected: str) -> str:
+        ch = self.peek()
+        if ch not in expected:
+            raise ValueError(f"JSON invalide : attendu {expected!r}, reçu {ch!r} (position {self.pos})")
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Un nombre en fin de tampon peut être tronqué ("12" de "123") : relire avec la suite
+            if end == len(self.buf) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_array(
+    chunks: Iterable[bytes],
+    array_key: str,
+    fields: Optional[Dict[str, Any]] = None,
+) -> Iterator[Any]:
+    """
+    Itère sur les éléments de obj[array_key] d'un objet JSON racine reçu par morceaux.
+    Si obj[array_key] n'est pas un tableau, il est recopié dans `fields` comme les autres champs.
+    """
+    reader = _Reader(chunks)
+    reader.take("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.take(":")
+        if key == array_key and reader.peek() == "[":
+            reader.take("[")
+            if reader.peek() == "]":
+                reader.take("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.take(",]") == "]":
+                        break
+        else:
+            val = reader.value()
+            if fields is not None:
+                fields[key] = val
+        if reader.take(",}") == "}":
+            return
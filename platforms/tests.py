@@ -0,0 +1,72 @@
+import copy
+import threading
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from platforms import http, paginated
+from platforms.options import clear_platform_options_cache
+from platforms.standin import StandinP2PPlatform, make_server
+
+
+def _options(stream_decode: bool) -> dict:
+    options = copy.deepcopy(settings.P2P_PLATFORM_OPTIONS)
+    # Pas de limite de débit ni d'attente : le test ne dépend pas du budget partagé
+    options["rate_limit"].update(rate=0, burst=0, max_wait=1)
+    # Tampon minuscule : objets JSON coupés entre plusieurs morceaux
+    options["http"] = {"stream_decode": stream_decode, "chunk_size": 7}
+    options["hedge"] = {"enabled": False}
+    return options
+
+
+class StreamDecodeTests(TestCase):
+    """Décodage streaming des pages (PaginatedHTTPPlatform) contre le serveur stand-in local."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server(port=0, seed=7)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/search"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def tearDown(self):
+        clear_platform_options_cache()
+
+    def _fetch(self, stream_decode: bool, **kwargs):
+        clear_platform_options_cache()
+        with override_settings(P2P_STANDIN_URL=self.url, P2P_PLATFORM_OPTIONS=_options(stream_decode)):
+            return StandinP2PPlatform().fetch_offers(asset="USDT", **kwargs)
+
+    def test_streamed_and_json_paths_agree(self):
+        for fiat, trade_type in (("XOF", "SELL"), ("GHS", "BUY")):
+            with self.subTest(fiat=fiat, trade_type=trade_type):
+                streamed = self._fetch(True, fiat=fiat, trade_type=trade_type, rows=20)
+                decoded = self._fetch(False, fiat=fiat, trade_type=trade_type, rows=20)
+                # Plusieurs pages (dont les pages 2+ en parallèle)
+                self.assertGreater(len(streamed), 20)
+                self.assertEqual(streamed, decoded)
+
+    def test_interrupted_body_is_retried(self):
+        real_send = paginated.send_once
+        calls = []
+
+        def flaky_send(*args, **kwargs):
+            r = real_send(*args, **kwargs)
+            calls.append(r)
+            if len(calls) == 1:
+                r.iter_content = mock.Mock(side_effect=requests.exceptions.ChunkedEncodingError("coupure"))
+            return r
+
+        with mock.patch.object(paginated, "send_once", flaky_send), mock.patch.object(http.time, "sleep"):
+            offers = self._fetch(True, fiat="XOF", trade_type="SELL", rows=10, fetch_all_pages=False)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(offers), 10)
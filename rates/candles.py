@@ -0,0 +1,132 @@
+"""
+Bougies OHLC des taux (RateCandle) : minute, heure et jour par (source, cible, type, pays, plateforme).
+
+rollup(rows) agrège un lot de lignes d'historique dans les bougies, dans la transaction qui écrit le lot
+(rates.history) : bougies existantes lues verrouillées (une requête par granularité, par paquets de
+LOOKUP_CHUNK), fusionnées en mémoire (open = taux le plus ancien, close = le plus récent, d'après
+opened_at / closed_at, donc insensible à l'ordre des lots), puis un bulk_create et un bulk_update. Chaque ligne d'historique est agrégée une seule fois :
+la purge (prune_rate_history) peut supprimer les lignes brutes sans perte pour les bougies.
+
+Rétention (prune) : historique brut RATE_HISTORY_RETENTION_DAYS jours, bougies minute / heure
+RATE_CANDLE_RETENTION_DAYS, bougies jour conservées.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+KEY_FIELDS = ("source_currency", "target_currency", "trade_type", "country", "platform")
+DELETE_CHUNK = 5000
+# Bougies lues par requête (taille du WHERE ... OR ... bornée)
+LOOKUP_CHUNK = 100
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Début (UTC) de la minute / heure / jour contenant `at`."""
+    seconds = GRANULARITIES[granularity]
+    timestamp = int(at.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def aggregate(rows: Iterable[Dict[str, Any]], granularities: Iterable[str] = tuple(GRANULARITIES)) -> Dict[Tuple, Dict[str, Any]]:
+    """{(clé..., granularité, début): {open, high, low, close, samples, opened_at, closed_at}} d'un lot."""
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for row in sorted(rows, key=lambda r: r["created_at"]):
+        rate, at = row["rate"], row["created_at"]
+        key = tuple(row.get(f) or "" for f in KEY_FIELDS)
+        for granularity in granularities:
+            ident = key + (granularity, bucket_start(at, granularity))
+            candle = groups.get(ident)
+            if candle is None:
+                groups[ident] = {
+                    "open": rate, "high": rate, "low": rate, "close": rate,
+                    "samples": 1, "opened_at": at, "closed_at": at,
+                }
+            else:
+                candle["high"] = max(candle["high"], rate)
+                candle["low"] = min(candle["low"], rate)
+                candle["close"] = rate
+                candle["closed_at"] = at
+                candle["samples"] += 1
+    return groups
+
+
+def _merge(candle, values: Dict[str, Any]) -> None:
+    if values["opened_at"] < candle.opened_at:
+        candle.open, candle.opened_at = values["open"], values["opened_at"]
+    if values["closed_at"] >= candle.closed_at:
+        candle.close, candle.closed_at = values["close"], values["closed_at"]
+    candle.high = max(candle.high, values["high"])
+    candle.low = min(candle.low, values["low"])
+    candle.samples += values["samples"]
+
+
+def rollup(rows: List[Dict[str, Any]], candle_model=None) -> int:
+    """
+    Agrège des lignes d'historique (dicts : champs de RateHistory) dans les bougies ; à appeler dans la
+    transaction qui écrit les lignes. candle_model : modèle historique (migration), RateCandle par défaut.
+    Retourne le nombre de bougies créées ou modifiées.
+    """
+    if candle_model is None:
+        from offers.models import RateCandle as candle_model
+
+    groups = aggregate(rows)
+    if not groups:
+        return 0
+    created, updated = [], []
+    for granularity in GRANULARITIES:
+        wanted = {ident: values for ident, values in groups.items() if ident[5] == granularity}
+        idents = list(wanted)
+        existing = {}
+        for i in range(0, len(idents), LOOKUP_CHUNK):
+            condition = Q()
+            for ident in idents[i : i + LOOKUP_CHUNK]:
+                condition |= Q(**dict(zip(KEY_FIELDS, ident[:5])), start=ident[6])
+            for c in candle_model.objects.select_for_update().filter(condition, granularity=granularity):
+                existing[tuple(getattr(c, f) for f in KEY_FIELDS) + (granularity, c.start)] = c
+        for ident, values in wanted.items():
+            candle = existing.get(ident)
+            if candle is None:
+                created.append(candle_model(
+                    **dict(zip(KEY_FIELDS, ident[:5])), granularity=granularity, start=ident[6], **values
+                ))
+            else:
+                _merge(candle, values)
+                updated.append(candle)
+    candle_model.objects.bulk_create(created, batch_size=500)
+    candle_model.objects.bulk_update(
+        updated, ["open", "high", "low", "close", "samples", "opened_at", "closed_at"], batch_size=500
+    )
+    return len(created) + len(updated)
+
+
+def _delete_before(queryset, field: str, cutoff: datetime) -> int:
+    """Suppression par paquets de DELETE_CHUNK lignes (pas de DELETE géant sur une table chaude)."""
+    deleted = 0
+    while True:
+        ids = list(queryset.filter(**{f"{field}__lt": cutoff}).order_by().values_list("pk", flat=True)[:DELETE_CHUNK])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def prune(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Applique la rétention (voir le module) ; retourne {table / granularité: lignes supprimées}."""
+    from offers.models import RateCandle, RateHistory
+
+    now = now or timezone.now()
+    history_days = getattr(settings, "RATE_HISTORY_RETENTION_DAYS", 30)
+    candle_days = getattr(settings, "RATE_CANDLE_RETENTION_DAYS", {})
+    result = {"history": _delete_before(RateHistory.objects.all(), "created_at", now - timedelta(days=history_days))}
+    for granularity, days in candle_days.items():
+        if days:
+            result[granularity] = _delete_before(
+                RateCandle.objects.filter(granularity=granularity), "start", now - timedelta(days=days)
+            )
+    return result
@@ -0,0 +1,97 @@
+"""
+Historique des taux (RateHistory) en écriture différée : aucune requête SQL d'historique pendant la requête.
+
+record() :
+- garde en mémoire du process le dernier taux par clé (source, cible, type, pays, plateforme) ;
+- détection d'anomalie sur le flux de la clé (core.anomaly : EWMA, score z, alerte RateAlert) ;
+- ignore un taux identique au précédent de la même clé (suite de cotations inchangées = une ligne) ;
+- met la ligne en tampon (core.buffered) avec l'heure de la cotation ; un thread l'écrit par bulk_create
+  (RATE_HISTORY_BUFFER_SIZE lignes ou RATE_HISTORY_FLUSH_SECONDS s) et l'agrège dans la même transaction
+  en bougies minute / heure / jour (rates.candles) ; copie long terme dans les segments si activés
+  (rates.segments).
+Mémoire par process : après un redémarrage, la première cotation de chaque clé est réécrite.
+"""
+import logging
+import threading
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import anomaly
+from core.buffered import BufferedWriter, register
+from rates import candles, segments
+
+logger = logging.getLogger(__name__)
+
+RATE_QUANT = Decimal("1e-8")
+
+_last: Dict[Tuple[str, str, str, str, str], Decimal] = {}
+_last_lock = threading.Lock()
+
+
+def _write(batch: List[Dict[str, Any]]) -> None:
+    from offers.models import RateHistory
+
+    with transaction.atomic():
+        RateHistory.objects.bulk_create([RateHistory(**row) for row in batch], batch_size=500)
+        candles.rollup(batch)
+    if segments.enabled():
+        # Après le commit : un échec ici ne remet pas en attente des lignes déjà en base
+        try:
+            segments.append_rows(batch)
+        except Exception:
+            logger.exception("rate_history: ajout de %s point(s) aux segments échoué", len(batch))
+
+
+_writer: Optional[BufferedWriter] = None
+
+
+def get_writer() -> BufferedWriter:
+    global _writer
+    if _writer is None:
+        _writer = register(BufferedWriter(
+            "rate_history",
+            _write,
+            max_items=getattr(settings, "RATE_HISTORY_BUFFER_SIZE", 500),
+            max_age=getattr(settings, "RATE_HISTORY_FLUSH_SECONDS", 10.0),
+        ))
+    return _writer
+
+
+def last_rate(source: str, target: str, trade_type: str, country: str = "", platform: str = "") -> Optional[Decimal]:
+    """Dernier taux enregistré par ce process pour la clé (None si aucun)."""
+    with _last_lock:
+        return _last.get((source, target, trade_type, country or "", platform))
+
+
+def record(
+    source: str, target: str, rate: float, trade_type: str, platform: str, country: Optional[str] = None
+) -> bool:
+    """Enregistre un taux calculé (voir le module) ; False si identique au précédent de la clé (non écrit)."""
+    logger.info("rate_computed %s/%s=%.8f trade_type=%s country=%s", source, target, rate, trade_type, country or "")
+    value = Decimal(str(rate)).quantize(RATE_QUANT)
+    key = (source, target, trade_type, country or "", platform)
+    with _last_lock:
+        previous = _last.get(key)
+        if previous == value:
+            return False
+        _last[key] = value
+    if value > 0:
+        z, expected = anomaly.observe(key, float(value))
+        if anomaly.is_alert(z):
+            anomaly.alert(
+                "rate", source, target, trade_type, float(value), expected, z, country=country, platform=platform
+            )
+    get_writer().add([{
+        "source_currency": source,
+        "target_currency": target,
+        "rate": value,
+        "trade_type": trade_type,
+        "platform": platform,
+        "country": country or "",
+        "created_at": timezone.now(),
+    }])
+    return True
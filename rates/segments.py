@@ -0,0 +1,274 @@
+"""
+Stockage compact de l'historique des taux à long terme (optionnel, RATE_SEGMENT_STORE=1).
+
+Un répertoire par série (source, cible, type, pays, plateforme) sous RATE_SEGMENT_DIR, un fichier de segment
+par jour UTC (AAAAMMJJ.seg), en ajout seul. Chaque ajout écrit un bloc autonome :
+- en-tête (BLOCK_HEADER) : magie, nombre de points, premier et dernier horodatage (ms), taille des données ;
+- points : horodatage en delta-of-delta (ms), taux en virgule fixe (1e-8, exact pour DecimalField(20,8))
+  en delta du point précédent, tous deux en varint zigzag : 2 à 4 octets par point en régime établi.
+Lecture par mmap : les blocs hors de la plage demandée sont sautés sur leur en-tête, sans décodage.
+Plusieurs process peuvent ajouter au même fichier (un write par bloc, verrou flock si disponible) ;
+les doublons exacts (conversion + écriture courante) sont éliminés à la lecture.
+Compactage (compact_closed, lancé par prune_rate_history et convert_rate_history) : chaque jour clos est
+réécrit en un seul bloc trié sans doublons (fichier temporaire puis rename, sous flock) ; les ajouts
+courants, un bloc par flush, coûtent sinon l'en-tête de 28 octets par bloc.
+
+Alimenté au report de l'historique (rates.history) et par la commande convert_rate_history pour
+l'existant ; lu par GET /api/v1/rates/history/ au-delà de la rétention des bougies en base.
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows : un write par bloc en mode ajout
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BLOCK_MAGIC = b"RSG1"
+BLOCK_HEADER = struct.Struct("<4sIqqI")
+VALUE_SCALE = 8
+KEY_FIELDS = ("source_currency", "target_currency", "trade_type", "country", "platform")
+_UNSAFE = re.compile(r"[^A-Za-z0-9]")
+
+SeriesKey = Tuple[str, str, str, str, str]
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "RATE_SEGMENT_STORE", False))
+
+
+def to_fixed(rate) -> int:
+    return int(Decimal(str(rate)).scaleb(VALUE_SCALE).to_integral_value())
+
+
+def from_fixed(value: int) -> Decimal:
+    return Decimal(value).scaleb(-VALUE_SCALE)
+
+
+def to_ms(at: datetime) -> int:
+    return int(at.timestamp() * 1000)
+
+
+def from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+# --- Encodage ---------------------------------------------------------------
+def _put(out: bytearray, n: int) -> None:
+    """Entier signé en varint zigzag."""
+    n = n * 2 if n >= 0 else -n * 2 - 1
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get(buf, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+
+
+def encode_block(points: List[Tuple[int, int]]) -> bytes:
+    """Bloc (en-tête + données) de points (horodatage ms, taux virgule fixe) triés par horodatage."""
+    payload = bytearray()
+    prev_ts = prev_delta = prev_value = 0
+    for i, (ts, value) in enumerate(points):
+        delta = ts - prev_ts
+        _put(payload, ts if i == 0 else (delta if i == 1 else delta - prev_delta))
+        _put(payload, value - prev_value)
+        prev_ts, prev_delta, prev_value = ts, delta, value
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(points), points[0][0], points[-1][0], len(payload))
+    return header + bytes(payload)
+
+
+def _decode(buf, pos: int, count: int) -> Iterator[Tuple[int, int]]:
+    ts = delta = value = 0
+    for i in range(count):
+        n, pos = _get(buf, pos)
+        if i == 0:
+            ts = n
+        else:
+            delta = n if i == 1 else delta + n
+            ts += delta
+        n, pos = _get(buf, pos)
+        value += n
+        yield ts, value
+
+
+def scan_buffer(buf, since_ms: int, until_ms: int, name: str = "") -> Iterator[Tuple[int, int]]:
+    """Points [since_ms, until_ms) d'un segment ; blocs hors plage sautés sur leur en-tête."""
+    pos, size = 0, len(buf)
+    while pos + BLOCK_HEADER.size <= size:
+        magic, count, first, last, length = BLOCK_HEADER.unpack_from(buf, pos)
+        start = pos + BLOCK_HEADER.size
+        if magic != BLOCK_MAGIC or start + length > size:
+            # Fin de fichier tronquée (écriture interrompue) : le reste est ignoré
+            logger.warning("segments: bloc illisible dans %s à l'offset %s", name, pos)
+            return
+        if last >= since_ms and first < until_ms:
+            for ts, value in _decode(buf, start, count):
+                if since_ms <= ts < until_ms:
+                    yield ts, value
+        pos = start + length
+
+
+# --- Fichiers ---------------------------------------------------------------
+class SegmentStore:
+    """Segments d'un répertoire racine (voir le module)."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def series_dir(self, key: SeriesKey) -> Path:
+        return self.root / "_".join(_UNSAFE.sub("", part) or "-" for part in key)
+
+    def _path(self, key: SeriesKey, day: datetime) -> Path:
+        return self.series_dir(key) / f"{day:%Y%m%d}.seg"
+
+    def append(self, key: SeriesKey, points: Iterable[Tuple[int, int]]) -> int:
+        """Ajoute des points (ms, virgule fixe) : un bloc par jour touché. Retourne le nombre de points."""
+        by_day: Dict[int, List[Tuple[int, int]]] = {}
+        for ts, value in sorted(points):
+            by_day.setdefault(ts // 86400000, []).append((ts, value))
+        for day, day_points in by_day.items():
+            path = self._path(key, from_ms(day * 86400000))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            block = encode_block(day_points)
+            while True:
+                with open(path, "ab") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                        # Fichier remplacé par compact() pendant l'attente du verrou : écrire dans le nouveau
+                        if not path.exists() or os.fstat(f.fileno()).st_ino != path.stat().st_ino:
+                            continue
+                    f.write(block)
+                    f.flush()
+                    break
+        return sum(len(p) for p in by_day.values())
+
+    def compact(self, path: Path) -> bool:
+        """
+        Réécrit un fichier de segment en un seul bloc (points triés, doublons exacts retirés).
+        False si déjà en un bloc, vide ou sans flock (ajouts concurrents non protégés).
+        """
+        if fcntl is None:
+            return False
+        with open(path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            size = os.fstat(f.fileno()).st_size
+            if size < BLOCK_HEADER.size:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if BLOCK_HEADER.size + BLOCK_HEADER.unpack_from(buf, 0)[4] == size:
+                    return False
+                points = sorted(set(scan_buffer(buf, -(2 ** 63), 2 ** 63 - 1, str(path))))
+            if not points:
+                return False
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as out:
+                out.write(encode_block(points))
+                out.flush()
+                os.fsync(out.fileno())
+            # Verrou gardé jusqu'au rename : les ajouts en attente voient ensuite le nouveau fichier
+            os.replace(tmp, path)
+        return True
+
+    def compact_closed(self, before: Optional[datetime] = None) -> Tuple[int, int]:
+        """
+        Compacte les jours antérieurs à `before` (défaut : aujourd'hui UTC), toutes séries.
+        Retourne (fichiers compactés, octets gagnés).
+        """
+        if not self.root.exists():
+            return 0, 0
+        before = before or datetime.now(dt_timezone.utc)
+        limit = f"{before:%Y%m%d}"
+        files = saved = 0
+        for path in sorted(self.root.glob("*/*.seg")):
+            if path.stem >= limit:
+                continue
+            size = path.stat().st_size
+            try:
+                if not self.compact(path):
+                    continue
+            except OSError:
+                logger.exception("segments: compactage de %s échoué", path)
+                continue
+            files += 1
+            saved += size - path.stat().st_size
+        if files:
+            logger.info("segments: %s fichier(s) compacté(s), %s octets gagnés", files, saved)
+        return files, saved
+
+    def scan(self, key: SeriesKey, since: datetime, until: datetime) -> List[Tuple[datetime, Decimal]]:
+        """Points [since, until) de la série, triés, doublons exacts retirés."""
+        since_ms, until_ms = to_ms(since), to_ms(until)
+        points = set()
+        day = since.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < until:
+            path = self._path(key, day)
+            if path.exists() and path.stat().st_size:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    points.update(scan_buffer(buf, since_ms, until_ms, str(path)))
+            day += timedelta(days=1)
+        return [(from_ms(ts), from_fixed(value)) for ts, value in sorted(points)]
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in self.root.rglob("*.seg")) if self.root.exists() else 0
+
+
+_store: Optional[SegmentStore] = None
+
+
+def get_store() -> SegmentStore:
+    global _store
+    root = Path(getattr(settings, "RATE_SEGMENT_DIR", "rate_segments"))
+    if _store is None or _store.root != root:
+        _store = SegmentStore(root)
+    return _store
+
+
+def series_key(row: Dict[str, Any]) -> SeriesKey:
+    return tuple(row.get(f) or "" for f in KEY_FIELDS)
+
+
+def append_rows(rows: Iterable[Dict[str, Any]]) -> int:
+    """Ajoute des lignes d'historique (dicts : champs de RateHistory), groupées par série."""
+    series: Dict[SeriesKey, List[Tuple[int, int]]] = {}
+    for row in rows:
+        if row.get("rate"):
+            series.setdefault(series_key(row), []).append((to_ms(row["created_at"]), to_fixed(row["rate"])))
+    store = get_store()
+    return sum(store.append(key, points) for key, points in series.items())
+
+
+def candles(key: SeriesKey, granularity: str, since: datetime, until: datetime) -> List[Dict[str, Any]]:
+    """Bougies calculées depuis les segments (même forme que RateCandle) pour [since, until)."""
+    from rates.candles import aggregate
+
+    rows = [
+        dict(zip(KEY_FIELDS, key), rate=rate, created_at=at)
+        for at, rate in get_store().scan(key, since, until)
+    ]
+    out = [
+        {"start": ident[6], **values}
+        for ident, values in aggregate(rows, (granularity,)).items()
+    ]
+    return sorted(out, key=lambda c: c["start"])
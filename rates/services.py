@@ -4,7 +4,7 @@ from typing import Dict, Optional, List
 from django.core.cache import cache
 
 from offers.services import fetch_offers
-from offers.models import RateHistory
+from rates import history
 
 logger = logging.getLogger(__name__)
 
@@ -60,17 +60,9 @@ def get_usdt_rate(fiat: str, trade_type: str, country: Optional[str] = None) ->
     rate = sum(prices) / len(prices) if prices else None
     if rate is not None:
         try:
-            RateHistory.objects.create(
-                source_currency=fiat,
-                target_currency="USDT",
-                rate=rate,
-                trade_type=trade_type,
-                platform=_platform_code(),
-                country=country or "",
-            )
-            _log_rate_variation(fiat, "USDT", rate, trade_type, country)
+            history.record(fiat, "USDT", rate, trade_type, _platform_code(), country)
         except Exception:
-            pass
+            logger.exception("historique du taux %s/USDT non enregistré", fiat)
     return rate
 
 
@@ -101,32 +93,7 @@ def compute_cross_rate(
     cross = round(float(cross), 8)
     cache.set(key, str(cross), CACHE_RATE_TTL)
     try:
-        RateHistory.objects.create(
-            source_currency=from_currency,
-            target_currency=to_currency,
-            rate=cross,
-            trade_type="BUY",
-            platform=_platform_code(),
-            country=country_from or "",
-        )
-        _log_rate_variation(from_currency, to_currency, cross, "BUY", country_from)
+        history.record(from_currency, to_currency, cross, "BUY", _platform_code(), country_from)
     except Exception:
-        pass
+        logger.exception("historique du taux %s/%s non enregistré", from_currency, to_currency)
     return cross
-
-
-def _log_rate_variation(source: str, target: str, rate: float, trade_type: str, country: Optional[str] = None):
-    """Log du taux pour monitoring ; alerte si variation anormale vs dernier taux."""
-    logger.info("rate_computed %s/%s=%.8f trade_type=%s country=%s", source, target, rate, trade_type, country or "")
-    try:
-        last = RateHistory.objects.filter(
-            source_currency=source, target_currency=target, trade_type=trade_type
-        ).exclude(rate=0).order_by("-created_at").values_list("rate", flat=True)[:2]
-        last = list(last)
-        if len(last) >= 2 and last[1]:
-            prev = float(last[1])
-            pct = abs(rate - prev) / prev * 100 if prev else 0
-            if pct > 10:
-                logger.warning("rate_variation_alert %s/%s %.2f%% (%.4f -> %.4f)", source, target, pct, prev, rate)
-    except Exception:
-        pass
@@ -0,0 +1,147 @@
+"""
+Serveur ASGI HTTP/1.1 minimal (sans dépendance) pour développer et tester le flux SSE en local.
+
+Une requête par connexion (Connection: close), réponses envoyées en chunked au fil de l'eau, déconnexion
+du client transmise à l'application (http.disconnect). Pas pour la production : utiliser un serveur ASGI
+(uvicorn, daphne...) derrière le reverse proxy.
+
+  python manage.py run_asgi_local --port 8001
+  server = LocalASGIServer(application).start()  # thread dédié, server.port, server.stop()
+"""
+import asyncio
+import logging
+import threading
+from typing import Optional
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+
+class LocalASGIServer:
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    # --- Cycle de vie ---------------------------------------------------------
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "LocalASGIServer":
+        """Démarre dans un thread (boucle asyncio propre) ; retourne quand le port écoute."""
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve_until_stopped()), daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self
+
+    async def _serve_until_stopped(self) -> None:
+        try:
+            await self.serve()
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    # --- Requêtes -------------------------------------------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        lines = head.decode("latin1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = []
+        length = 0
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers.append((name.strip().lower().encode("latin1"), value.strip().encode("latin1")))
+                if name.strip().lower() == "content-length":
+                    length = int(value.strip() or 0)
+        body = await reader.readexactly(length) if length else b""
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin1"),
+            "query_string": query.encode("latin1"),
+            "root_path": "",
+            "headers": headers,
+            "client": writer.get_extra_info("peername")[:2],
+            "server": (self.host, self.port),
+        }
+        body_sent = False
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            # Pas de keep-alive : toute lecture (EOF compris) après la requête = client parti
+            await reader.read(1)
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if disconnected.is_set():
+                # Comme uvicorn : envois ignorés après déconnexion, l'application l'apprend par receive()
+                return
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                out = [f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}".encode()]
+                for name, value in message.get("headers", []):
+                    if name.lower() not in (b"content-length", b"connection", b"transfer-encoding"):
+                        out.append(name + b": " + value)
+                out.append(b"Transfer-Encoding: chunked")
+                out.append(b"Connection: close")
+                writer.write(b"\r\n".join(out) + b"\r\n\r\n")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                if not message.get("more_body", False):
+                    writer.write(b"0\r\n\r\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                disconnected.set()
+
+        try:
+            await self.app(scope, receive, send)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("asgi_local: %s %s", method, path)
+        finally:
+            watcher.cancel()
+            writer.close()
+
+
+def serve(app, host: str = "127.0.0.1", port: int = 8001) -> None:
+    asyncio.run(LocalASGIServer(app, host, port).serve())
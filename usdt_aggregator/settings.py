@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "api.admission.admission_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -96,13 +97,14 @@ LOGIN_URL = "/admin/login/"
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "api.auth.APIKeyAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.auth.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
         "api.auth.CheckAPIKeyQuota",
     ],
+    "DEFAULT_THROTTLE_CLASSES": ["api.throttling.APIKeyRateThrottle"],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     # Pas de URLPathVersioning : le préfixe /api/v1/ est fixe, pas un paramètre de version DRF.
     # Garder DEFAULT_VERSIONING_CLASS vide évite "No operations defined in spec!" dans Swagger.
@@ -137,9 +139,170 @@ else:
         }
     }
 
+# Cache de l'authentification API (core.authcache) : TTL du cache process (délai max de prise en compte
+# d'une désactivation par les autres process), nombre d'entrées par process, TTL du cache partagé
+API_AUTH_CACHE_TTL = float(os.environ.get("API_AUTH_CACHE_TTL", "5"))
+API_AUTH_CACHE_SIZE = int(os.environ.get("API_AUTH_CACHE_SIZE", "4096"))
+API_AUTH_SHARED_TTL = int(os.environ.get("API_AUTH_SHARED_TTL", "300"))
+
+# Débit par clé API (api.throttling, seau à jetons partagé) : requêtes/s et rafale par défaut (APIKey.rate_limit /
+# rate_burst les remplacent ; 0 = sans limite), coût en jetons par classe d'endpoint (throttle_scope)
+API_RATE_LIMIT = float(os.environ.get("API_RATE_LIMIT", "10"))
+API_RATE_BURST = int(os.environ.get("API_RATE_BURST", "20"))
+API_RATE_SCOPE_COSTS = {
+    "default": 1,
+    "batch": int(os.environ.get("API_RATE_COST_BATCH", "10")),
+    "advertiser": int(os.environ.get("API_RATE_COST_ADVERTISER", "5")),
+    "advertiser_batch": int(os.environ.get("API_RATE_COST_ADVERTISER_BATCH", "10")),
+    "advertiser_usage": int(os.environ.get("API_RATE_COST_ADVERTISER_USAGE", "1")),
+}
+
+# Contrôle d'admission /api/ (api.admission) : limite de concurrence adaptative (bornes, valeur initiale),
+# attente max dans la file du proxy (X-Request-Start) et part de la limite ouverte à chaque voie.
+# Gradient de latence : la limite ne baisse que si la latence courte dépasse ADMISSION_LATENCY_TOLERANCE fois
+# la latence longue (référence) ; gradient jamais sous ADMISSION_MIN_GRADIENT (cible >= cette part de la limite)
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_INITIAL_LIMIT = float(os.environ.get("ADMISSION_INITIAL_LIMIT", "16"))
+ADMISSION_MIN_LIMIT = float(os.environ.get("ADMISSION_MIN_LIMIT", "4"))
+ADMISSION_MAX_LIMIT = float(os.environ.get("ADMISSION_MAX_LIMIT", "64"))
+ADMISSION_QUEUE_TARGET_MS = float(os.environ.get("ADMISSION_QUEUE_TARGET_MS", "50"))
+ADMISSION_UPDATE_INTERVAL = 1.0
+ADMISSION_LATENCY_TOLERANCE = float(os.environ.get("ADMISSION_LATENCY_TOLERANCE", "1.5"))
+ADMISSION_MIN_GRADIENT = 0.5
+ADMISSION_LANE_SHARES = {"internal": 1.0, "client": 0.9, "low": 0.5}
+ADMISSION_EXEMPT_PATHS = ["/api/v1/health/", "/api/v1/stream/"]
+
+# Compteurs d'appels API en cache (core.usage) : intervalle du report en base (flush_api_usage --loop)
+API_USAGE_FLUSH_INTERVAL = int(os.environ.get("API_USAGE_FLUSH_INTERVAL", "30"))
+
+# POST /api/v1/advertiser/usage/ (core.advertiser_usage) : déclarations écrites par lots de
+# ADVERTISER_USAGE_BUFFER_SIZE ou toutes les ADVERTISER_USAGE_FLUSH_SECONDS s (0 = écriture immédiate),
+# au plus ADVERTISER_USAGE_MAX_BATCH déclarations par appel
+ADVERTISER_USAGE_BUFFER_SIZE = int(os.environ.get("ADVERTISER_USAGE_BUFFER_SIZE", "200"))
+ADVERTISER_USAGE_FLUSH_SECONDS = float(os.environ.get("ADVERTISER_USAGE_FLUSH_SECONDS", "5"))
+ADVERTISER_USAGE_MAX_BATCH = int(os.environ.get("ADVERTISER_USAGE_MAX_BATCH", "500"))
+
+# Historique des taux (rates.history) : écriture différée par lots de RATE_HISTORY_BUFFER_SIZE lignes
+# ou toutes les RATE_HISTORY_FLUSH_SECONDS s (0 = écriture immédiate)
+RATE_HISTORY_BUFFER_SIZE = int(os.environ.get("RATE_HISTORY_BUFFER_SIZE", "500"))
+RATE_HISTORY_FLUSH_SECONDS = float(os.environ.get("RATE_HISTORY_FLUSH_SECONDS", "10"))
+# Rétention (prune_rate_history) : historique brut (déjà agrégé en bougies) et bougies minute / heure,
+# en jours (0 = conservées) ; bougies jour conservées
+RATE_HISTORY_RETENTION_DAYS = int(os.environ.get("RATE_HISTORY_RETENTION_DAYS", "30"))
+RATE_CANDLE_RETENTION_DAYS = {
+    "minute": int(os.environ.get("RATE_CANDLE_MINUTE_RETENTION_DAYS", "7")),
+    "hour": int(os.environ.get("RATE_CANDLE_HOUR_RETENTION_DAYS", "365")),
+}
+RATE_HISTORY_PRUNE_INTERVAL = int(os.environ.get("RATE_HISTORY_PRUNE_INTERVAL", "3600"))
+# Historique long terme en segments binaires compacts (rates.segments), lu par /rates/history/ au-delà de la
+# rétention des bougies ; existant à convertir avec convert_rate_history
+RATE_SEGMENT_STORE = os.environ.get("RATE_SEGMENT_STORE", "0") == "1"
+RATE_SEGMENT_DIR = os.environ.get("RATE_SEGMENT_DIR") or str(BASE_DIR / "rate_segments")
+# Détection d'anomalies (core.anomaly) : EWMA par flux (log du taux), score z en écarts-types.
+# Alerte au-delà de RATE_ANOMALY_Z ; au refresh, carnet en quarantaine au-delà de RATE_ANOMALY_QUARANTINE_Z
+# (au plus RATE_ANOMALY_MAX_QUARANTINE refresh de suite). Pas de score avant RATE_ANOMALY_MIN_SAMPLES valeurs.
+RATE_ANOMALY_ALPHA = float(os.environ.get("RATE_ANOMALY_ALPHA", "0.1"))
+RATE_ANOMALY_Z = float(os.environ.get("RATE_ANOMALY_Z", "4"))
+RATE_ANOMALY_QUARANTINE_Z = float(os.environ.get("RATE_ANOMALY_QUARANTINE_Z", "8"))
+RATE_ANOMALY_MAX_QUARANTINE = int(os.environ.get("RATE_ANOMALY_MAX_QUARANTINE", "3"))
+RATE_ANOMALY_MIN_SAMPLES = int(os.environ.get("RATE_ANOMALY_MIN_SAMPLES", "20"))
+# Écart-type plancher (log : 0.001 ≈ 0,1 %)
+RATE_ANOMALY_MIN_STD = float(os.environ.get("RATE_ANOMALY_MIN_STD", "0.001"))
+RATE_ANOMALY_FLUSH_SECONDS = float(os.environ.get("RATE_ANOMALY_FLUSH_SECONDS", "5"))
+
 # Plateforme P2P par défaut
 DEFAULT_P2P_PLATFORM = os.environ.get("DEFAULT_P2P_PLATFORM", "binance")
 
+# Adaptateurs P2P chargés à la demande par platforms.registry (code → chemin de la classe).
+# P2P_PLATFORM_ADAPTERS="standin=platforms.standin.StandinP2PPlatform,autre=pkg.module.Classe" ajoute / remplace.
+P2P_PLATFORM_ADAPTERS = {"binance": "platforms.binance.BinanceP2PPlatform"}
+for _entry in os.environ.get("P2P_PLATFORM_ADAPTERS", "").split(","):
+    if "=" in _entry:
+        _code, _path = _entry.split("=", 1)
+        P2P_PLATFORM_ADAPTERS[_code.strip()] = _path.strip()
+# URL du serveur local simulé (commande run_p2p_standin)
+P2P_STANDIN_URL = os.environ.get("P2P_STANDIN_URL", "http://127.0.0.1:8765/search")
+
+# Réglages par plateforme P2P (surchargeables par plateforme via PlatformConfig.config, même structure).
+# rate_limit : budget partagé (cache) entre refresh et trafic API.
+#   rate/burst = seau à jetons (req/s, rafale) ; *_concurrency = bornes AIMD ;
+#   increase = +increase/limite par succès ; decrease = facteur sur 429/5xx/timeout ;
+#   max_retries/max_wait = rejeu des erreurs transitoires ; default_cooldown = pause si 429 sans Retry-After.
+P2P_PLATFORM_OPTIONS = {
+    "rate_limit": {
+        "rate": float(os.environ.get("P2P_RATE_LIMIT_RATE", "5")),
+        "burst": int(os.environ.get("P2P_RATE_LIMIT_BURST", "10")),
+        "initial_concurrency": 2,
+        "min_concurrency": 1,
+        "max_concurrency": 8,
+        "increase": 1,
+        "decrease": 0.5,
+        "max_retries": 3,
+        "max_wait": 30,
+        "default_cooldown": 2,
+    },
+    # http : stream_decode = décodage JSON incrémental des pages (mémoire constante par page).
+    "http": {
+        "stream_decode": True,
+        "chunk_size": 8192,
+    },
+    # circuit : disjoncteur partagé (cache). Ouvert après failure_threshold échecs en `window` s,
+    # pendant reset_timeout s, puis une seule sonde (half-open).
+    "circuit": {
+        "enabled": True,
+        "failure_threshold": 5,
+        "window": 60,
+        "reset_timeout": 30,
+        "probe_timeout": 30,
+    },
+    # aggregation : mode agrégé des offres (?platforms=) — weight > 1 favorise la plateforme au classement
+    # (prix / weight en BUY, prix × weight en SELL), excluded = jamais agrégée.
+    "aggregation": {
+        "weight": 1.0,
+        "excluded": False,
+    },
+    # hedge : doublon d'une page qui dépasse le percentile de latence observé (min_samples requis).
+    "hedge": {
+        "enabled": False,
+        "percentile": 95,
+        "min_samples": 20,
+    },
+}
+
+# Classement composite des offres (?order=score) : poids du prix (normalisé dans le carnet) et de la
+# fiabilité de l'annonceur (taux de complétion, ordres sur 30 jours plafonnés à OFFER_SCORE_ORDERS_CAP, avis positifs,
+# exécutions déclarées par nos clients plafonnées à OFFER_SCORE_EXECUTED_CAP).
+OFFER_SCORE_WEIGHTS = {
+    "price": float(os.environ.get("OFFER_SCORE_WEIGHT_PRICE", "0.6")),
+    "finish_rate": float(os.environ.get("OFFER_SCORE_WEIGHT_FINISH_RATE", "0.25")),
+    "orders": float(os.environ.get("OFFER_SCORE_WEIGHT_ORDERS", "0.1")),
+    "positive_rate": float(os.environ.get("OFFER_SCORE_WEIGHT_POSITIVE_RATE", "0.05")),
+    "executed": float(os.environ.get("OFFER_SCORE_WEIGHT_EXECUTED", "0.1")),
+}
+OFFER_SCORE_ORDERS_CAP = int(os.environ.get("OFFER_SCORE_ORDERS_CAP", "500"))
+OFFER_SCORE_EXECUTED_CAP = int(os.environ.get("OFFER_SCORE_EXECUTED_CAP", "50"))
+
+# Générations de changements gardées par snapshot (GET /api/v1/offers/changes/) ; au-delà : resync
+OFFER_CHANGES_KEEP = int(os.environ.get("OFFER_CHANGES_KEEP", "50"))
+
+# GET /api/v1/stream/ (SSE, ASGI) : lecture des générations toutes les SSE_POLL_INTERVAL s, heartbeat,
+# délai de reconnexion conseillé au client (ms) et nombre max de sujets par connexion
+SSE_POLL_INTERVAL = float(os.environ.get("SSE_POLL_INTERVAL", "2"))
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", "15"))
+SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", "3000"))
+SSE_MAX_TOPICS = int(os.environ.get("SSE_MAX_TOPICS", "50"))
+
+# POST /api/v1/offers/batch/ : nombre max de sous-requêtes ; facturation per_query (une par sous-requête
+# réussie) ou per_batch (une par lot)
+API_BATCH_MAX_QUERIES = int(os.environ.get("API_BATCH_MAX_QUERIES", "100"))
+API_BATCH_BILLING = os.environ.get("API_BATCH_BILLING", "per_query")
+
+# Santé des plateformes (commande probe_platforms) : intervalle du mode --loop et âge max d'une sonde
+PLATFORM_HEALTH_INTERVAL = int(os.environ.get("PLATFORM_HEALTH_INTERVAL", "30"))
+PLATFORM_HEALTH_MAX_AGE = int(os.environ.get("PLATFORM_HEALTH_MAX_AGE", "300"))
+# GET /api/v1/health/ : un snapshot plus vieux que ce délai (secondes) est signalé périmé
+HEALTH_SNAPSHOT_MAX_AGE = int(os.environ.get("HEALTH_SNAPSHOT_MAX_AGE", "900"))
+
 # Fuseau pour affichage
 TIMEZONE_DISPLAY = os.environ.get("TIMEZONE_DISPLAY", "Africa/Abidjan")
 